@@ -23,7 +23,9 @@ const MessageThread = ({ className }: { className?: string }) => {
     toggleSidebar,
     getOppositeParticipant,
     messages,
+    before,
     fetchMessages,
+    fetchOlderMessages,
     sendMessage,
     connectWebSocket,
     disconnectWebSocket,
@@ -128,6 +130,16 @@ const MessageThread = ({ className }: { className?: string }) => {
         <ScrollArea className="h-[50vh]">
           {/* Render messages here, align all messages on left side, timestamp on right side, and an avatar before message and name */}
           <div className="flex flex-col gap-4 p-4">
+            {/* Button to load older messages */}
+            {selectedConversation && before && (
+              <Button
+                variant="ghost"
+                className="w-full"
+                onClick={() => fetchOlderMessages(selectedConversation.id)}
+              >
+                Load older messages
+              </Button>
+            )}
             {messages.map((message, idx) =>
               message.type == "message" ? (
                 <div key={`message-${idx}`}>
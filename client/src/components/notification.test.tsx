@@ -9,10 +9,12 @@ import userEvent from "@testing-library/user-event";
 jest.mock("@/store/useNotificationStore");
 jest.mock("@/store/useAuthStore");
 
-// Mock the fetchNotifications, markAsRead, and markAsReadAll functions
+// Mock the fetchNotifications, markAsRead, markAsReadAll and WebSocket functions
 const mockFetchNotifications = jest.fn();
 const mockMarkAsRead = jest.fn();
 const mockMarkAsReadAll = jest.fn();
+const mockConnectWebSocket = jest.fn();
+const mockDisconnectWebSocket = jest.fn();
 
 describe("Notification Component", () => {
   beforeEach(() => {
@@ -22,6 +24,8 @@ describe("Notification Component", () => {
       notifications: [],
       markAsRead: mockMarkAsRead,
       markAsReadAll: mockMarkAsReadAll,
+      connectWebSocket: mockConnectWebSocket,
+      disconnectWebSocket: mockDisconnectWebSocket,
     });
 
     // Mock the return value of useAuthStore hook
@@ -42,6 +46,13 @@ describe("Notification Component", () => {
     await waitFor(() => expect(mockFetchNotifications).toHaveBeenCalled());
   });
 
+  it("connects to the notification WebSocket and disconnects on unmount", () => {
+    const { unmount } = render(<Notification />);
+    expect(mockConnectWebSocket).toHaveBeenCalled();
+    unmount();
+    expect(mockDisconnectWebSocket).toHaveBeenCalled();
+  });
+
   it('displays "No notifications" when there are none', async () => {
     render(<Notification />);
     // Click the button to open notifications
@@ -59,6 +70,8 @@ describe("Notification Component", () => {
       ],
       markAsRead: mockMarkAsRead,
       markAsReadAll: mockMarkAsReadAll,
+      connectWebSocket: mockConnectWebSocket,
+      disconnectWebSocket: mockDisconnectWebSocket,
     });
 
     render(<Notification />);
@@ -76,6 +89,8 @@ describe("Notification Component", () => {
       ],
       markAsRead: mockMarkAsRead,
       markAsReadAll: mockMarkAsReadAll,
+      connectWebSocket: mockConnectWebSocket,
+      disconnectWebSocket: mockDisconnectWebSocket,
     });
 
     render(<Notification />);
@@ -95,6 +110,8 @@ describe("Notification Component", () => {
       ],
       markAsRead: mockMarkAsRead,
       markAsReadAll: mockMarkAsReadAll,
+      connectWebSocket: mockConnectWebSocket,
+      disconnectWebSocket: mockDisconnectWebSocket,
     });
 
     render(<Notification />);
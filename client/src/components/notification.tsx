@@ -28,14 +28,24 @@ dayjs.extend(timezone);
 dayjs.extend(relativeTime);
 
 export function Notification() {
-  const { fetchNotifications, notifications, markAsRead, markAsReadAll } =
-    useNotificationStore();
+  const {
+    fetchNotifications,
+    notifications,
+    markAsRead,
+    markAsReadAll,
+    nextCursor,
+    fetchMoreNotifications,
+    connectWebSocket,
+    disconnectWebSocket,
+  } = useNotificationStore();
   const { user } = useAuthStore();
 
-  // Fetch notifications on user login
+  // Fetch notifications on user login, then receive new ones as they are pushed
   useEffect(() => {
     if (!user) return;
     fetchNotifications();
+    connectWebSocket();
+    return () => disconnectWebSocket();
   }, [user]);
 
   return (
@@ -110,6 +120,16 @@ export function Notification() {
               </Button>
             </DropdownMenuItem>
           ))}
+          {/* Button to load older notifications */}
+          {nextCursor && (
+            <Button
+              variant="ghost"
+              className="w-full"
+              onClick={() => fetchMoreNotifications()}
+            >
+              Load more
+            </Button>
+          )}
         </ScrollArea>
       </DropdownMenuContent>
     </DropdownMenu>
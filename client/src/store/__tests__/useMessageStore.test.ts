@@ -44,6 +44,30 @@ describe("useMessagesStore", () => {
     });
   });
 
+  it("prepends older messages from the before cursor", async () => {
+    mockedAxios.get
+      .mockResolvedValueOnce({
+        data: { before: "older", after: "newest", results: [{ id: 3 }] },
+      })
+      .mockResolvedValueOnce({
+        data: { before: null, after: "older", results: [{ id: 1 }, { id: 2 }] },
+      });
+    const { result } = renderHook(() => useMessagesStore());
+    await act(async () => {
+      await result.current.fetchMessages(1);
+    });
+    expect(result.current.before).toEqual("older");
+    await act(async () => {
+      await result.current.fetchOlderMessages(1);
+    });
+    expect(mockedAxios.get).toHaveBeenLastCalledWith(
+      expect.any(String),
+      expect.objectContaining({ params: { before: "older" } }),
+    );
+    expect(result.current.messages.map((m) => m.id)).toEqual([1, 2, 3]);
+    expect(result.current.before).toBeNull();
+  });
+
   it("selects a conversation correctly", () => {
     // Render the hook and select a conversation
     const { result } = renderHook(() => useMessagesStore());
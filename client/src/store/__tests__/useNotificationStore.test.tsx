@@ -18,7 +18,13 @@ describe("useNotificationStore", () => {
   it("fetches notifications successfully and updates the store", async () => {
     // Mocked notifications data
     const mockNotifications = [{ id: 1, is_read: false }];
-    mockedAxios.get.mockResolvedValue({ data: mockNotifications });
+    mockedAxios.get.mockResolvedValue({
+      data: {
+        next_cursor: "older",
+        sync_cursor: "newest",
+        results: mockNotifications,
+      },
+    });
     // Render the hook and fetch notifications
     const { result } = renderHook(() => useNotificationStore());
     act(() => {
@@ -28,6 +34,57 @@ describe("useNotificationStore", () => {
     await waitFor(() => {
       expect(result.current.notifications).toEqual(mockNotifications);
     });
+    expect(result.current.nextCursor).toEqual("older");
+    expect(result.current.cursor).toEqual("newest");
+  });
+
+  it("appends the next page of older notifications", async () => {
+    useNotificationStore.setState({
+      notifications: [{ id: 3, is_read: false } as any],
+      nextCursor: "older",
+    });
+    mockedAxios.get.mockResolvedValue({
+      data: {
+        next_cursor: null,
+        results: [
+          { id: 3, is_read: false },
+          { id: 2, is_read: true },
+        ],
+      },
+    });
+    const { result } = renderHook(() => useNotificationStore());
+    await act(async () => {
+      await result.current.fetchMoreNotifications();
+    });
+    expect(mockedAxios.get.mock.calls[0][1].params).toEqual({
+      cursor: "older",
+    });
+    expect(result.current.notifications.map((n) => n.id)).toEqual([3, 2]);
+    expect(result.current.nextCursor).toBeNull();
+  });
+
+  it("syncs the notifications created since its cursor", async () => {
+    useNotificationStore.setState({
+      notifications: [{ id: 1, is_read: false } as any],
+      cursor: "first",
+    });
+    mockedAxios.get
+      .mockResolvedValueOnce({
+        data: { sync_cursor: "second", has_more: true, results: [{ id: 2 }] },
+      })
+      .mockResolvedValueOnce({
+        data: { sync_cursor: "third", has_more: false, results: [{ id: 3 }] },
+      });
+    const { result } = renderHook(() => useNotificationStore());
+    await act(async () => {
+      await result.current.syncNotifications();
+    });
+    expect(mockedAxios.get.mock.calls.map((call) => call[1].params)).toEqual([
+      { since: "first" },
+      { since: "second" },
+    ]);
+    expect(result.current.notifications.map((n) => n.id)).toEqual([3, 2, 1]);
+    expect(result.current.cursor).toEqual("third");
   });
 
   it("marks a notification as read and updates the store", async () => {
@@ -60,4 +117,113 @@ describe("useNotificationStore", () => {
     // Assert all notifications are marked as read
     expect(result.current.notifications.every((n) => n.is_read)).toBeTruthy();
   });
+
+  it("receives pushed notifications over the WebSocket", async () => {
+    // Mock WebSocket keeping the last instance created
+    const sockets: any[] = [];
+    (global as any).WebSocket = jest.fn().mockImplementation((url) => {
+      const socket = { url, close: jest.fn(), onmessage: null, onclose: null };
+      sockets.push(socket);
+      return socket;
+    });
+    const { result } = renderHook(() => useNotificationStore());
+    act(() => {
+      useNotificationStore.setState({
+        notifications: [{ id: 1, count: 1, is_read: false } as any],
+        cursor: null,
+        websocket: null,
+      });
+      result.current.connectWebSocket();
+    });
+    expect(sockets[0].url).toContain("notifications/?token=testToken");
+
+    // An updated notification replaces its previous version, first in the list
+    act(() => {
+      sockets[0].onmessage({
+        data: JSON.stringify({
+          type: "notification",
+          notification: { id: 2, count: 1, is_read: false },
+          cursor: "first",
+        }),
+      });
+      sockets[0].onmessage({
+        data: JSON.stringify({
+          type: "notification",
+          notification: { id: 1, count: 3, is_read: false },
+          cursor: "second",
+        }),
+      });
+    });
+    expect(result.current.notifications.map((n) => [n.id, n.count])).toEqual([
+      [1, 3],
+      [2, 1],
+    ]);
+    expect(result.current.cursor).toEqual("second");
+
+    // Reconnecting asks for the notifications missed since the cursor
+    act(() => {
+      result.current.disconnectWebSocket();
+      result.current.connectWebSocket();
+    });
+    expect(sockets[1].url).toContain("&cursor=second");
+
+    // A reset resync fetches the notifications again
+    mockedAxios.get.mockResolvedValue({
+      data: {
+        next_cursor: null,
+        sync_cursor: "third",
+        results: [{ id: 3, is_read: false }],
+      },
+    });
+    act(() => {
+      sockets[1].onmessage({
+        data: JSON.stringify({
+          type: "notification_resync",
+          notifications: [],
+          cursor: null,
+          reset: true,
+        }),
+      });
+    });
+    await waitFor(() => {
+      expect(result.current.notifications).toEqual([{ id: 3, is_read: false }]);
+    });
+    act(() => result.current.disconnectWebSocket());
+  });
+
+  it("syncs the missed notifications before reconnecting", async () => {
+    jest.useFakeTimers();
+    const sockets: any[] = [];
+    (global as any).WebSocket = jest.fn().mockImplementation((url) => {
+      const socket = { url, close: jest.fn(), onmessage: null, onclose: null };
+      sockets.push(socket);
+      return socket;
+    });
+    mockedAxios.get.mockResolvedValue({
+      data: { sync_cursor: "second", has_more: false, results: [{ id: 2 }] },
+    });
+    const { result } = renderHook(() => useNotificationStore());
+    act(() => {
+      useNotificationStore.setState({
+        notifications: [{ id: 1, is_read: false } as any],
+        cursor: "first",
+        websocket: null,
+      });
+      result.current.connectWebSocket();
+    });
+
+    // The connection drops, then is resumed from the synced cursor
+    await act(async () => {
+      sockets[0].onclose();
+      await jest.advanceTimersByTimeAsync(5000);
+    });
+    expect(mockedAxios.get).toHaveBeenLastCalledWith(
+      expect.any(String),
+      expect.objectContaining({ params: { since: "first" } }),
+    );
+    expect(result.current.notifications.map((n) => n.id)).toEqual([2, 1]);
+    expect(sockets[1].url).toContain("&cursor=second");
+    act(() => result.current.disconnectWebSocket());
+    jest.useRealTimers();
+  });
 });
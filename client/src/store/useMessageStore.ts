@@ -22,11 +22,13 @@ const SOCKET_URL = `ws://127.0.0.1:8000/`;
 interface MessagesState {
   websocket: any;
   messages: Message[];
+  before: string | null;
   conversations: Conversation[];
   selectedConversation: Conversation | null;
   isSidebarVisible: boolean;
   fetchConversations: (username: string) => void;
   fetchMessages: (conversationId: number) => void;
+  fetchOlderMessages: (conversationId: number) => Promise<void>;
   sendMessage: (
     conversationId: number,
     message: string,
@@ -44,6 +46,7 @@ export const useMessagesStore = create(
   devtools<MessagesState>((set, get) => ({
     conversations: [],
     messages: [],
+    before: null,
     selectedConversation: null,
     isSidebarVisible: true, // Initially, the sidebar is visible
     // Function to fetch conversations for a user
@@ -70,7 +73,27 @@ export const useMessagesStore = create(
         },
       );
       // console.log(response.data);
-      set({ messages: response.data });
+      // Keep the cursor of the older messages to load them on demand
+      set({ messages: response.data.results, before: response.data.before });
+    },
+    // Function to fetch the page of messages preceding the loaded ones
+    fetchOlderMessages: async (conversationId: number) => {
+      const before = get().before;
+      if (!before) return;
+      const { token } = useAuthStore.getState();
+      const response = await axios.get(
+        `${API_URL}/conversations/${conversationId}/messages/`,
+        {
+          headers: {
+            Authorization: `Bearer ${token}`,
+          },
+          params: { before },
+        },
+      );
+      set((state) => ({
+        messages: [...response.data.results, ...state.messages],
+        before: response.data.before,
+      }));
     },
     // Function to select a conversation
     selectConversation: (conversation) => {
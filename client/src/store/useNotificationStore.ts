@@ -8,19 +8,41 @@ import { toast } from "@/components/ui/use-toast";
 // Define the interface for the notification state
 interface NotificationState {
   notifications: Notification[];
+  nextCursor: string | null;
   fetchNotifications: () => Promise<void>;
+  fetchMoreNotifications: () => Promise<void>;
+  syncNotifications: () => Promise<void>;
   markAsRead: (notificationId: number) => Promise<void>;
   markAsReadAll: () => Promise<void>;
+  websocket: WebSocket | null;
+  cursor: string | null;
+  connectWebSocket: () => void;
+  disconnectWebSocket: () => void;
 }
 
 // Define the base URL for notifications endpoint
 const API_URL = process.env.API_URL;
 const NOTIFICATIONS_URL = `${API_URL}/notifications/`;
+const SOCKET_URL = `ws://127.0.0.1:8000/`;
+
+// Put new or updated notifications first, replacing their previous version
+const upsertNotifications = (
+  notifications: Notification[],
+  received: Notification[],
+) => {
+  const ids = new Set(received.map((notification) => notification.id));
+  return [
+    ...[...received].reverse(),
+    ...notifications.filter((notification) => !ids.has(notification.id)),
+  ];
+};
 
 export const useNotificationStore = create(
   devtools<NotificationState>((set, get) => ({
     notifications: [],
-    // Function to fetch notifications
+    // Cursor of the next page of older notifications, null on the last page
+    nextCursor: null,
+    // Function to fetch the newest page of notifications
     fetchNotifications: async () => {
       try {
         const token = localStorage.getItem("token");
@@ -29,13 +51,74 @@ export const useNotificationStore = create(
         const response = await axios.get(NOTIFICATIONS_URL, {
           headers: { Authorization: `Bearer ${token}` },
         });
-        // Update notifications state with fetched data
-        set({ notifications: response.data });
+        // Update notifications state with fetched data, and sync from its newest notification
+        set({
+          notifications: response.data.results,
+          nextCursor: response.data.next_cursor,
+          cursor: response.data.sync_cursor,
+        });
       } catch (error) {
         console.error("Fetching notifications failed:", error);
       }
     },
 
+    // Function to fetch the next page of older notifications
+    fetchMoreNotifications: async () => {
+      const nextCursor = get().nextCursor;
+      if (!nextCursor) return;
+      try {
+        const token = localStorage.getItem("token");
+        // Throw an error if token is not found
+        if (!token) throw new Error("No token found");
+        const response = await axios.get(NOTIFICATIONS_URL, {
+          headers: { Authorization: `Bearer ${token}` },
+          params: { cursor: nextCursor },
+        });
+        // Append the older notifications, skipping any merged into since the first page
+        set((state) => {
+          const ids = new Set(state.notifications.map((n) => n.id));
+          return {
+            notifications: [
+              ...state.notifications,
+              ...response.data.results.filter(
+                (notification: Notification) => !ids.has(notification.id),
+              ),
+            ],
+            nextCursor: response.data.next_cursor,
+          };
+        });
+      } catch (error) {
+        console.error("Fetching more notifications failed:", error);
+      }
+    },
+
+    // Function to fetch only the notifications created or updated since the last sync
+    syncNotifications: async () => {
+      if (!get().cursor) return get().fetchNotifications();
+      try {
+        const token = localStorage.getItem("token");
+        // Throw an error if token is not found
+        if (!token) throw new Error("No token found");
+        let hasMore = true;
+        while (hasMore) {
+          const response = await axios.get(NOTIFICATIONS_URL, {
+            headers: { Authorization: `Bearer ${token}` },
+            params: { since: get().cursor },
+          });
+          set((state) => ({
+            notifications: upsertNotifications(
+              state.notifications,
+              response.data.results,
+            ),
+            cursor: response.data.sync_cursor,
+          }));
+          hasMore = response.data.has_more;
+        }
+      } catch (error) {
+        console.error("Syncing notifications failed:", error);
+      }
+    },
+
     // Function to mark a specific notification as read
     markAsRead: async (notificationId) => {
       try {
@@ -61,6 +144,71 @@ export const useNotificationStore = create(
       }
     },
 
+    // WebSocket pushing new notifications, and the cursor of the last one received
+    websocket: null,
+    cursor: null,
+
+    // Function to connect to the notification WebSocket
+    connectWebSocket: () => {
+      const token = localStorage.getItem("token");
+      if (!token || get().websocket) return;
+      // Ask for the notifications missed while disconnected, if any were received
+      const cursor = get().cursor;
+      const websocket = new WebSocket(
+        `${SOCKET_URL}notifications/?token=${token}${
+          cursor ? `&cursor=${cursor}` : ""
+        }`,
+      );
+
+      // Handle incoming notifications
+      websocket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.type === "notification") {
+          set((state) => ({
+            notifications: upsertNotifications(state.notifications, [
+              data.notification,
+            ]),
+            cursor: data.cursor,
+          }));
+        } else if (data.type === "notification_resync") {
+          // Too much was missed to replay, so the list is fetched again
+          if (data.reset) {
+            set({ cursor: null });
+            get().fetchNotifications();
+            return;
+          }
+          set((state) => ({
+            notifications: upsertNotifications(
+              state.notifications,
+              data.notifications,
+            ),
+            cursor: data.cursor,
+          }));
+        }
+      };
+
+      // Reconnect unless disconnected on purpose
+      websocket.onclose = () => {
+        if (get().websocket !== websocket) return;
+        set({ websocket: null });
+        setTimeout(async () => {
+          // Catch up on what was missed, fetching the list again without a cursor,
+          // so the new connection resumes from the latest notification
+          await get().syncNotifications();
+          get().connectWebSocket();
+        }, 5000);
+      };
+
+      set({ websocket });
+    },
+
+    // Function to disconnect the notification WebSocket
+    disconnectWebSocket: () => {
+      const websocket = get().websocket;
+      set({ websocket: null });
+      websocket?.close();
+    },
+
     // Function to mark all notifications as read
     markAsReadAll: async () => {
       try {
@@ -6,6 +6,8 @@ export interface Notification {
   sender: User | null;
   notification_type: string;
   text: string;
+  count: number;
+  conversation: number | null;
   is_read: boolean;
   created_at: string;
 }
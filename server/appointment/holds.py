@@ -0,0 +1,65 @@
+import logging
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# How long a slot stays reserved for the patient checking out, in seconds
+APPOINTMENT_HOLD_TIMEOUT = getattr(settings, 'APPOINTMENT_HOLD_TIMEOUT', 300)
+
+
+def hold_key(doctor_id, datetime_utc):
+    """
+    Cache key of the hold of a doctor's slot.
+    """
+    return f'slot_hold:{doctor_id}:{datetime_utc.astimezone(dt_timezone.utc).isoformat()}'
+
+
+def get_holder(doctor_id, datetime_utc):
+    """
+    Return the id of the patient holding a slot, or None when it is not held.
+    A slot counts as not held while the cache is unreachable, leaving the unique
+    (doctor, datetime_utc) constraint to settle the booking.
+    """
+    try:
+        return cache.get(hold_key(doctor_id, datetime_utc))
+    except Exception:
+        logger.exception("Failed to read the hold of doctor %s's slot", doctor_id)
+        return None
+
+
+def hold_slot(doctor_id, datetime_utc, patient_id):
+    """
+    Reserve a slot for a patient for APPOINTMENT_HOLD_TIMEOUT seconds. Returns
+    whether the patient holds it, which renews a hold they already had.
+
+    The hold is taken with an atomic `add`, so of several patients racing for a
+    free slot exactly one gets it. Holds expire on their own when abandoned.
+    The hold is granted while the cache is unreachable, as slots count as not held.
+    """
+    key = hold_key(doctor_id, datetime_utc)
+    try:
+        if cache.add(key, patient_id, APPOINTMENT_HOLD_TIMEOUT):
+            return True
+        if cache.get(key) == patient_id:
+            cache.touch(key, APPOINTMENT_HOLD_TIMEOUT)
+            return True
+        return False
+    except Exception:
+        logger.exception("Failed to hold doctor %s's slot", doctor_id)
+        return True
+
+
+def release_slot(doctor_id, datetime_utc, patient_id):
+    """
+    Release a patient's hold of a slot, leaving the holds of other patients in place.
+    A hold that cannot be released while the cache is unreachable simply expires.
+    """
+    key = hold_key(doctor_id, datetime_utc)
+    try:
+        if cache.get(key) == patient_id:
+            cache.delete(key)
+    except Exception:
+        logger.exception("Failed to release the hold of doctor %s's slot", doctor_id)
@@ -0,0 +1,47 @@
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.core.management.base import BaseCommand
+
+from appointment.models import Appointment
+
+
+class Command(BaseCommand):
+    """
+    Resolve the appointments sharing a doctor's slot, which the unique
+    (doctor, datetime_utc) constraint rejects, so it can be migrated in.
+    Run before `migrate`, as migrations.sh does.
+    """
+
+    help = ('Keep the first booking of each doctor slot and clear datetime_utc on the later duplicates, '
+            'which keep their date and time so they can be rescheduled.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the duplicate bookings without changing them.')
+
+    def handle(self, *args, **options):
+        if Appointment._meta.db_table not in connection.introspection.table_names():
+            self.stdout.write('No appointments to deduplicate.')
+            return
+
+        slots = (
+            Appointment.objects.filter(datetime_utc__isnull=False)
+            .values('doctor_id', 'datetime_utc')
+            .annotate(bookings=Count('id'), first_id=Min('id'))
+            .filter(bookings__gt=1)
+        )
+        duplicate_ids = []
+        for slot in slots:
+            ids = list(
+                Appointment.objects.filter(doctor_id=slot['doctor_id'], datetime_utc=slot['datetime_utc'])
+                .exclude(id=slot['first_id'])
+                .values_list('id', flat=True)
+            )
+            self.stdout.write(f"Doctor {slot['doctor_id']} at {slot['datetime_utc'].isoformat()}: "
+                              f"keeping appointment {slot['first_id']}, clearing {', '.join(map(str, ids))}")
+            duplicate_ids.extend(ids)
+
+        if not options['dry_run'] and duplicate_ids:
+            with transaction.atomic():
+                Appointment.objects.filter(id__in=duplicate_ids).update(datetime_utc=None)
+        verb = 'Would clear' if options['dry_run'] else 'Cleared'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {len(duplicate_ids)} duplicate appointments.'))
@@ -16,4 +16,10 @@ class Appointment(models.Model):
     updated_at = models.DateField(auto_now=True)
     
     def __str__(self):
-        return f"{self.patient}'s appointment with {self.doctor} on {self.date} at {self.time}"
\ No newline at end of file
+        return f"{self.patient}'s appointment with {self.doctor} on {self.date} at {self.time}"
+
+    class Meta:
+        constraints = [
+            # A doctor has one appointment per slot; the index also serves the slot lookups
+            models.UniqueConstraint(fields=['doctor', 'datetime_utc'], name='appointment_unique_doctor_slot'),
+        ]
\ No newline at end of file
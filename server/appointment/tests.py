@@ -6,6 +6,15 @@ from .models import Appointment, Conversation
 from datetime import datetime
 import pytz
 from user_profile.models import Doctor
+import threading
+import time
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection
+from django.test import TransactionTestCase
+from .holds import hold_slot
 
 
 User = get_user_model()
@@ -97,4 +106,171 @@ class AppointmentSerializerTestCase(APITestCase):
         self.assertEqual(data['purpose'], 'Checkup')
         self.assertTrue('patient' in data)
         self.assertTrue('doctor' in data)
-        self.assertTrue('conversation' in data)
\ No newline at end of file
+        self.assertTrue('conversation' in data)
+
+
+class AppointmentBookingTestCase(TransactionTestCase):
+    """
+    Test cases for slot holds and concurrent bookings of the same slot.
+    """
+
+    parallelism = 16
+
+    def setUp(self):
+        """
+        Set up a doctor, patients competing for a slot and their clients.
+        """
+        
+        self.doctor_user = User.objects.create_user(username='doctor', email='doctor@example.com', password='testpass123', account_type='doctor')
+        self.patients = [
+            User.objects.create_user(username=f'patient{i}', email=f'patient{i}@example.com', password='testpass123', account_type='patient')
+            for i in range(self.parallelism)
+        ]
+        self.slot = {'doctor': 'doctor', 'datetime_utc': '2030-01-07T09:15:00+00:00', 'purpose': 'Checkup'}
+
+    def client_for(self, patient):
+        """
+        Build a client authenticated as a patient.
+        """
+        
+        client = APIClient()
+        client.force_authenticate(user=patient)
+        return client
+
+    def race(self, function):
+        """
+        Call a function for every patient at once, each from its own thread, and return the results.
+
+        The in-memory SQLite test database fails writes to a locked table instead
+        of waiting like other databases, so those calls are retried.
+        """
+        
+        barrier = threading.Barrier(self.parallelism)
+
+        def run(patient):
+            try:
+                barrier.wait()
+                while True:
+                    try:
+                        return function(patient)
+                    except OperationalError as error:
+                        if 'locked' not in str(error):
+                            raise
+                        time.sleep(0.01)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(self.parallelism) as executor:
+            return list(executor.map(run, self.patients))
+
+    def test_concurrent_bookings_book_a_slot_once(self):
+        """
+        Test that many patients booking the same slot at once leave exactly one booking.
+        """
+        
+        def book(patient):
+            return self.client_for(patient).post(reverse('appointment-list'), self.slot, format='json').status_code
+
+        statuses = self.race(book)
+
+        # A booking retried after a lock error may find its own slot taken, so only the database is authoritative
+        self.assertLessEqual(set(statuses), {status.HTTP_201_CREATED, status.HTTP_400_BAD_REQUEST})
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor_user).count(), 1)
+        # The conversations of the failed bookings were rolled back with them
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_other_integrity_errors_are_raised(self):
+        """
+        Test that an integrity failure other than a taken slot is not reported as a conflict.
+        """
+        
+        with mock.patch.object(Appointment, 'save', side_effect=IntegrityError('NOT NULL constraint failed')):
+            with self.assertRaises(IntegrityError):
+                self.client_for(self.patients[0]).post(reverse('appointment-list'), self.slot, format='json')
+        self.assertFalse(Conversation.objects.exists())
+
+    def test_booking_while_the_cache_is_down(self):
+        """
+        Test that slots count as not held while the cache is unreachable, so bookings still go through.
+        """
+        
+        with mock.patch('appointment.holds.cache.get', side_effect=ConnectionError), self.assertLogs('appointment.holds', 'ERROR'):
+            response = self.client_for(self.patients[0]).post(reverse('appointment-list'), self.slot, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_holding_while_the_cache_is_down(self):
+        """
+        Test that holds are granted while the cache is unreachable instead of failing the request.
+        """
+        
+        failing = {'add.side_effect': ConnectionError, 'get.side_effect': ConnectionError}
+        with mock.patch('appointment.holds.cache', **failing), self.assertLogs('appointment.holds', 'ERROR'):
+            response = self.client_for(self.patients[0]).post(reverse('appointment-hold'), self.slot, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_dedupe_appointments_command(self):
+        """
+        Test that the command keeps the first booking of a slot and clears the slot of the later ones,
+        so the unique constraint can be added.
+        """
+        
+        # SQLite rebuilds the table from the model to drop a constraint
+        constraint = Appointment._meta.constraints[0]
+        with mock.patch.object(Appointment._meta, 'constraints', []), connection.schema_editor() as editor:
+            editor.remove_constraint(Appointment, constraint)
+
+        def restore_constraint():
+            Appointment.objects.all().delete()
+            with connection.schema_editor() as editor:
+                editor.add_constraint(Appointment, constraint)
+        self.addCleanup(restore_constraint)
+
+        slot = datetime(2030, 1, 7, 9, 15, tzinfo=pytz.utc)
+        appointments = [
+            Appointment.objects.create(
+                patient=patient, doctor=self.doctor_user, date=slot.date(), time=slot.time(), datetime_utc=slot,
+                conversation=Conversation.objects.create(patient=patient, doctor=self.doctor_user),
+            )
+            for patient in self.patients[:3]
+        ]
+
+        out = StringIO()
+        call_command('dedupe_appointments', '--dry-run', stdout=out)
+        self.assertIn('Would clear 2 duplicate appointments.', out.getvalue())
+        self.assertEqual(Appointment.objects.filter(datetime_utc=slot).count(), 3)
+
+        out = StringIO()
+        call_command('dedupe_appointments', stdout=out)
+        self.assertIn('Cleared 2 duplicate appointments.', out.getvalue())
+        self.assertEqual(list(Appointment.objects.filter(datetime_utc=slot)), appointments[:1])
+        # The later bookings keep their date and time to be rescheduled
+        self.assertEqual(Appointment.objects.filter(datetime_utc__isnull=True, date=slot.date(), time=slot.time()).count(), 2)
+
+    def test_concurrent_holds_reserve_a_slot_once(self):
+        """
+        Test that of many patients holding the same slot at once exactly one gets it.
+        """
+        
+        slot = datetime(2030, 1, 7, 9, 15, tzinfo=pytz.utc)
+        held = self.race(lambda patient: hold_slot(self.doctor_user.id, slot, patient.id))
+        self.assertEqual(held.count(True), 1)
+
+    def test_held_slot_is_reserved_for_its_holder(self):
+        """
+        Test that a held slot can only be booked by the patient holding it, until released.
+        """
+        
+        holder, other = self.client_for(self.patients[0]), self.client_for(self.patients[1])
+        url = reverse('appointment-list')
+
+        response = holder.post(reverse('appointment-hold'), self.slot, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['datetime_utc'], '2030-01-07T09:15:00+00:00')
+        self.assertEqual(holder.post(reverse('appointment-hold'), self.slot, format='json').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(other.post(reverse('appointment-hold'), self.slot, format='json').status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(other.post(url, self.slot, format='json').status_code, status.HTTP_409_CONFLICT)
+
+        holder.delete(reverse('appointment-hold'), self.slot, format='json')
+        self.assertEqual(other.post(url, self.slot, format='json').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(holder.post(reverse('appointment-hold'), self.slot, format='json').status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,10 +1,13 @@
 from rest_framework import status, viewsets
 from rest_framework.response import Response
+from .holds import APPOINTMENT_HOLD_TIMEOUT, get_holder, hold_slot, release_slot
 from .models import Appointment
 from .serializers import AppointmentSerializer
 from conversation.models import Conversation
 from rest_framework import permissions
-from datetime import timedelta, time
+from rest_framework.decorators import action
+from datetime import timedelta, time, timezone as dt_timezone
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 import pytz
 from dateutil.parser import parse
@@ -44,47 +47,103 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         return queryset
     
     
-    def create(self, request, *args, **kwargs):
-        # Extract data from request
+    def get_slot(self, request):
+        """
+        Return the doctor and aware UTC datetime of the slot a patient's request is
+        for, and the error response to return instead when it is invalid.
+        """
         doctor_username = request.data.get('doctor')
         datetime_utc_str = request.data.get('datetime_utc')
-        purpose = request.data.get('purpose', '')
 
         # Convert datetime_utc to aware datetime object
-        datetime_aware = parse(datetime_utc_str)
-        
+        try:
+            datetime_aware = parse(datetime_utc_str)
+        except (TypeError, ValueError, OverflowError):
+            return None, None, Response({'error': 'Invalid datetime_utc.'}, status=status.HTTP_400_BAD_REQUEST)
+        if timezone.is_naive(datetime_aware):
+            datetime_aware = datetime_aware.replace(tzinfo=dt_timezone.utc)
+
         # Find doctor by username
         try:
             doctor = User.objects.get(username=doctor_username)
             # Check if the user is a patient
             if(request.user.account_type != 'patient'):
-                return Response({'error': 'User is not a patient'}, status=status.HTTP_400_BAD_REQUEST)
-            
+                return None, None, Response({'error': 'User is not a patient'}, status=status.HTTP_400_BAD_REQUEST)
+
         except User.DoesNotExist:
-            return Response({'error': 'Doctor not found'}, status=status.HTTP_404_NOT_FOUND)
-        
+            return None, None, Response({'error': 'Doctor not found'}, status=status.HTTP_404_NOT_FOUND)
+        return doctor, datetime_aware, None
+
+    def create(self, request, *args, **kwargs):
+        """
+        Book a slot for the patient. The slot must not be held by another patient,
+        and the unique (doctor, datetime_utc) constraint settles concurrent bookings.
+        """
+        doctor, datetime_aware, error = self.get_slot(request)
+        if error:
+            return error
+        purpose = request.data.get('purpose', '')
+
+        # Another patient may be checking out this slot
+        holder = get_holder(doctor.id, datetime_aware)
+        if holder is not None and holder != request.user.id:
+            return Response({'error': 'This time is being booked by another patient.'}, status=status.HTTP_409_CONFLICT)
+
         # Check if an appointment already exists at the specified time for the doctor
         if Appointment.objects.filter(datetime_utc=datetime_aware, doctor=doctor).exists():
             return Response({'error': 'An appointment at this time already exists.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Create a conversation between patient and doctor
-        conversation = Conversation.objects.create(
-            patient=request.user,
-            doctor=doctor,
-        )
+        try:
+            with transaction.atomic():
+                # Create a conversation between patient and doctor
+                conversation = Conversation.objects.create(
+                    patient=request.user,
+                    doctor=doctor,
+                )
+
+                # Create appointment instance
+                appointment = Appointment(
+                    patient=request.user,
+                    doctor=doctor,
+                    date=datetime_aware.date(),
+                    time=datetime_aware.time(),
+                    datetime_utc = datetime_aware,
+                    conversation = conversation,
+                    purpose=purpose
+                )
+                appointment.save()
+        except IntegrityError:
+            # A concurrent booking took the slot since the check, and the conversation was rolled back with this one.
+            # Any other integrity failure is not a conflict, so it is raised
+            if not Appointment.objects.filter(datetime_utc=datetime_aware, doctor=doctor).exists():
+                raise
+            return Response({'error': 'An appointment at this time already exists.'}, status=status.HTTP_400_BAD_REQUEST)
+        release_slot(doctor.id, datetime_aware, request.user.id)
 
-        # Create appointment instance
-        appointment = Appointment(
-            patient=request.user,
-            doctor=doctor,
-            date=datetime_aware.date(),
-            time=datetime_aware.time(),
-            datetime_utc = datetime_aware,
-            conversation = conversation,
-            purpose=purpose
-        )
-        appointment.save()
-        
         # Serialize and return the newly created appointment
         serializer = self.get_serializer(appointment)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=['post', 'delete'])
+    def hold(self, request):
+        """
+        Reserve a slot for the patient while they check out, or release it with DELETE.
+        Holds expire after APPOINTMENT_HOLD_TIMEOUT seconds.
+        """
+        doctor, datetime_aware, error = self.get_slot(request)
+        if error:
+            return error
+
+        if request.method == 'DELETE':
+            release_slot(doctor.id, datetime_aware, request.user.id)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        if Appointment.objects.filter(datetime_utc=datetime_aware, doctor=doctor).exists():
+            return Response({'error': 'An appointment at this time already exists.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not hold_slot(doctor.id, datetime_aware, request.user.id):
+            return Response({'error': 'This time is being booked by another patient.'}, status=status.HTTP_409_CONFLICT)
+        return Response({
+            'doctor': doctor.username,
+            'datetime_utc': datetime_aware.astimezone(dt_timezone.utc).isoformat(),
+            'expires_in': APPOINTMENT_HOLD_TIMEOUT,
+        }, status=status.HTTP_201_CREATED)
@@ -0,0 +1,528 @@
+import random
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from itertools import islice
+from zoneinfo import ZoneInfo
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, transaction
+
+from appointment.models import Appointment
+from conversation.models import Call, Conversation, Message
+from medical_record.models import Diagnosis, Disorder, MedicalRecord, Medicine
+from notification.models import Notification
+from user_profile.models import (
+    Address, Doctor, DoctorLanguageProficiency, DoctorQualification, Language, Patient,
+    PatientLanguageProficiency, Qualification, Review, Speciality,
+)
+
+User = get_user_model()
+
+# Row counts of the predefined dataset sizes
+SCALES = {
+    'small': {
+        'doctors': 200, 'patients': 2000, 'conversations': 5000, 'messages': 50000,
+        'appointments': 5000, 'calls': 2000, 'reviews': 2000, 'notifications': 20000,
+    },
+    'medium': {
+        'doctors': 5000, 'patients': 100000, 'conversations': 200000, 'messages': 5000000,
+        'appointments': 200000, 'calls': 100000, 'reviews': 50000, 'notifications': 1000000,
+    },
+    'large': {
+        'doctors': 50000, 'patients': 1000000, 'conversations': 2000000, 'messages': 50000000,
+        'appointments': 2000000, 'calls': 1000000, 'reviews': 500000, 'notifications': 10000000,
+    },
+}
+
+FIRST_NAMES = (
+    'Aisha', 'Alex', 'Amara', 'Ana', 'Ben', 'Carlos', 'Chen', 'Chloe', 'Daniel', 'David', 'Elena', 'Emma',
+    'Fatima', 'Hana', 'Hugo', 'Ines', 'Ivan', 'James', 'Jin', 'Julia', 'Kofi', 'Lars', 'Layla', 'Leo',
+    'Lucia', 'Maria', 'Mateo', 'Mei', 'Mohammed', 'Nadia', 'Noah', 'Olga', 'Omar', 'Priya', 'Rahul',
+    'Rosa', 'Sam', 'Sara', 'Sofia', 'Tariq', 'Tom', 'Yara', 'Yuki', 'Zoe',
+)
+LAST_NAMES = (
+    'Ahmed', 'Andersen', 'Bakker', 'Brown', 'Chen', 'Costa', 'Dubois', 'Fernandez', 'Garcia', 'Haddad',
+    'Ivanova', 'Jones', 'Kim', 'Kowalski', 'Kumar', 'Lee', 'Lopez', 'Martin', 'Mensah', 'Muller', 'Nguyen',
+    'Novak', 'Okafor', 'Patel', 'Rossi', 'Santos', 'Schmidt', 'Silva', 'Smith', 'Suzuki', 'Tanaka',
+    'Taylor', 'Wang', 'Williams', 'Yilmaz',
+)
+# (city, state, country, timezone)
+CITIES = (
+    ('New York', 'NY', 'USA', 'America/New_York'),
+    ('Chicago', 'IL', 'USA', 'America/Chicago'),
+    ('Los Angeles', 'CA', 'USA', 'America/Los_Angeles'),
+    ('Toronto', 'ON', 'Canada', 'America/Toronto'),
+    ('Sao Paulo', 'SP', 'Brazil', 'America/Sao_Paulo'),
+    ('London', 'England', 'UK', 'Europe/London'),
+    ('Berlin', 'Berlin', 'Germany', 'Europe/Berlin'),
+    ('Madrid', 'Madrid', 'Spain', 'Europe/Madrid'),
+    ('Cairo', 'Cairo', 'Egypt', 'Africa/Cairo'),
+    ('Lagos', 'Lagos', 'Nigeria', 'Africa/Lagos'),
+    ('Dubai', 'Dubai', 'UAE', 'Asia/Dubai'),
+    ('Mumbai', 'Maharashtra', 'India', 'Asia/Kolkata'),
+    ('Kathmandu', 'Bagmati', 'Nepal', 'Asia/Kathmandu'),
+    ('Singapore', 'Singapore', 'Singapore', 'Asia/Singapore'),
+    ('Tokyo', 'Tokyo', 'Japan', 'Asia/Tokyo'),
+    ('Sydney', 'NSW', 'Australia', 'Australia/Sydney'),
+)
+STREETS = ('Main St', 'Oak Ave', 'Park Rd', 'High St', 'Station Rd', 'Church Ln', 'Mill Rd', 'River Way', 'Hill St')
+SPECIALITIES = (
+    'Cardiology', 'Dermatology', 'Endocrinology', 'Family Medicine', 'Gastroenterology', 'Neurology',
+    'Oncology', 'Ophthalmology', 'Orthopedics', 'Pediatrics', 'Psychiatry', 'Pulmonology', 'Radiology',
+    'Rheumatology', 'Urology',
+)
+LANGUAGES = (
+    'English', 'Spanish', 'French', 'German', 'Portuguese', 'Arabic', 'Hindi', 'Nepali', 'Mandarin',
+    'Japanese', 'Russian', 'Italian',
+)
+QUALIFICATIONS = (
+    ('MBBS', 'University of London'), ('MD', 'Harvard University'), ('MD', 'Johns Hopkins University'),
+    ('DO', 'Michigan State University'), ('MBBS', 'Tribhuvan University'), ('MS', 'University of Tokyo'),
+    ('PhD', 'Karolinska Institute'), ('FRCS', 'Royal College of Surgeons'), ('MPH', 'University of Toronto'),
+)
+DISORDERS = ('Hypertension', 'Asthma', 'Type 2 diabetes', 'Migraine', 'Eczema', 'Anxiety', 'Arthritis', 'Anemia')
+MEDICINES = ('Lisinopril', 'Salbutamol', 'Metformin', 'Ibuprofen', 'Cetirizine', 'Sertraline', 'Amoxicillin')
+WORDS = (
+    'hello', 'doctor', 'thanks', 'pain', 'since', 'yesterday', 'morning', 'night', 'better', 'worse',
+    'please', 'take', 'twice', 'daily', 'after', 'meals', 'rest', 'water', 'fever', 'cough', 'appointment',
+    'tomorrow', 'results', 'test', 'blood', 'pressure', 'normal', 'follow', 'up', 'week', 'dose', 'feel',
+    'tired', 'sleep', 'headache', 'call', 'me', 'if', 'it', 'gets', 'the', 'a', 'and', 'is', 'your', 'my',
+)
+BLOOD_GROUPS = ('A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-')
+PROFICIENCY_LEVELS = ('native', 'fluent', 'conversational', 'basic')
+AVAILABILITY = ('full-time', 'part-time', 'weekends', 'evenings')
+
+
+def batched(iterable, size):
+    """
+    Split an iterable into lists of at most `size` items, consuming it lazily.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@contextmanager
+def historical_timestamps(*fields):
+    """
+    Let `auto_now` and `auto_now_add` fields keep the values set on the instances,
+    so generated rows can be dated in the past.
+    """
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def sentence(rng, low, high):
+    """
+    Build a sentence of `low` to `high` random words.
+    """
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + '.'
+
+
+class DatasetGenerator:
+    """
+    Generate a synthetic dataset with `bulk_create`, streaming rows in batches
+    that are each written in their own transaction. Only the ids and a few
+    numbers per user and conversation are kept in memory, so datasets with
+    tens of millions of messages can be generated.
+
+    Rows are drawn from random generators seeded by the dataset seed and the
+    position of the row, so the same seed, sizes and start date always produce
+    the same data, whatever the batch size. Only primary keys, which depend on
+    the database, differ between runs.
+
+    `bulk_create` sends no signals. The rows the signals would have created are
+    written explicitly instead (the doctor and patient profiles and the patients'
+    medical records), and the read models kept up by signals (ratings, the search
+    index and the conversation inbox) are rebuilt at the end. Notifications are
+    generated as their own table rather than one per message.
+    """
+
+    def __init__(self, seed=0, doctors=0, patients=0, conversations=0, messages=0, appointments=0,
+                 calls=0, reviews=0, notifications=0, batch_size=5000, prefix='bench',
+                 password='benchmark123', start=None, stdout=None):
+        self.seed = seed
+        self.counts = {
+            'doctors': doctors, 'patients': patients, 'conversations': conversations, 'messages': messages,
+            'appointments': appointments, 'calls': calls, 'reviews': reviews, 'notifications': notifications,
+        }
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.password = password
+        start = start or datetime.now(tz=dt_timezone.utc).date()
+        self.start = datetime.combine(start, time.min, tzinfo=dt_timezone.utc)
+        self.stdout = stdout
+
+        # Positions of the generated users, conversations and their participants
+        self.doctor_ids = array('q')
+        self.doctor_cities = array('b')
+        self.patient_ids = array('q')
+        self.conversation_ids = array('q')
+        self.conversation_patients = array('l')
+        self.conversation_doctors = array('l')
+        self.conversation_starts = array('d')
+        self.conversation_messages = array('l')
+
+    def rng(self, *key):
+        """
+        Return the random generator of a row, seeded by the dataset seed and the row's key.
+        """
+        return random.Random(':'.join(str(part) for part in (self.seed, *key)))
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def generate(self):
+        """
+        Generate the whole dataset and return the number of rows created per model.
+        """
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('The database must return primary keys from bulk inserts.')
+        if User.objects.filter(username__startswith=f'{self.prefix}_').exists():
+            raise CommandError(f"A dataset prefixed '{self.prefix}' already exists.")
+
+        self.password_hash = make_password(self.password)
+        self.create_lookups()
+        created = {
+            'doctors': self.create_doctors(),
+            'patients': self.create_patients(),
+            'conversations': self.create_conversations(),
+        }
+        with historical_timestamps(
+            Message._meta.get_field('timestamp'),
+            Call._meta.get_field('start_time'),
+            Review._meta.get_field('date_created'),
+            Notification._meta.get_field('created_at'),
+        ):
+            created['messages'] = self.create_messages()
+            created['calls'] = self.create_calls()
+            created['appointments'] = self.create_appointments()
+            created['reviews'] = self.create_reviews()
+            created['notifications'] = self.create_notifications()
+
+        self.log('Rebuilding the read models...')
+        call_command('rebuild_doctor_ratings', stdout=self.stdout)
+        call_command('rebuild_doctor_search', stdout=self.stdout)
+        call_command('rebuild_conversation_inbox', stdout=self.stdout)
+        return created
+
+    def write(self, label, rows, create_batch):
+        """
+        Write rows in batches, each in its own transaction, and return how many were written.
+        """
+        total = 0
+        for batch in batched(rows, self.batch_size):
+            with transaction.atomic():
+                create_batch(batch)
+            total += len(batch)
+            self.log(f'{label}: {total}')
+        return total
+
+    def create_lookups(self):
+        """
+        Create the specialities, languages and qualifications that do not exist yet.
+        """
+        def ensure(model, names, **fields):
+            existing = dict(model.objects.filter(name__in=names).values_list('name', 'pk'))
+            model.objects.bulk_create([model(name=name, **fields) for name in names if name not in existing])
+            return [pk for _, pk in sorted(model.objects.filter(name__in=names).values_list('name', 'pk'))]
+
+        self.speciality_ids = ensure(Speciality, SPECIALITIES)
+        self.language_ids = ensure(Language, LANGUAGES)
+        self.qualification_ids = []
+        for name, university in QUALIFICATIONS:
+            qualification, _ = Qualification.objects.get_or_create(name=name, university=university)
+            self.qualification_ids.append(qualification.pk)
+
+    def person(self, account_type, index):
+        """
+        Return the random generator, first name and last name of a generated user.
+        """
+        rng = self.rng(account_type, index)
+        return rng, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+    def build_user(self, account_type, index, first_name, last_name, city):
+        username = f'{self.prefix}_{account_type}{index}'
+        return User(
+            username=username, email=f'{username}@example.com', password=self.password_hash,
+            first_name=first_name, last_name=last_name, account_type=account_type, timezone=CITIES[city][3],
+        )
+
+    def build_address(self, rng, city):
+        name, state, country, _ = CITIES[city]
+        return Address(
+            street=f'{rng.randint(1, 999)} {rng.choice(STREETS)}', city=name, state=state,
+            postal_code=f'{rng.randint(10000, 99999)}', country=country,
+        )
+
+    def create_doctors(self):
+        def rows():
+            for index in range(self.counts['doctors']):
+                rng, first_name, last_name = self.person('doctor', index)
+                yield index, rng, first_name, last_name, rng.randrange(len(CITIES))
+
+        def create_batch(batch):
+            addresses = Address.objects.bulk_create([self.build_address(rng, city) for _, rng, _, _, city in batch])
+            users = User.objects.bulk_create([
+                self.build_user('doctor', index, first_name, last_name, city)
+                for index, _, first_name, last_name, city in batch
+            ])
+            doctors, specialties, languages, qualifications = [], [], [], []
+            for (_, rng, _, _, city), user, address in zip(batch, users, addresses):
+                start_hour = rng.choice((7, 8, 8, 9))
+                doctors.append(Doctor(
+                    user_id=user.pk, hospital_address_id=address.pk, phone=f'+1{rng.randint(2000000000, 9999999999)}',
+                    availability_start=time(start_hour), availability_end=time(start_hour + rng.choice((8, 10, 12))),
+                    experience=rng.randint(0, 40), cost=Decimal(rng.randrange(2000, 30000, 500)) / 100,
+                    currency='USD', availability=rng.choice(AVAILABILITY), description=sentence(rng, 8, 24),
+                ))
+                for speciality_id in rng.sample(self.speciality_ids, rng.randint(1, 3)):
+                    specialties.append(Doctor.specialties.through(doctor_id=user.pk, speciality_id=speciality_id))
+                for language_id in rng.sample(self.language_ids, rng.randint(1, 3)):
+                    languages.append(DoctorLanguageProficiency(
+                        doctor_id=user.pk, language_id=language_id, level=rng.choice(PROFICIENCY_LEVELS)))
+                for qualification_id in rng.sample(self.qualification_ids, rng.randint(1, 2)):
+                    finish_year = rng.randint(1980, 2022)
+                    qualifications.append(DoctorQualification(
+                        doctor_id=user.pk, qualification_id=qualification_id,
+                        start_year=finish_year - rng.randint(2, 6), finish_year=finish_year))
+                self.doctor_ids.append(user.pk)
+                self.doctor_cities.append(city)
+            Doctor.objects.bulk_create(doctors)
+            Doctor.specialties.through.objects.bulk_create(specialties)
+            DoctorLanguageProficiency.objects.bulk_create(languages)
+            DoctorQualification.objects.bulk_create(qualifications)
+
+        return self.write('Doctors', rows(), create_batch)
+
+    def create_patients(self):
+        def rows():
+            for index in range(self.counts['patients']):
+                rng, first_name, last_name = self.person('patient', index)
+                yield index, rng, first_name, last_name, rng.randrange(len(CITIES))
+
+        def create_batch(batch):
+            addresses = Address.objects.bulk_create([self.build_address(rng, city) for _, rng, _, _, city in batch])
+            users = User.objects.bulk_create([
+                self.build_user('patient', index, first_name, last_name, city)
+                for index, _, first_name, last_name, city in batch
+            ])
+            patients, languages = [], []
+            for (_, rng, _, _, _), user, address in zip(batch, users, addresses):
+                patients.append(Patient(
+                    user_id=user.pk, address_id=address.pk, phone=f'+1{rng.randint(2000000000, 9999999999)}',
+                    dob=(self.start - timedelta(days=rng.randint(365, 90 * 365))).date(),
+                    marital_status=rng.choice(('single', 'married', 'divorced', 'widowed')),
+                    gender=rng.choice(('male', 'female', 'other')),
+                    height=Decimal(rng.randint(15000, 20000)) / 100, weight=Decimal(rng.randint(4500, 11000)) / 100,
+                    blood_group=rng.choice(BLOOD_GROUPS),
+                ))
+                for language_id in rng.sample(self.language_ids, rng.randint(1, 2)):
+                    languages.append(PatientLanguageProficiency(
+                        patient_id=user.pk, language_id=language_id, level=rng.choice(PROFICIENCY_LEVELS)))
+                self.patient_ids.append(user.pk)
+            Patient.objects.bulk_create(patients)
+            PatientLanguageProficiency.objects.bulk_create(languages)
+
+            # Every patient gets the medical record their post_save signal would have created
+            records = MedicalRecord.objects.bulk_create([MedicalRecord(patient_id=user.pk) for user in users])
+            disorders, medicines, diagnoses = [], [], []
+            for (_, rng, _, _, _), record in zip(batch, records):
+                for _ in range(rng.randint(0, 2)):
+                    noticed = (self.start - timedelta(days=rng.randint(30, 3650))).date()
+                    disorders.append(Disorder(medical_record_id=record.pk, name=rng.choice(DISORDERS),
+                                              details=sentence(rng, 6, 16), first_noticed=noticed))
+                    diagnoses.append(Diagnosis(medical_record_id=record.pk, name=disorders[-1].name,
+                                               details=sentence(rng, 6, 16), date=noticed + timedelta(days=rng.randint(0, 60))))
+                for _ in range(rng.randint(0, 2)):
+                    started = (self.start - timedelta(days=rng.randint(1, 1000))).date()
+                    medicines.append(Medicine(
+                        medical_record_id=record.pk, name=rng.choice(MEDICINES), dosage=f'{rng.choice((5, 10, 20, 50, 100))} mg',
+                        start_date=started, end_date=started + timedelta(days=rng.randint(7, 180)) if rng.random() < 0.5 else None,
+                    ))
+            Disorder.objects.bulk_create(disorders)
+            Medicine.objects.bulk_create(medicines)
+            Diagnosis.objects.bulk_create(diagnoses)
+
+        return self.write('Patients', rows(), create_batch)
+
+    def message_plan(self, index):
+        """
+        Return the random generator of a conversation's messages and which of them the doctor sends.
+        """
+        rng = self.rng('messages', index)
+        return rng, [rng.random() < 0.45 for _ in range(self.conversation_messages[index])]
+
+    def create_conversations(self):
+        doctors, patients = len(self.doctor_ids), len(self.patient_ids)
+        total = min(self.counts['conversations'], doctors * patients)
+        if not total:
+            return 0
+
+        rng = self.rng('conversations')
+        # Message counts follow a long tail, a few conversations holding most messages
+        weights = array('d', (rng.paretovariate(1.2) for _ in range(total)))
+        scale = self.counts['messages'] / sum(weights)
+        counts = array('l', (int(weight * scale) for weight in weights))
+        for index in rng.choices(range(total), weights=weights, k=self.counts['messages'] - sum(counts)):
+            counts[index] += 1
+
+        def rows():
+            pairs = set()
+            for index in range(total):
+                # Popular doctors, those at the front of the directory, get more conversations
+                while True:
+                    pair = (rng.randrange(patients), min(int(doctors * rng.random() ** 2), doctors - 1))
+                    if pair not in pairs:
+                        pairs.add(pair)
+                        break
+                yield index, pair, self.start - timedelta(days=rng.uniform(1, 365))
+
+        def create_batch(batch):
+            conversations = []
+            for index, (patient, doctor), created_at in batch:
+                self.conversation_patients.append(patient)
+                self.conversation_doctors.append(doctor)
+                self.conversation_starts.append(created_at.timestamp())
+                self.conversation_messages.append(counts[index])
+
+                # Unread messages are the ones sent after the recipient last wrote
+                _, doctor_sends = self.message_plan(index)
+                last_doctor = max((i for i, sent in enumerate(doctor_sends) if sent), default=-1)
+                last_patient = max((i for i, sent in enumerate(doctor_sends) if not sent), default=-1)
+                conversations.append(Conversation(
+                    patient_id=self.patient_ids[patient], doctor_id=self.doctor_ids[doctor],
+                    last_activity_at=created_at,
+                    doctor_unread_count=sum(1 for sent in doctor_sends[last_doctor + 1:] if not sent),
+                    patient_unread_count=sum(1 for sent in doctor_sends[last_patient + 1:] if sent),
+                ))
+            with historical_timestamps(Conversation._meta.get_field('created_at')):
+                for conversation, (_, _, created_at) in zip(conversations, batch):
+                    conversation.created_at = created_at
+                self.conversation_ids.extend(conversation.pk for conversation in Conversation.objects.bulk_create(conversations))
+
+        return self.write('Conversations', rows(), create_batch)
+
+    def timestamp_after(self, rng, index):
+        """
+        Return a random datetime between the start of a conversation and the dataset start date.
+        """
+        return datetime.fromtimestamp(rng.uniform(self.conversation_starts[index], self.start.timestamp()), tz=dt_timezone.utc)
+
+    def create_messages(self):
+        def rows():
+            for index, conversation_id in enumerate(self.conversation_ids):
+                rng, doctor_sends = self.message_plan(index)
+                span = self.start.timestamp() - self.conversation_starts[index]
+                offsets = sorted(rng.random() * span for _ in doctor_sends)
+                patient_id = self.patient_ids[self.conversation_patients[index]]
+                doctor_id = self.doctor_ids[self.conversation_doctors[index]]
+                for sent_by_doctor, offset in zip(doctor_sends, offsets):
+                    yield Message(
+                        conversation_id=conversation_id, sender_id=doctor_id if sent_by_doctor else patient_id,
+                        text=sentence(rng, 2, 30),
+                        timestamp=datetime.fromtimestamp(self.conversation_starts[index] + offset, tz=dt_timezone.utc),
+                    )
+
+        return self.write('Messages', rows(), lambda batch: Message.objects.bulk_create(batch))
+
+    def create_calls(self):
+        def rows():
+            if not self.conversation_ids:
+                return
+            rng = self.rng('calls')
+            for _ in range(self.counts['calls']):
+                index = rng.randrange(len(self.conversation_ids))
+                participants = [self.patient_ids[self.conversation_patients[index]],
+                                self.doctor_ids[self.conversation_doctors[index]]]
+                rng.shuffle(participants)
+                status = rng.choices(('completed', 'missed', 'rejected'), weights=(7, 2, 1))[0]
+                start_time = self.timestamp_after(rng, index)
+                yield Call(
+                    conversation_id=self.conversation_ids[index], caller_id=participants[0], receiver_id=participants[1],
+                    call_type=rng.choice(('video', 'audio')), call_status=status, start_time=start_time,
+                    end_time=start_time + timedelta(seconds=rng.randint(30, 3600)) if status == 'completed' else None,
+                )
+
+        return self.write('Calls', rows(), lambda batch: Call.objects.bulk_create(batch))
+
+    def create_appointments(self):
+        def rows():
+            if not self.conversation_ids:
+                return
+            rng = self.rng('appointments')
+            booked = set()
+            for _ in range(self.counts['appointments']):
+                index = rng.randrange(len(self.conversation_ids))
+                doctor = self.conversation_doctors[index]
+                doctor_tz = ZoneInfo(CITIES[self.doctor_cities[doctor]][3])
+                # Mostly past appointments, with the coming two months partly booked
+                day = (self.start + timedelta(days=rng.randint(-365, 60))).date()
+                local = datetime.combine(day, time(rng.randint(8, 17)), tzinfo=doctor_tz)
+                datetime_utc = local.astimezone(dt_timezone.utc)
+                if (doctor, datetime_utc) in booked:
+                    continue
+                booked.add((doctor, datetime_utc))
+                yield Appointment(
+                    patient_id=self.patient_ids[self.conversation_patients[index]], doctor_id=self.doctor_ids[doctor],
+                    conversation_id=self.conversation_ids[index], date=datetime_utc.date(), time=datetime_utc.time(),
+                    datetime_utc=datetime_utc, purpose=sentence(rng, 3, 12),
+                )
+
+        return self.write('Appointments', rows(), lambda batch: Appointment.objects.bulk_create(batch))
+
+    def create_reviews(self):
+        def rows():
+            rng = self.rng('reviews')
+            total = min(self.counts['reviews'], len(self.conversation_ids))
+            # A conversation has at most one review
+            for index in sorted(rng.sample(range(len(self.conversation_ids)), total)):
+                yield Review(
+                    doctor_id=self.doctor_ids[self.conversation_doctors[index]],
+                    patient_id=self.patient_ids[self.conversation_patients[index]],
+                    conversation_id=self.conversation_ids[index],
+                    rating=rng.choices((1, 2, 3, 4, 5), weights=(1, 1, 3, 8, 12))[0],
+                    comment=sentence(rng, 4, 40), date_created=self.timestamp_after(rng, index),
+                )
+
+        return self.write('Reviews', rows(), lambda batch: Review.objects.bulk_create(batch))
+
+    def create_notifications(self):
+        def rows():
+            if not self.conversation_ids:
+                return
+            rng = self.rng('notifications')
+            ids = {'doctor': self.doctor_ids, 'patient': self.patient_ids}
+            for _ in range(self.counts['notifications']):
+                index = rng.randrange(len(self.conversation_ids))
+                patient, doctor = self.conversation_patients[index], self.conversation_doctors[index]
+                notification_type = rng.choices(('message', 'call', 'appointment'), weights=(8, 1, 1))[0]
+                if notification_type == 'appointment' or rng.random() < 0.5:
+                    sender, recipient = ('patient', patient), ('doctor', doctor)
+                else:
+                    sender, recipient = ('doctor', doctor), ('patient', patient)
+                _, first_name, last_name = self.person(*sender)
+                if notification_type == 'message':
+                    text = f'New message from {self.prefix}_{sender[0]}{sender[1]}'
+                else:
+                    text = f'New {notification_type} from {first_name} {last_name}'
+                created_at = self.timestamp_after(rng, index)
+                yield Notification(
+                    recipient_id=ids[recipient[0]][recipient[1]], sender_id=ids[sender[0]][sender[1]],
+                    notification_type=notification_type, text=text,
+                    is_read=created_at < self.start - timedelta(days=7) or rng.random() < 0.5, created_at=created_at,
+                )
+
+        return self.write('Notifications', rows(), lambda batch: Notification.objects.bulk_create(batch))
@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmark.dataset import SCALES, DatasetGenerator
+
+
+class Command(BaseCommand):
+    """
+    Generate a reproducible synthetic dataset for benchmarking.
+    """
+
+    help = 'Generate a seeded synthetic dataset of doctors, patients, conversations and messages with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small',
+                            help='Predefined dataset size; the count options below override it.')
+        for name in SCALES['small']:
+            parser.add_argument(f'--{name}', type=int, help=f'Number of {name} to generate.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generators.')
+        parser.add_argument('--start-date', type=date.fromisoformat,
+                            help='Date the dataset is generated around (YYYY-MM-DD), today by default. '
+                                 'Pass it along with the seed to reproduce a dataset exactly.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Number of rows written per transaction.')
+        parser.add_argument('--prefix', default='bench', help='Prefix of the generated usernames.')
+        parser.add_argument('--password', default='benchmark123', help='Password of every generated user.')
+
+    def handle(self, *args, **options):
+        counts = dict(SCALES[options['scale']])
+        for name in counts:
+            if options[name] is not None:
+                counts[name] = options[name]
+        if any(count < 0 for count in counts.values()) or options['batch_size'] < 1:
+            raise CommandError('Counts must not be negative and the batch size must be positive.')
+
+        generator = DatasetGenerator(
+            seed=options['seed'], batch_size=options['batch_size'], prefix=options['prefix'],
+            password=options['password'], start=options['start_date'], stdout=self.stdout, **counts,
+        )
+        created = generator.generate()
+        summary = ', '.join(f'{count} {name}' for name, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Generated {summary} with seed {options["seed"]}.'))
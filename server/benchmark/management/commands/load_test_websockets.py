@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from benchmark.websockets import CONSUMERS, run_load_test
+
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'benchmark.websockets.LoadTestChannelLayer'}}
+
+
+class Command(BaseCommand):
+    """
+    Drive simulated websocket clients against the chat or call consumer through the ASGI application.
+    """
+
+    help = 'Load test ChatConsumer or CallConsumer and report connection, fan-out, throughput and memory figures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', choices=list(CONSUMERS), default='chat', help='Consumer to load.')
+        parser.add_argument('--rooms', type=int, default=500, help='Number of conversations or calls.')
+        parser.add_argument('--clients-per-room', type=int, default=2, help='Clients connected to each room.')
+        parser.add_argument('--messages', type=int, default=10, help='Messages sent by each client.')
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help='Average time between the messages of a client, in seconds.')
+        parser.add_argument('--connect-concurrency', type=int, default=100, help='Connections opened at once.')
+        parser.add_argument('--drain-timeout', type=float, default=10.0,
+                            help='Time to wait for undelivered messages once every client has sent, in seconds.')
+        parser.add_argument('--layer', choices=('memory', 'configured'), default='memory',
+                            help="Channel layer: the in-memory one, or CHANNEL_LAYERS (such as a local Redis).")
+        parser.add_argument('--write-behind', action='store_true',
+                            help='Persist chat messages with the write-behind pipeline.')
+        parser.add_argument('--prefix', default='bench', help='Prefix of the generated dataset to run against.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the message timings.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        if options['rooms'] < 1 or options['clients_per_room'] < 1 or options['messages'] < 0:
+            raise CommandError('Rooms and clients per room must be positive, and messages not negative.')
+
+        overrides = {}
+        if options['layer'] == 'memory':
+            overrides['CHANNEL_LAYERS'] = IN_MEMORY_CHANNEL_LAYERS
+        if options['write_behind']:
+            overrides['CHAT_WRITE_BEHIND'] = {**settings.CHAT_WRITE_BEHIND, 'ENABLED': True}
+
+        from server.asgi import application
+
+        with override_settings(**overrides):
+            report = asyncio.run(run_load_test(
+                application, consumer=options['consumer'], rooms=options['rooms'],
+                clients_per_room=options['clients_per_room'], messages=options['messages'],
+                interval=options['interval'], connect_concurrency=options['connect_concurrency'],
+                drain_timeout=options['drain_timeout'], prefix=options['prefix'], seed=options['seed'],
+            ))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{report['connected']} of {report['clients']} {report['consumer']} clients connected")
+        for name in ('connect_ms', 'fanout_ms'):
+            values = ', '.join(f'{key} {value}' for key, value in report[name].items())
+            self.stdout.write(f"{name.replace('_ms', '')} latency (ms): {values}")
+        self.stdout.write(f"delivered {report['delivered']} of {report['expected']} events "
+                          f"({report['delivered_per_second']}/s) for {report['sent']} sent ({report['sent_per_second']}/s)")
+        self.stdout.write(f"memory per connection: {report['memory_per_connection_kb']} KiB")
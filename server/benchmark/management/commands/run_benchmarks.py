@@ -0,0 +1,97 @@
+import json
+import random
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmark.scenarios import SCENARIOS, BenchmarkDataset, find_regressions, get_config, run_scenario
+
+COLUMNS = (
+    ('scenario', 'Scenario'),
+    ('requests', 'Count'),
+    ('errors', 'Errors'),
+    ('p50_ms', 'p50 ms'),
+    ('p95_ms', 'p95 ms'),
+    ('p99_ms', 'p99 ms'),
+    ('max_ms', 'max ms'),
+    ('sql_count_p50', 'SQL p50'),
+    ('sql_count_max', 'SQL max'),
+    ('baseline_p95_ms', 'Base p95'),
+)
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the main API endpoints against a generated dataset and compare the results with a baseline.
+    """
+
+    help = 'Run the API benchmark scenarios and fail when one regressed beyond the threshold.'
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument('--scenario', action='append', choices=list(SCENARIOS),
+                            help='Scenario to run; may be repeated. Every scenario runs by default.')
+        parser.add_argument('--iterations', type=int, default=200, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Unmeasured requests made before each scenario.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the request parameters.')
+        parser.add_argument('--prefix', default='bench', help='Prefix of the generated dataset to run against.')
+        parser.add_argument('--baseline', type=Path, default=Path(config['BASELINE']), help='Baseline JSON file.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Store the results as the new baseline of the scenarios that ran.')
+        parser.add_argument('--threshold', type=float, default=config['THRESHOLD'],
+                            help='Allowed growth of the p95 latency, as a fraction of the baseline.')
+        parser.add_argument('--tolerance-ms', type=float, default=config['TOLERANCE_MS'],
+                            help='Latency growth in milliseconds that never counts as a regression.')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('At least one iteration is required.')
+        options['baseline'] = Path(options['baseline'])
+        baseline = {}
+        if options['baseline'].exists():
+            baseline = json.loads(options['baseline'].read_text())['scenarios']
+
+        dataset = BenchmarkDataset(prefix=options['prefix'])
+        results = {}
+        for name in options['scenario'] or SCENARIOS:
+            # Every scenario draws the same requests for a seed, whichever others run
+            rng = random.Random(f"{options['seed']}:{name}")
+            results[name] = run_scenario(SCENARIOS[name](dataset), rng, options['iterations'], options['warmup'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.write_table(results, baseline)
+
+        if options['save_baseline']:
+            options['baseline'].write_text(json.dumps({
+                'created_at': datetime.now(tz=dt_timezone.utc).isoformat(),
+                'scenarios': {**baseline, **results},
+            }, indent=2) + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Saved the baseline to {options['baseline']}."))
+            return
+
+        regressions = find_regressions(results, baseline, options['threshold'], options['tolerance_ms'])
+        if regressions:
+            raise CommandError('Benchmark regressions:\n' + '\n'.join(regressions))
+        if options['json']:
+            return
+        if not baseline:
+            self.stdout.write('No baseline to compare with. Run with --save-baseline to store one.')
+        else:
+            self.stdout.write(self.style.SUCCESS('No regressions.'))
+
+    def write_table(self, results, baseline):
+        rows = [
+            {'scenario': name, 'baseline_p95_ms': baseline.get(name, {}).get('p95_ms', '-'), **result}
+            for name, result in results.items()
+        ]
+        table = [[label for _, label in COLUMNS]] + [[str(row[key]) for key, _ in COLUMNS] for row in rows]
+        widths = [max(len(line[i]) for line in table) for i in range(len(COLUMNS))]
+        for line in table:
+            self.stdout.write('  '.join(
+                value.ljust(width) if i == 0 else value.rjust(width)
+                for i, (value, width) in enumerate(zip(line, widths))
+            ))
@@ -0,0 +1,220 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import CommandError
+from django.db import connections, transaction
+from rest_framework.test import APIClient
+
+from conversation.models import Conversation
+from monitoring.metrics import Measurement, percentile
+
+from .dataset import LANGUAGES, SPECIALITIES
+
+User = get_user_model()
+
+# One request of a scenario, made as `user` (anonymous when None)
+BenchmarkRequest = namedtuple('BenchmarkRequest', ['user', 'method', 'path', 'data'])
+
+
+def get_config():
+    """
+    Return the benchmark settings with their defaults.
+    """
+    return {
+        'BASELINE': settings.BASE_DIR / 'benchmark' / 'baseline.json',
+        'THRESHOLD': 0.25,
+        'TOLERANCE_MS': 2.0,
+        **getattr(settings, 'BENCHMARKS', {}),
+    }
+
+
+class BenchmarkDataset:
+    """
+    Pools of doctors, patients and conversations of a generated dataset to draw requests from.
+    """
+
+    def __init__(self, prefix='bench', size=500):
+        conversations = list(
+            Conversation.objects.filter(patient__username__startswith=f'{prefix}_')
+            .order_by('id').values_list('id', 'patient_id', 'doctor_id')[:size]
+        )
+        if not conversations:
+            raise CommandError(f"No dataset prefixed '{prefix}' found. Run generate_dataset first.")
+        self.conversations = conversations
+        user_ids = {user_id for _, patient_id, doctor_id in conversations for user_id in (patient_id, doctor_id)}
+        self.users = User.objects.in_bulk(user_ids)
+        self.doctor_ids = sorted({doctor_id for _, _, doctor_id in conversations})
+
+
+class Scenario:
+    """
+    A kind of request to benchmark. Scenarios that write run each request in a
+    transaction that is rolled back, so the dataset is the same for every run.
+    """
+
+    name = None
+    writes = False
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def build(self, rng):
+        """
+        Return the next request to make.
+        """
+        raise NotImplementedError
+
+
+class DoctorDirectoryScenario(Scenario):
+    name = 'doctor_directory'
+
+    def build(self, rng):
+        params = {'speciality': rng.choice(SPECIALITIES), 'ordering': rng.choice(('-rating', 'cost', '-experience'))}
+        if rng.random() < 0.5:
+            params['language'] = rng.choice(LANGUAGES)
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        return BenchmarkRequest(None, 'get', f'/api/user_profile/doctors/?{query}', None)
+
+
+class DoctorDetailScenario(Scenario):
+    name = 'doctor_detail'
+
+    def build(self, rng):
+        doctor = self.dataset.users[rng.choice(self.dataset.doctor_ids)]
+        return BenchmarkRequest(None, 'get', f'/api/user_profile/doctors/{doctor.username}/', None)
+
+
+class ConversationListScenario(Scenario):
+    name = 'conversation_list'
+
+    def build(self, rng):
+        _, patient_id, doctor_id = rng.choice(self.dataset.conversations)
+        user = self.dataset.users[rng.choice((patient_id, doctor_id))]
+        return BenchmarkRequest(user, 'get', '/api/conversations/', None)
+
+
+class ConversationTimelineScenario(Scenario):
+    name = 'conversation_timeline'
+
+    def build(self, rng):
+        conversation_id, patient_id, doctor_id = rng.choice(self.dataset.conversations)
+        user = self.dataset.users[rng.choice((patient_id, doctor_id))]
+        return BenchmarkRequest(user, 'get', f'/api/conversations/{conversation_id}/messages/', None)
+
+
+class AppointmentCreateScenario(Scenario):
+    name = 'appointment_create'
+    writes = True
+
+    def build(self, rng):
+        _, patient_id, doctor_id = rng.choice(self.dataset.conversations)
+        day = datetime.now(tz=dt_timezone.utc).date() + timedelta(days=rng.randint(1, 60))
+        # Generated appointments start on local hours, which never fall at 45 minutes past a UTC hour
+        slot = datetime(day.year, day.month, day.day, rng.randint(0, 23), 45, tzinfo=dt_timezone.utc)
+        return BenchmarkRequest(self.dataset.users[patient_id], 'post', '/api/appointments/', {
+            'doctor': self.dataset.users[doctor_id].username,
+            'datetime_utc': slot.isoformat(),
+            'purpose': 'Benchmark booking',
+        })
+
+
+class MedicalRecordScenario(Scenario):
+    name = 'medical_record'
+
+    def build(self, rng):
+        patient = self.dataset.users[rng.choice(self.dataset.conversations)[1]]
+        return BenchmarkRequest(patient, 'get', f'/api/medical_records/?username={patient.username}', None)
+
+
+class NotificationListScenario(Scenario):
+    name = 'notification_list'
+
+    def build(self, rng):
+        return BenchmarkRequest(rng.choice(list(self.dataset.users.values())), 'get', '/api/notifications/', None)
+
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in (
+        DoctorDirectoryScenario, DoctorDetailScenario, ConversationListScenario, ConversationTimelineScenario,
+        AppointmentCreateScenario, MedicalRecordScenario, NotificationListScenario,
+    )
+}
+
+
+def send(client, scenario, request):
+    """
+    Make a request and return its status, latency in milliseconds and SQL query count.
+    """
+    client.force_authenticate(request.user)
+    measurement = Measurement()
+    start = time.perf_counter()
+    with connections['default'].execute_wrapper(measurement):
+        if scenario.writes:
+            with transaction.atomic():
+                response = getattr(client, request.method)(request.path, request.data, format='json')
+                transaction.set_rollback(True)
+        else:
+            response = getattr(client, request.method)(request.path, request.data, format='json')
+    elapsed = (time.perf_counter() - start) * 1000
+    return response.status_code, elapsed, measurement.sql_count
+
+
+def run_scenario(scenario, rng, iterations, warmup=5):
+    """
+    Run a scenario and return its latency and SQL query count distribution.
+    """
+    client = APIClient()
+    for _ in range(warmup):
+        send(client, scenario, scenario.build(rng))
+
+    latencies, query_counts, errors = [], [], 0
+    for _ in range(iterations):
+        status, elapsed, sql_count = send(client, scenario, scenario.build(rng))
+        errors += status >= 400
+        latencies.append(elapsed)
+        query_counts.append(sql_count)
+
+    latencies.sort()
+    query_counts.sort()
+    return {
+        'requests': iterations,
+        'errors': errors,
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'p50_ms': round(percentile(latencies, 0.50), 2),
+        'p95_ms': round(percentile(latencies, 0.95), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2),
+        'sql_count_p50': percentile(query_counts, 0.50),
+        'sql_count_max': query_counts[-1],
+    }
+
+
+def find_regressions(results, baseline, threshold, tolerance_ms=2.0):
+    """
+    Compare results with a baseline and describe every scenario that regressed.
+
+    A scenario regresses when it returned errors, when its p95 latency grew by
+    more than `threshold` (a fraction) and by more than `tolerance_ms`, or when
+    it made more queries than in the baseline. Scenarios missing from the baseline
+    are not compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        if result['errors']:
+            regressions.append(f"{name}: {result['errors']} of {result['requests']} requests failed")
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        limit = previous['p95_ms'] * (1 + threshold)
+        if result['p95_ms'] > limit and result['p95_ms'] - previous['p95_ms'] > tolerance_ms:
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']} ms exceeds baseline {previous['p95_ms']} ms by more than {threshold:.0%}"
+            )
+        if result['sql_count_p50'] > previous['sql_count_p50']:
+            regressions.append(
+                f"{name}: {result['sql_count_p50']} queries per request, baseline {previous['sql_count_p50']}"
+            )
+    return regressions
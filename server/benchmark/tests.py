@@ -0,0 +1,226 @@
+import json
+import tempfile
+from datetime import date
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from appointment.models import Appointment
+from conversation.models import Conversation, Message
+from medical_record.models import MedicalRecord
+from notification.models import Notification
+from user_profile.models import Doctor, DoctorSearchDocument, Patient, Review
+
+from .scenarios import SCENARIOS, find_regressions
+
+SIZES = {
+    'doctors': 4, 'patients': 10, 'conversations': 15, 'messages': 120,
+    'appointments': 20, 'calls': 10, 'reviews': 8, 'notifications': 30,
+}
+
+
+class GenerateDatasetTestCase(TestCase):
+    """
+    Test case for the synthetic dataset generator.
+    """
+
+    def generate(self, prefix, batch_size=7):
+        """
+        Generate a small dataset with a fixed seed and start date.
+        """
+        
+        options = {name: count for name, count in SIZES.items()}
+        call_command('generate_dataset', seed=3, start_date=date(2024, 6, 1), prefix=prefix,
+                     batch_size=batch_size, stdout=StringIO(), **options)
+
+    def fingerprint(self, prefix):
+        """
+        Describe the generated messages and reviews without their database ids.
+        """
+        
+        messages = Message.objects.filter(sender__username__startswith=prefix).order_by('id')
+        reviews = Review.objects.filter(patient__user__username__startswith=prefix).order_by('id')
+        return (
+            [(message.sender.username.split('_')[1], message.text, message.timestamp) for message in messages],
+            [(review.doctor.user.username.split('_')[1], review.rating, review.comment) for review in reviews],
+        )
+
+    def test_creates_the_rows_signals_would_have_created(self):
+        """
+        Test that users get their profiles and medical records and the read models are rebuilt.
+        """
+        
+        self.generate('bench')
+        self.assertEqual(Doctor.objects.count(), SIZES['doctors'])
+        self.assertEqual(Patient.objects.count(), SIZES['patients'])
+        self.assertEqual(MedicalRecord.objects.count(), SIZES['patients'])
+        self.assertEqual(Conversation.objects.count(), SIZES['conversations'])
+        self.assertEqual(Message.objects.count(), SIZES['messages'])
+        self.assertEqual(Review.objects.count(), SIZES['reviews'])
+        self.assertEqual(Notification.objects.count(), SIZES['notifications'])
+        self.assertLessEqual(Appointment.objects.count(), SIZES['appointments'])
+        self.assertEqual(DoctorSearchDocument.objects.count(), SIZES['doctors'])
+        self.assertEqual(Doctor.objects.aggregate(total=Sum('rating_count'))['total'], SIZES['reviews'])
+
+        for conversation in Conversation.objects.exclude(last_message=None):
+            latest = conversation.messages.order_by('-timestamp', '-id').first()
+            self.assertEqual(conversation.last_message, latest)
+            self.assertEqual(conversation.last_activity_at, latest.timestamp)
+            if latest.sender_id == conversation.patient_id:
+                self.assertGreater(conversation.doctor_unread_count, 0)
+                self.assertEqual(conversation.patient_unread_count, 0)
+
+    def test_same_seed_produces_the_same_data(self):
+        """
+        Test that a seed reproduces the dataset, whatever the batch size.
+        """
+        
+        self.generate('first', batch_size=7)
+        self.generate('second', batch_size=50)
+        self.assertEqual(self.fingerprint('first'), self.fingerprint('second'))
+
+    def test_refuses_to_reuse_a_prefix(self):
+        """
+        Test that generating a dataset twice under the same prefix fails.
+        """
+        
+        self.generate('bench')
+        with self.assertRaises(CommandError):
+            self.generate('bench')
+
+
+class RunBenchmarksTestCase(TestCase):
+    """
+    Test case for the API benchmark suite.
+    """
+
+    def setUp(self):
+        """
+        Set up a small generated dataset and a temporary baseline file.
+        """
+        
+        call_command('generate_dataset', seed=1, stdout=StringIO(), **SIZES)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = Path(directory.name) / 'baseline.json'
+
+    def run_benchmarks(self, *args):
+        """
+        Run every scenario a few times and return the output.
+        """
+        
+        stdout = StringIO()
+        call_command('run_benchmarks', '--iterations=3', '--warmup=1', f'--baseline={self.baseline}', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_every_scenario_succeeds_without_changing_the_dataset(self):
+        """
+        Test that every scenario's requests succeed and that bookings are rolled back.
+        """
+        
+        appointments = Appointment.objects.count()
+        results = json.loads(self.run_benchmarks('--json'))
+        self.assertEqual(set(results), set(SCENARIOS))
+        for name, result in results.items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertEqual(result['requests'], 3)
+            self.assertGreater(result['sql_count_max'], 0)
+        self.assertEqual(Appointment.objects.count(), appointments)
+
+    def test_saved_baseline_is_compared_with(self):
+        """
+        Test that a saved baseline is used by later runs.
+        """
+        
+        self.run_benchmarks('--save-baseline', '--scenario=doctor_detail')
+        self.assertIn('doctor_detail', json.loads(self.baseline.read_text())['scenarios'])
+        self.assertIn('No regressions.', self.run_benchmarks('--scenario=doctor_detail', '--threshold=100'))
+
+
+class FindRegressionsTestCase(SimpleTestCase):
+    """
+    Test case for the comparison of benchmark results with a baseline.
+    """
+
+    def result(self, p95_ms, sql_count_p50=5, errors=0):
+        """
+        Build the result of a scenario.
+        """
+        
+        return {'requests': 10, 'errors': errors, 'p95_ms': p95_ms, 'sql_count_p50': sql_count_p50}
+
+    def test_latency_beyond_threshold_regresses(self):
+        """
+        Test that a p95 latency growing beyond the threshold and the tolerance is a regression.
+        """
+        
+        baseline = {'detail': self.result(100)}
+        self.assertEqual(find_regressions({'detail': self.result(120)}, baseline, 0.25), [])
+        self.assertEqual(len(find_regressions({'detail': self.result(130)}, baseline, 0.25)), 1)
+
+    def test_small_latency_changes_are_tolerated(self):
+        """
+        Test that growth within the absolute tolerance is ignored on fast scenarios.
+        """
+        
+        baseline = {'detail': self.result(2)}
+        self.assertEqual(find_regressions({'detail': self.result(3.5)}, baseline, 0.25, tolerance_ms=2), [])
+
+    def test_more_queries_or_errors_regress(self):
+        """
+        Test that extra queries and failed requests are regressions.
+        """
+        
+        baseline = {'detail': self.result(100)}
+        self.assertEqual(len(find_regressions({'detail': self.result(100, sql_count_p50=6)}, baseline, 0.25)), 1)
+        self.assertEqual(len(find_regressions({'new': self.result(100, errors=1)}, baseline, 0.25)), 1)
+
+
+class LoadTestWebsocketsTestCase(TransactionTestCase):
+    """
+    Test case for the websocket load-testing harness.
+    """
+
+    def setUp(self):
+        """
+        Set up a small generated dataset.
+        """
+        
+        call_command('generate_dataset', seed=2, stdout=StringIO(), **SIZES)
+
+    def load_test(self, consumer):
+        """
+        Run a short load test and return its report.
+        """
+        
+        stdout = StringIO()
+        call_command('load_test_websockets', f'--consumer={consumer}', '--rooms=3', '--clients-per-room=3',
+                     '--messages=2', '--interval=0', '--json', stdout=stdout)
+        return json.loads(stdout.getvalue())
+
+    def test_chat_messages_reach_every_client_of_the_room(self):
+        """
+        Test that every chat message is delivered to every client of its room, the sender included.
+        """
+        
+        messages = Message.objects.count()
+        report = self.load_test('chat')
+        self.assertEqual(report['connected'], 9)
+        self.assertEqual(report['expected'], 3 * 3 * 2 * 3)
+        self.assertEqual(report['delivered'], report['expected'])
+        self.assertGreater(report['fanout_ms']['p50'], 0)
+        self.assertEqual(Message.objects.count(), messages + report['sent'])
+
+    def test_call_signals_reach_the_other_clients(self):
+        """
+        Test that call signalling is delivered to every other client of the call.
+        """
+        
+        report = self.load_test('call')
+        self.assertEqual(report['expected'], 3 * 3 * 2 * 2)
+        self.assertEqual(report['delivered'], report['expected'])
+        self.assertGreater(report['memory_per_connection_kb'], 0)
@@ -0,0 +1,199 @@
+import asyncio
+import json
+import random
+import time
+import tracemalloc
+
+from channels.layers import InMemoryChannelLayer
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from monitoring.metrics import percentile
+
+from .scenarios import BenchmarkDataset
+
+# Consumer: (path of a room, action sent, event type received, whether the sender receives its own events)
+CONSUMERS = {
+    'chat': ('/conversation/{room}/', 'chat_message', 'new_message', True),
+    'call': ('/call/{room}/', 'webrtc_ice_candidate', 'webrtc_ice_candidate', False),
+}
+
+
+class LoadTestChannelLayer(InMemoryChannelLayer):
+    """
+    In-memory channel layer that sweeps expired messages and group memberships at
+    most once per `sweep_interval` seconds.
+
+    The stock in-memory layer sweeps every channel and group on each send and
+    receive, which makes each operation cost as much as the number of open
+    connections and would dominate a load test. Redis expires keys on its own,
+    so a periodic sweep is closer to the layer used in production.
+    """
+
+    def __init__(self, sweep_interval=1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.sweep_interval = sweep_interval
+        self._swept_at = 0.0
+
+    def _clean_expired(self):
+        now = time.monotonic()
+        if now - self._swept_at >= self.sweep_interval:
+            self._swept_at = now
+            super()._clean_expired()
+
+
+def distribution(values):
+    """
+    Percentiles of a list of millisecond durations.
+    """
+    values = sorted(values)
+    return {
+        'p50': round(percentile(values, 0.50), 2),
+        'p95': round(percentile(values, 0.95), 2),
+        'p99': round(percentile(values, 0.99), 2),
+        'max': round(values[-1], 2) if values else 0.0,
+    }
+
+
+class LoadClient:
+    """
+    A simulated websocket client of a room, recording the latency of the events it receives.
+    """
+
+    def __init__(self, application, consumer, room, user, token):
+        path, self.action, self.event_type, _ = CONSUMERS[consumer]
+        self.communicator = WebsocketCommunicator(application, f'{path.format(room=room)}?token={token}')
+        self.user = user
+        self.connected = False
+        self.latencies = []
+
+    async def connect(self, timeout):
+        """
+        Open the websocket and return how long it took, in milliseconds.
+        """
+        start = time.perf_counter()
+        self.connected, _ = await self.communicator.connect(timeout=timeout)
+        return (time.perf_counter() - start) * 1000
+
+    def payload(self):
+        """
+        Build the next message to send, stamped with the time it was sent.
+        """
+        stamp = json.dumps({'sent_at': time.perf_counter()})
+        if self.action == 'chat_message':
+            return {'action': self.action, 'text': stamp, 'sender': self.user.id, 'attachments': []}
+        return {'action': self.action, 'candidate': stamp}
+
+    def sent_at(self, event):
+        """
+        Return the time a received event was sent at, or None if it is not one of the load test's.
+        """
+        if event.get('type') != self.event_type:
+            return None
+        stamp = event['message']['text'] if self.event_type == 'new_message' else event['candidate']
+        try:
+            return json.loads(stamp)['sent_at']
+        except (TypeError, ValueError, KeyError):
+            return None
+
+    async def listen(self):
+        """
+        Record the events received until cancelled.
+        """
+        while True:
+            # A timeout would stop the consumer, so the listener is cancelled instead
+            event = await self.communicator.receive_json_from(timeout=3600)
+            sent_at = self.sent_at(event)
+            if sent_at is not None:
+                self.latencies.append((time.perf_counter() - sent_at) * 1000)
+
+    async def send(self, count, interval, rng):
+        """
+        Send `count` messages, `interval` seconds apart on average, starting at a random offset.
+        """
+        await asyncio.sleep(rng.uniform(0, interval))
+        for _ in range(count):
+            await self.communicator.send_json_to(self.payload())
+            await asyncio.sleep(rng.expovariate(1 / interval) if interval else 0)
+
+
+async def run_load_test(application, consumer='chat', rooms=100, clients_per_room=2, messages=10, interval=1.0,
+                        connect_concurrency=100, connect_timeout=10, drain_timeout=10, prefix='bench', seed=0):
+    """
+    Connect `rooms * clients_per_room` simulated clients to a consumer, have each
+    of them send `messages` messages, and report connection latency, fan-out
+    latency, delivery throughput and memory per connection.
+
+    Chat rooms are conversations of the generated dataset, their clients taking
+    turns as the patient and the doctor, so chat messages are saved like real ones.
+
+    Memory is the Python memory allocated while the clients connected, divided by
+    the number of clients. It includes the simulated clients themselves, so it is
+    an upper bound of what a server process needs per connection.
+    """
+    rng = random.Random(seed)
+    dataset = await asyncio.to_thread(BenchmarkDataset, prefix, rooms)
+    if len(dataset.conversations) < rooms:
+        raise CommandError(f'The dataset has only {len(dataset.conversations)} conversations for {rooms} rooms.')
+    tokens = {user_id: str(AccessToken.for_user(user)) for user_id, user in dataset.users.items()}
+
+    clients = []
+    for conversation_id, patient_id, doctor_id in dataset.conversations[:rooms]:
+        for index in range(clients_per_room):
+            user_id = (patient_id, doctor_id)[index % 2]
+            clients.append(LoadClient(application, consumer, conversation_id, dataset.users[user_id], tokens[user_id]))
+
+    semaphore = asyncio.Semaphore(connect_concurrency)
+
+    async def connect(client):
+        async with semaphore:
+            return await client.connect(connect_timeout)
+
+    tracemalloc.start()
+    baseline_memory = tracemalloc.get_traced_memory()[0]
+    connect_latencies = await asyncio.gather(*(connect(client) for client in clients))
+    memory = tracemalloc.get_traced_memory()[0] - baseline_memory
+    tracemalloc.stop()
+
+    connected = [client for client in clients if client.connected]
+    by_room = {}
+    for client in connected:
+        by_room.setdefault(client.communicator.scope['path'], []).append(client)
+    receives_own = CONSUMERS[consumer][3]
+    expected = sum(
+        messages * len(members) * (len(members) if receives_own else len(members) - 1)
+        for members in by_room.values()
+    )
+
+    listeners = [asyncio.ensure_future(client.listen()) for client in connected]
+    start = time.perf_counter()
+    await asyncio.gather(*(client.send(messages, interval, random.Random(rng.random())) for client in connected))
+    sent_elapsed = time.perf_counter() - start
+
+    # Wait for the deliveries still in flight
+    deadline = time.monotonic() + drain_timeout
+    while sum(len(client.latencies) for client in connected) < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+    await asyncio.gather(*(client.communicator.disconnect() for client in connected), return_exceptions=True)
+
+    latencies = [latency for client in connected for latency in client.latencies]
+    sent = messages * len(connected)
+    return {
+        'consumer': consumer,
+        'clients': len(clients),
+        'connected': len(connected),
+        'connect_ms': distribution(connect_latencies),
+        'sent': sent,
+        'expected': expected,
+        'delivered': len(latencies),
+        'fanout_ms': distribution(latencies),
+        'sent_per_second': round(sent / sent_elapsed, 1) if sent_elapsed else 0.0,
+        'delivered_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'memory_per_connection_kb': round(memory / len(clients) / 1024, 1) if clients else 0.0,
+    }
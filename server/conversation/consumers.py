@@ -2,15 +2,18 @@ import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.conf import settings
+from django.utils import timezone
 
 from .models import Conversation, Message, Attachment
 from django.contrib.auth import get_user_model
 from .models import Conversation, Message, Attachment
+from .pipeline import PendingMessage, pipeline
 from djoser.conf import settings as djoser_settings
-from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError, AuthenticationFailed
+from user.authentication import CachedJWTAuthentication
 from .serializers import AttachmentSerializer, SimpleProfileSerializer
 from user_profile.models import Doctor, Patient
+from user_profile.snapshots import get_cached_snapshot, get_profile_snapshot
 
 User = get_user_model()
 
@@ -25,11 +28,9 @@ class ConsumerUtilities:
         if not token:
             return None
         try:
-            jwt_authentication = JWTAuthentication()
-            validated_token = jwt_authentication.get_validated_token(token)
-            user = jwt_authentication.get_user(validated_token)
+            user, _ = CachedJWTAuthentication().authenticate_token(token)
             return user
-        except (InvalidToken, TokenError):
+        except (InvalidToken, TokenError, AuthenticationFailed):
             return None
 
     @staticmethod
@@ -48,20 +49,9 @@ class ConsumerUtilities:
     @staticmethod
     def serialize_user(self, user):
         """
-        Serialize user data.
+        Serialize user data from the shared profile snapshot cache.
         """        
-        profile_pic_url = None
-        if user.account_type == 'patient':
-            profile_pic_url = Patient.objects.get(user=user).profile_pic.url if Patient.objects.get(user=user).profile_pic else None
-        elif user.account_type == 'doctor':
-            profile_pic_url = Doctor.objects.get(user=user).profile_pic.url if Doctor.objects.get(user=user).profile_pic else None
-            
-        return {
-            'id': user.id, 'username': user.username,
-            'first_name': user.first_name, 'last_name': user.last_name,
-            'email': user.email, 'account_type': user.account_type,
-            'profile_pic': f"{settings.BASE_URL}{profile_pic_url}"
-        }
+        return get_profile_snapshot(user)
 
 
 class ChatConsumer(AsyncWebsocketConsumer):
@@ -89,12 +79,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
+        # Opening the chat reads the conversation
+        await database_sync_to_async(Conversation.mark_as_read_by)(self.conversation_id, self.user)
 
     async def disconnect(self, close_code):
         """
-        Disconnect from websocket.
+        Disconnect from websocket, leaving the messages received meanwhile read.
         """        
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if self.conversation_id is not None:
+            await database_sync_to_async(Conversation.mark_as_read_by)(self.conversation_id, self.user)
 
     async def receive(self, text_data):
         """
@@ -122,12 +116,28 @@ class ChatConsumer(AsyncWebsocketConsumer):
         print(event)
         call = event['call']
         await self.send(text_data=json.dumps({'call': call, 'type': 'new_call'}))
+
+    async def chat_message_ack(self, event):
+        """
+        Receive the acknowledgement of persisted chat messages from room group.
+        """
+        await self.send(text_data=json.dumps({'ack': event['ack'], 'type': 'message_ack'}))
+
+    async def chat_message_failed(self, event):
+        """
+        Receive the failure to persist a chat message from room group.
+        """
+        await self.send(text_data=json.dumps({'provisional_id': event['provisional_id'], 'type': 'message_failed'}))
         
     
     async def handle_chat_message(self, data):
         """
         Handle incoming chat messages.
         """        
+        if settings.CHAT_WRITE_BEHIND.get('ENABLED'):
+            await self.handle_chat_message_write_behind(data)
+            return
+
         # Extract chat message data
         text = data.get('text', '')
         sender_id = data.get('sender', None)
@@ -162,6 +172,43 @@ class ChatConsumer(AsyncWebsocketConsumer):
             )
         else:
             print("Message not saved.")
+
+    async def handle_chat_message_write_behind(self, data):
+        """
+        Broadcast a chat message straight away with a provisional id, then persist it in the background.
+        """
+        attachments = data.get('attachments', [])
+        pending = PendingMessage(
+            conversation_id=self.conversation_id,
+            sender_id=self.user.id,
+            text=data.get('text', ''),
+            attachment_ids=[attachment['id'] for attachment in attachments if 'id' in attachment],
+        )
+        sender_data = get_cached_snapshot(self.user.id)
+        if sender_data is None:
+            sender_data = await database_sync_to_async(ConsumerUtilities.serialize_user)(self, self.user)
+
+        # Prepare the message data for broadcast
+        message_data = {
+            'id': pending.provisional_id,
+            'provisional': True,
+            'text': pending.text,
+            'sender': sender_data,
+            'timestamp': str(timezone.now()),
+            'attachments': attachments,
+            'conversation': self.conversation_id,
+            'type': 'message'
+        }
+
+        # Send message to room group, then hand it over to be saved
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {
+                'type': 'chat_message',
+                'message': message_data
+            }
+        )
+        await pipeline.submit(pending)
             
             
     async def handle_call_message(self, data):
@@ -189,6 +236,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
             sender = User.objects.get(id=sender_id)
             conversation = Conversation.objects.get(id=self.conversation_id)
             message = Message.objects.create(sender=sender, conversation=conversation, text=text)
+            Conversation.record_messages([message])
             sender_data = ConsumerUtilities.serialize_user(self, user=sender)
             # sender_data = SimpleProfileSerializer(sender).data
             return message, sender_data
@@ -258,12 +306,16 @@ class CallConsumer(AsyncWebsocketConsumer):
         # Join room group
         await self.channel_layer.group_add(self.room_group_name, self.channel_name)
         await self.accept()
+        # Opening the chat reads the conversation
+        await database_sync_to_async(Conversation.mark_as_read_by)(self.conversation_id, self.user)
 
     async def disconnect(self, close_code):
         """
-        Disconnect from websocket.
+        Disconnect from websocket, leaving the messages received meanwhile read.
         """        
         await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+        if self.conversation_id is not None:
+            await database_sync_to_async(Conversation.mark_as_read_by)(self.conversation_id, self.user)
 
     async def receive(self, text_data):
         """
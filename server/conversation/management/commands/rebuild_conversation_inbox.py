@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from conversation.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the last message and last activity of every conversation from its messages.
+    """
+
+    help = 'Rebuild the conversation inbox read model (last message and last activity).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset-unread', action='store_true',
+                            help='Also reset the unread counters of every conversation to zero.')
+
+    def handle(self, *args, **options):
+        latest = Message.objects.filter(conversation=OuterRef('pk')).order_by('-timestamp', '-id')
+
+        updates = {
+            'last_message': Subquery(latest.values('id')[:1]),
+            'last_activity_at': Coalesce(Subquery(latest.values('timestamp')[:1]), 'created_at'),
+        }
+        if options['reset_unread']:
+            updates.update(patient_unread_count=0, doctor_unread_count=0)
+
+        updated = Conversation.objects.update(**updates)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the inbox of {updated} conversations.'))
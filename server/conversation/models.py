@@ -1,6 +1,10 @@
+from collections import Counter
+
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
 from django.core.exceptions import ValidationError
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -14,6 +18,17 @@ class Conversation(models.Model):
                                related_name='patient_conversations')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Inbox read model, maintained by record_messages
+    last_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_activity_at = models.DateTimeField(default=timezone.now)
+    patient_unread_count = models.PositiveIntegerField(default=0)
+    doctor_unread_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-last_activity_at']),
+            models.Index(fields=['doctor', '-last_activity_at']),
+        ]
     
     def __str__(self):
         return f"{self.patient}'s conversation with {self.doctor}"
@@ -34,6 +49,69 @@ class Conversation(models.Model):
         """
         self.clean()
         super(Conversation, self).save(*args, **kwargs)
+
+    def unread_count_for(self, user):
+        """
+        Return the number of unread messages in the conversation for the given user.
+        """
+        if user.id == self.patient_id:
+            return self.patient_unread_count
+        if user.id == self.doctor_id:
+            return self.doctor_unread_count
+        return 0
+
+    def mark_as_read(self, user):
+        """
+        Reset the unread message counter of the given user.
+        """
+        field = 'patient_unread_count' if user.id == self.patient_id else 'doctor_unread_count'
+        setattr(self, field, 0)
+        Conversation.objects.filter(id=self.id).update(**{field: 0})
+
+    @classmethod
+    def mark_as_read_by(cls, conversation_id, user):
+        """
+        Reset the unread message counter of the given user in a conversation without
+        loading it, writing nothing when the counter is already zero.
+        """
+        cls.objects.filter(
+            Q(patient_id=user.id, patient_unread_count__gt=0) | Q(doctor_id=user.id, doctor_unread_count__gt=0),
+            id=conversation_id,
+        ).update(
+            patient_unread_count=Case(When(patient_id=user.id, then=Value(0)), default=F('patient_unread_count'),
+                                      output_field=models.PositiveIntegerField()),
+            doctor_unread_count=Case(When(doctor_id=user.id, then=Value(0)), default=F('doctor_unread_count'),
+                                     output_field=models.PositiveIntegerField()),
+        )
+
+    @classmethod
+    def record_messages(cls, messages):
+        """
+        Update the inbox read model of the conversations the given messages were written to.
+
+        The unread counter of the participant who did not send a message is incremented
+        in the database, so the conversations do not need to be loaded first.
+        """
+        latest = {}
+        sent = Counter()
+        for message in messages:
+            current = latest.get(message.conversation_id)
+            if current is None or (message.timestamp, message.id) > (current.timestamp, current.id):
+                latest[message.conversation_id] = message
+            sent[(message.conversation_id, message.sender_id)] += 1
+
+        for (conversation_id, sender_id), count in sent.items():
+            updates = {
+                'doctor_unread_count': F('doctor_unread_count') + Case(
+                    When(patient_id=sender_id, then=Value(count)), default=Value(0)),
+                'patient_unread_count': F('patient_unread_count') + Case(
+                    When(doctor_id=sender_id, then=Value(count)), default=Value(0)),
+            }
+            last_message = latest[conversation_id]
+            if last_message.sender_id == sender_id:
+                updates['last_message'] = last_message
+                updates['last_activity_at'] = last_message.timestamp
+            cls.objects.filter(id=conversation_id).update(**updates)
         
 
 
@@ -47,6 +125,11 @@ class Message(models.Model):
     text = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['conversation', 'timestamp', 'id']),
+        ]
+
     def __str__(self):
         return f"Message from {self.sender} at {self.timestamp}"
 
@@ -97,5 +180,10 @@ class Call(models.Model):
     start_time = models.DateTimeField(auto_now_add=True)
     end_time = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['conversation', 'start_time', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.call_type} call between {self.caller} and {self.receiver} (Status: {self.call_status})"
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import uuid
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from .models import Conversation, Message, Attachment
+from .serializers import AttachmentSerializer
+from .signals import messages_created
+
+logger = logging.getLogger(__name__)
+
+CHAT_WRITE_BEHIND = getattr(settings, 'CHAT_WRITE_BEHIND', {})
+
+
+class PendingMessage:
+    """
+    A chat message that has been broadcast but not yet persisted.
+    """
+
+    def __init__(self, conversation_id, sender_id, text, attachment_ids=None):
+        self.provisional_id = f'tmp-{uuid.uuid4().hex}'
+        self.conversation_id = conversation_id
+        self.sender_id = sender_id
+        self.text = text
+        self.attachment_ids = attachment_ids or []
+
+
+class MessagePipeline:
+    """
+    Write-behind persistence for chat messages.
+
+    Messages are queued once they have been broadcast with a provisional id and
+    written in micro-batches: one bulk insert for the messages, one bulk update
+    for their attachments. Each room is then sent an ack event mapping the
+    provisional ids to the saved messages.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.05):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = None
+        self._loop = None
+        self._worker = None
+
+    async def submit(self, pending):
+        """
+        Queue a message for persistence, starting the worker on first use.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+        await self._queue.put(pending)
+
+    async def _run(self):
+        """
+        Drain the queue, flushing whenever a batch is full or the flush interval has passed.
+        """
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.flush(batch)
+
+    async def flush(self, batch):
+        """
+        Persist a batch and acknowledge it to the rooms its messages were sent to.
+        """
+        channel_layer = get_channel_layer()
+        try:
+            acks = await database_sync_to_async(self.persist)(batch)
+        except Exception:
+            logger.exception("Failed to persist a batch of %d chat messages", len(batch))
+            for pending in batch:
+                await channel_layer.group_send(f'chat_{pending.conversation_id}', {
+                    'type': 'chat_message_failed',
+                    'provisional_id': pending.provisional_id,
+                })
+            return
+
+        for conversation_id, ack in acks:
+            await channel_layer.group_send(f'chat_{conversation_id}', {
+                'type': 'chat_message_ack',
+                'ack': ack,
+            })
+
+    def persist(self, batch):
+        """
+        Write a batch of pending messages and link their attachments.
+        """
+        with transaction.atomic():
+            messages = Message.objects.bulk_create([
+                Message(conversation_id=pending.conversation_id, sender_id=pending.sender_id, text=pending.text)
+                for pending in batch
+            ])
+
+            # Only attachments that are not linked to a message yet can be claimed
+            attachment_ids = [pk for pending in batch for pk in pending.attachment_ids]
+            attachments = Attachment.objects.in_bulk(attachment_ids) if attachment_ids else {}
+            linked = {}
+            for pending, message in zip(batch, messages):
+                for pk in pending.attachment_ids:
+                    attachment = attachments.get(pk)
+                    if attachment is not None and attachment.message_id is None:
+                        attachment.message = message
+                        linked.setdefault(message.id, []).append(attachment)
+            if linked:
+                Attachment.objects.bulk_update([a for group in linked.values() for a in group], ['message'])
+
+            Conversation.record_messages(messages)
+            messages_created.send(sender=Message, messages=messages)
+
+        return [
+            (message.conversation_id, {
+                'provisional_id': pending.provisional_id,
+                'id': message.id,
+                'timestamp': str(message.timestamp),
+                'attachments': AttachmentSerializer(linked.get(message.id, []), many=True).data,
+                'conversation': message.conversation_id,
+            })
+            for pending, message in zip(batch, messages)
+        ]
+
+
+pipeline = MessagePipeline(
+    batch_size=CHAT_WRITE_BEHIND.get('BATCH_SIZE', 100),
+    flush_interval=CHAT_WRITE_BEHIND.get('FLUSH_INTERVAL', 0.05),
+)
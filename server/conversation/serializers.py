@@ -2,11 +2,47 @@ from rest_framework import serializers
 from .models import Conversation, Message, Call, Attachment
 from user_profile.models import Doctor, Patient
 from django.conf import settings
+from django.contrib.auth import get_user_model
 
 
 from user.serializers import UserSerializer
 from user_profile.serializers import DoctorSerializer, PatientSerializer, SimpleProfileSerializer
 
+User = get_user_model()
+
+
+def serialize_profile(user):
+    """
+    Serialize the patient or doctor profile of a user.
+    """
+    if user.account_type == 'patient':
+        profile = getattr(user, 'patient_profile', None)
+    else:
+        profile = getattr(user, 'doctor_profile', None)
+    return SimpleProfileSerializer(profile).data if profile else None
+
+
+def load_profiles(user_ids):
+    """
+    Serialize the profiles of the given users with a single query,
+    returning a mapping of user ID to profile payload.
+    """
+    users = User.objects.filter(id__in=set(user_ids)).select_related('patient_profile', 'doctor_profile')
+    return {user.id: serialize_profile(user) for user in users}
+
+
+class PreloadedProfilesMixin:
+    """
+    Mixin to reuse profile payloads preloaded into the serializer context.
+    """
+
+    def get_profile(self, obj, field):
+        profiles = self.context.get('profiles')
+        user_id = getattr(obj, f'{field}_id')
+        if profiles is not None and user_id in profiles:
+            return profiles[user_id]
+        return serialize_profile(getattr(obj, field))
+
 class AttachmentSerializer(serializers.ModelSerializer):
     """
     Serializer for Attachment model.
@@ -59,6 +95,7 @@ class ConversationSerializer(serializers.ModelSerializer):
     patient = serializers.SerializerMethodField()
     doctor = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Conversation
@@ -73,11 +110,15 @@ class ConversationSerializer(serializers.ModelSerializer):
         return SimpleProfileSerializer(doctor_profile).data if doctor_profile else None
     
     def get_last_message(self, obj):
-        last_message = obj.messages.order_by('-timestamp').first()
+        last_message = obj.last_message
         return MessageSerializer(last_message).data if last_message else None
 
+    def get_unread_count(self, obj):
+        request = self.context.get('request')
+        return obj.unread_count_for(request.user) if request else None
+
 
-class MessageSerializer(serializers.ModelSerializer):
+class MessageSerializer(PreloadedProfilesMixin, serializers.ModelSerializer):
     """
     Serializer for Message model.
     """    
@@ -90,18 +131,14 @@ class MessageSerializer(serializers.ModelSerializer):
         fields = '__all__'
         
     def get_sender(self, obj):
-        if(obj.sender.account_type == 'patient'):
-            sender_profile = obj.sender.patient_profile
-        else :
-            sender_profile = obj.sender.doctor_profile
-        return SimpleProfileSerializer(sender_profile).data if sender_profile else None
+        return self.get_profile(obj, 'sender')
     
     def get_type(self, obj):
         return 'message'
     
 
 
-class CallSerializer(serializers.ModelSerializer):
+class CallSerializer(PreloadedProfilesMixin, serializers.ModelSerializer):
     """
     Serializer for Call model.
     """    
@@ -116,15 +153,38 @@ class CallSerializer(serializers.ModelSerializer):
         return 'call'
     
     def get_caller(self, obj):
-        if(obj.caller.account_type == 'patient'):
-            caller_profile = obj.caller.patient_profile
-        else :
-            caller_profile = obj.caller.doctor_profile
-        return SimpleProfileSerializer(caller_profile).data if caller_profile else None
+        return self.get_profile(obj, 'caller')
     
     def get_receiver(self, obj):
-        if(obj.receiver.account_type == 'patient'):
-            receiver_profile = obj.receiver.patient_profile
-        else :
-            receiver_profile = obj.receiver.doctor_profile
-        return SimpleProfileSerializer(receiver_profile).data if receiver_profile else None
\ No newline at end of file
+        return self.get_profile(obj, 'receiver')
+
+
+class TimelineSerializer(serializers.BaseSerializer):
+    """
+    Serializer for a page of timeline items, mixing messages and calls.
+
+    The profiles of every sender, caller and receiver on the page are loaded in
+    one query and serialized once per distinct user, so the number of queries
+    does not grow with the size of the page. Attachments are expected to be
+    prefetched on the messages.
+    """
+
+    def to_representation(self, items):
+        user_ids = []
+        for item in items:
+            if isinstance(item, Message):
+                user_ids.append(item.sender_id)
+            elif isinstance(item, Call):
+                user_ids.extend([item.caller_id, item.receiver_id])
+
+        context = {**self.context, 'profiles': load_profiles(user_ids) if user_ids else {}}
+        message_serializer = MessageSerializer(context=context)
+        call_serializer = CallSerializer(context=context)
+
+        serialized_data = []
+        for item in items:
+            if isinstance(item, Message):
+                serialized_data.append(message_serializer.to_representation(item))
+            elif isinstance(item, Call):
+                serialized_data.append(call_serializer.to_representation(item))
+        return serialized_data
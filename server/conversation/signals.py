@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Sent with `messages=[...]` after messages are written in bulk,
+# since bulk_create does not send post_save for each of them.
+messages_created = Signal()
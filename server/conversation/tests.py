@@ -4,8 +4,19 @@ from django.urls import reverse
 from rest_framework import status
 from .models import Attachment, Call, Conversation, Message
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase, override_settings
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from rest_framework_simplejwt.tokens import AccessToken
+from notification.models import Notification
+from .pipeline import MessagePipeline, PendingMessage
+from .routing import websocket_urlpatterns
 User = get_user_model()
 
 
@@ -101,3 +112,332 @@ class ConversationViewSetTests(APITestCase):
         
         self.patient_user.delete()
         self.doctor_user.delete()
+
+
+class MessageTimelineTests(APITestCase):
+    """
+    Test cases for the merged message and call timeline.
+    """
+
+    def setUp(self):
+        """
+        Set up a conversation with interleaved messages and calls.
+        """
+        
+        self.client = APIClient()
+        self.patient_user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+        self.doctor_user = User.objects.create_user(username="doctor", email='doctor@example.com', password="testpass123", account_type="doctor")
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+        self.url = reverse('conversation-messages', args=[self.conversation.id])
+
+        for i in range(5):
+            Message.objects.create(conversation=self.conversation, sender=self.patient_user, text=f"Message {i}")
+            if i % 2 == 0:
+                Call.objects.create(conversation=self.conversation, caller=self.doctor_user, receiver=self.patient_user, call_type='audio')
+
+        self.client.force_authenticate(user=self.patient_user)
+
+    def test_latest_page_is_chronological(self):
+        """
+        Test that the default page returns the most recent items in chronological order.
+        """
+        
+        response = self.client.get(self.url, {'page_size': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['type'] for item in response.data['results']], ['message', 'message', 'call'])
+        self.assertEqual(response.data['results'][1]['text'], "Message 4")
+        self.assertIsNotNone(response.data['before'])
+        self.assertIsNotNone(response.data['after'])
+
+    def test_paging_back_through_history(self):
+        """
+        Test that following the `before` cursor walks the whole timeline without gaps or repeats.
+        """
+        
+        seen = []
+        params = {'page_size': 3}
+        while True:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen = [(item['type'], item['id']) for item in response.data['results']] + seen
+            if not response.data['before']:
+                break
+            params = {'page_size': 3, 'before': response.data['before']}
+
+        self.assertEqual(len(seen), Message.objects.count() + Call.objects.count())
+        self.assertEqual(len(set(seen)), len(seen))
+        self.assertEqual(seen[0], ('message', Message.objects.order_by('id').first().id))
+
+    def test_after_cursor_returns_newer_items(self):
+        """
+        Test that the `after` cursor only returns items created after the page.
+        """
+        
+        response = self.client.get(self.url)
+        after = response.data['after']
+
+        response = self.client.get(self.url, {'after': after})
+        self.assertEqual(response.data['results'], [])
+
+        Message.objects.create(conversation=self.conversation, sender=self.doctor_user, text="Newer")
+        response = self.client.get(self.url, {'after': after})
+        self.assertEqual([item['text'] for item in response.data['results']], ["Newer"])
+
+    def test_invalid_cursor(self):
+        """
+        Test that a malformed cursor is rejected.
+        """
+        
+        response = self.client.get(self.url, {'before': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_outsider_cannot_read_timeline(self):
+        """
+        Test that users outside the conversation cannot read its timeline.
+        """
+        
+        outsider = User.objects.create_user(username="other", email='other@example.com', password="testpass123", account_type="patient")
+        self.client.force_authenticate(user=outsider)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TimelineSerializationQueryTests(APITestCase):
+    """
+    Test cases for the query cost of serializing the timeline.
+    """
+
+    def setUp(self):
+        """
+        Set up a conversation with messages, attachments and calls.
+        """
+        
+        self.client = APIClient()
+        self.patient_user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+        self.doctor_user = User.objects.create_user(username="doctor", email='doctor@example.com', password="testpass123", account_type="doctor")
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+        self.url = reverse('conversation-messages', args=[self.conversation.id])
+
+        for i in range(40):
+            sender = self.patient_user if i % 2 else self.doctor_user
+            message = Message.objects.create(conversation=self.conversation, sender=sender, text=f"Message {i}")
+            Attachment.objects.create(message=message, file=f"attachments/file_{i}.txt")
+            if i % 5 == 0:
+                Call.objects.create(conversation=self.conversation, caller=sender, receiver=self.patient_user, call_type='video')
+
+        self.client.force_authenticate(user=self.patient_user)
+
+    def count_queries(self, page_size):
+        """
+        Count the queries needed to fetch a page of the given size.
+        """
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'page_size': page_size})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), page_size)
+        return len(queries)
+
+    def test_query_count_is_constant(self):
+        """
+        Test that the number of queries does not grow with the page size.
+        """
+        
+        self.assertEqual(self.count_queries(10), self.count_queries(45))
+
+    def test_profiles_and_attachments_are_serialized(self):
+        """
+        Test that the batched serializer produces the full message payload.
+        """
+        
+        response = self.client.get(self.url, {'page_size': 2})
+        message = response.data['results'][-1]
+        self.assertEqual(message['sender']['username'], self.patient_user.username)
+        self.assertEqual(len(message['attachments']), 1)
+        self.assertEqual(message['attachments'][0]['file_name'], "file_39.txt")
+
+
+class ConversationInboxTests(APITestCase):
+    """
+    Test cases for the conversation inbox read model.
+    """
+
+    def setUp(self):
+        """
+        Set up two conversations for the same patient.
+        """
+        
+        self.client = APIClient()
+        self.patient_user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+        self.doctor_user = User.objects.create_user(username="doctor", email='doctor@example.com', password="testpass123", account_type="doctor")
+        self.other_doctor = User.objects.create_user(username="doctor2", email='doctor2@example.com', password="testpass123", account_type="doctor")
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+        self.other_conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.other_doctor)
+
+    def test_posting_message_updates_inbox(self):
+        """
+        Test that posting a message records it as the last message and counts it as unread for the recipient.
+        """
+        
+        self.client.force_authenticate(user=self.doctor_user)
+        url = reverse('conversation-messages', args=[self.conversation.id])
+        response = self.client.post(url, {'text': "How are you feeling?", 'conversation': self.conversation.id}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message.text, "How are you feeling?")
+        self.assertEqual(self.conversation.patient_unread_count, 1)
+        self.assertEqual(self.conversation.doctor_unread_count, 0)
+
+    def test_list_is_ordered_by_recent_activity(self):
+        """
+        Test that the inbox lists the most recently active conversation first, with unread counts.
+        """
+        
+        message = Message.objects.create(conversation=self.conversation, sender=self.doctor_user, text="Latest")
+        Conversation.record_messages([message])
+
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.get(reverse('conversation-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['id'], self.conversation.id)
+        self.assertEqual(response.data[0]['last_message']['text'], "Latest")
+        self.assertEqual(response.data[0]['unread_count'], 1)
+        self.assertIsNone(response.data[1]['last_message'])
+
+    def test_list_query_count_is_constant(self):
+        """
+        Test that listing the inbox does not query per conversation.
+        """
+        
+        self.client.force_authenticate(user=self.patient_user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('conversation-list'))
+        baseline = len(queries)
+
+        for i in range(5):
+            doctor = User.objects.create_user(username=f"doc{i}", email=f'doc{i}@example.com', password="testpass123", account_type="doctor")
+            conversation = Conversation.objects.create(patient=self.patient_user, doctor=doctor)
+            Conversation.record_messages([Message.objects.create(conversation=conversation, sender=doctor, text="Hi")])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('conversation-list'))
+        self.assertEqual(len(response.data), 7)
+        self.assertEqual(len(queries), baseline + 1)  # attachments prefetch once there are messages
+
+    def test_mark_as_read(self):
+        """
+        Test that marking a conversation as read resets the user's unread counter.
+        """
+        
+        Conversation.record_messages([Message.objects.create(conversation=self.conversation, sender=self.doctor_user, text="Hi")])
+
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.post(reverse('conversation-mark-as-read', args=[self.conversation.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.patient_unread_count, 0)
+
+    def test_reading_the_latest_messages_marks_as_read(self):
+        """
+        Test that loading the latest messages resets the reader's unread counter, but paging back does not.
+        """
+        
+        messages = [Message.objects.create(conversation=self.conversation, sender=self.doctor_user, text=f"Hi {i}") for i in range(3)]
+        Conversation.record_messages(messages)
+        self.client.force_authenticate(user=self.patient_user)
+        url = reverse('conversation-messages', args=[self.conversation.id])
+
+        before = self.client.get(url, {'page_size': 1}).data['before']
+        Conversation.record_messages([Message.objects.create(conversation=self.conversation, sender=self.doctor_user, text="Later")])
+        self.client.get(url, {'before': before})
+        self.conversation.refresh_from_db()
+        self.assertEqual((self.conversation.patient_unread_count, self.conversation.doctor_unread_count), (1, 0))
+
+        self.client.get(url)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.patient_unread_count, 0)
+
+
+@override_settings(CHAT_WRITE_BEHIND={'ENABLED': True})
+class WriteBehindPipelineTests(TransactionTestCase):
+    """
+    Test cases for the write-behind chat message pipeline.
+    """
+
+    def setUp(self):
+        """
+        Set up a conversation and an unlinked attachment.
+        """
+        
+        self.patient_user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+        self.doctor_user = User.objects.create_user(username="doctor", email='doctor@example.com', password="testpass123", account_type="doctor")
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+        self.attachment = Attachment.objects.create(file="attachments/report.txt")
+
+    def test_persist_batch(self):
+        """
+        Test that a batch is written in bulk with its attachments, inbox counters and notifications.
+        """
+        
+        batch = [
+            PendingMessage(self.conversation.id, self.patient_user.id, "First", [self.attachment.id]),
+            PendingMessage(self.conversation.id, self.patient_user.id, "Second"),
+        ]
+        acks = MessagePipeline().persist(batch)
+
+        self.assertEqual([ack['provisional_id'] for _, ack in acks], [pending.provisional_id for pending in batch])
+        self.assertEqual(Message.objects.count(), 2)
+        self.attachment.refresh_from_db()
+        self.assertEqual(self.attachment.message_id, acks[0][1]['id'])
+        self.assertEqual(len(acks[0][1]['attachments']), 1)
+
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.doctor_unread_count, 2)
+        self.assertEqual(self.conversation.last_message.text, "Second")
+        self.assertEqual(Notification.objects.filter(recipient=self.doctor_user, notification_type='message').count(), 2)
+
+    def test_broadcast_before_ack(self):
+        """
+        Test that the consumer broadcasts a provisional message and acknowledges it once saved.
+        """
+        
+        async def exchange():
+            token = str(AccessToken.for_user(self.patient_user))
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/conversation/{self.conversation.id}/?token={token}")
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+
+            await communicator.send_json_to({'action': 'chat_message', 'text': "Hello", 'attachments': []})
+            broadcast = await communicator.receive_json_from(timeout=5)
+            ack = await communicator.receive_json_from(timeout=5)
+            await communicator.disconnect()
+            return broadcast, ack
+
+        broadcast, ack = async_to_sync(exchange)()
+        self.assertEqual(broadcast['type'], 'new_message')
+        self.assertTrue(broadcast['message']['provisional'])
+        self.assertEqual(ack['type'], 'message_ack')
+        self.assertEqual(ack['ack']['provisional_id'], broadcast['message']['id'])
+        self.assertEqual(Message.objects.get(id=ack['ack']['id']).text, "Hello")
+
+    def test_chat_socket_marks_as_read(self):
+        """
+        Test that opening the chat, and leaving it after messages arrived, resets the user's unread counter.
+        """
+        
+        conversations = Conversation.objects.filter(id=self.conversation.id)
+        conversations.update(doctor_unread_count=3, patient_unread_count=1)
+
+        async def chat():
+            token = str(AccessToken.for_user(self.doctor_user))
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/conversation/{self.conversation.id}/?token={token}")
+            await communicator.connect()
+            opened = await database_sync_to_async(conversations.values_list('doctor_unread_count', 'patient_unread_count').get)()
+            # A message arrives while the chat is open
+            await database_sync_to_async(conversations.update)(doctor_unread_count=1)
+            await communicator.disconnect()
+            return opened
+
+        self.assertEqual(async_to_sync(chat)(), (0, 1))
+        self.assertEqual(conversations.get().doctor_unread_count, 0)
@@ -0,0 +1,140 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import F, Q, Value, CharField
+from rest_framework.exceptions import ValidationError
+
+from .models import Message, Call
+
+
+# Items of the same timestamp are ordered by kind and then by id,
+# so every position in the timeline is unique and can be used as a cursor.
+MESSAGE = 'message'
+CALL = 'call'
+
+
+def encode_cursor(timestamp, kind, pk):
+    """
+    Encode a timeline position into an opaque cursor string.
+    """
+    raw = json.dumps([timestamp.isoformat(), kind, pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor string back into a (timestamp, kind, id) position.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, kind, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if kind not in (MESSAGE, CALL):
+            raise ValueError(kind)
+        return datetime.fromisoformat(timestamp), kind, int(pk)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValidationError({'cursor': 'Invalid cursor.'})
+
+
+class TimelinePage:
+    """
+    A slice of the timeline, in chronological order, with cursors
+    pointing at the older and newer neighbouring slices.
+    """
+
+    def __init__(self, items, before=None, after=None):
+        self.items = items
+        self.before = before
+        self.after = after
+
+
+class ConversationTimeline:
+    """
+    Merged, chronologically ordered view over the messages and calls of a conversation.
+
+    The merge happens in the database with a UNION of the two tables, so a page
+    only reads the rows it returns instead of the whole conversation history.
+    """
+
+    default_page_size = 50
+    max_page_size = 200
+
+    def __init__(self, conversation_id):
+        self.conversation_id = conversation_id
+
+    def _positions(self, model, kind, time_field, cursor, direction):
+        """
+        Build the (id, kind, ts) queryset for one table, restricted to the
+        positions strictly before or after the cursor.
+        """
+        queryset = model.objects.filter(conversation_id=self.conversation_id)
+
+        if cursor:
+            timestamp, cursor_kind, pk = cursor
+            lookup = 'lt' if direction == 'before' else 'gt'
+            condition = Q(**{f'{time_field}__{lookup}': timestamp})
+            # Rows sharing the cursor's timestamp are compared on (kind, id)
+            if kind == cursor_kind:
+                condition |= Q(**{time_field: timestamp, f'id__{lookup}': pk})
+            elif (kind < cursor_kind) == (direction == 'before'):
+                condition |= Q(**{time_field: timestamp})
+            queryset = queryset.filter(condition)
+
+        return queryset.annotate(
+            kind=Value(kind, output_field=CharField()),
+            ts=F(time_field),
+        ).values_list('id', 'kind', 'ts').order_by()
+
+    def page(self, before=None, after=None, page_size=None):
+        """
+        Return a page of the timeline.
+
+        Without a cursor the most recent items are returned. `before` pages back
+        through older items and `after` pages forward through newer ones.
+        """
+        page_size = min(page_size or self.default_page_size, self.max_page_size)
+        direction = 'after' if after and not before else 'before'
+        cursor = decode_cursor(after if direction == 'after' else before) if (before or after) else None
+
+        messages = self._positions(Message, MESSAGE, 'timestamp', cursor, direction)
+        calls = self._positions(Call, CALL, 'start_time', cursor, direction)
+
+        if direction == 'before':
+            ordering = ('-ts', '-kind', '-id')
+        else:
+            ordering = ('ts', 'kind', 'id')
+
+        # Fetch one extra row to know whether there is more to page through
+        rows = list(messages.union(calls, all=True).order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == 'before':
+            rows.reverse()
+
+        items = self._load(rows)
+
+        # Older items exist when the page was cut short or when paging forward
+        # from a cursor; newer items may always arrive, so `after` is kept for polling.
+        before_cursor = after_cursor = None
+        if rows:
+            first, last = rows[0], rows[-1]
+            if has_more or direction == 'after':
+                before_cursor = encode_cursor(first[2], first[1], first[0])
+            after_cursor = encode_cursor(last[2], last[1], last[0])
+        elif direction == 'after':
+            after_cursor = after
+
+        return TimelinePage(items, before=before_cursor, after=after_cursor)
+
+    def _load(self, rows):
+        """
+        Load the model instances for the given positions, preserving their order.
+        """
+        message_ids = [pk for pk, kind, _ in rows if kind == MESSAGE]
+        call_ids = [pk for pk, kind, _ in rows if kind == CALL]
+
+        instances = {
+            MESSAGE: Message.objects.prefetch_related('attachments').in_bulk(message_ids) if message_ids else {},
+            CALL: Call.objects.in_bulk(call_ids) if call_ids else {},
+        }
+        return [instances[kind][pk] for pk, kind, _ in rows if pk in instances[kind]]
@@ -1,14 +1,15 @@
-from itertools import chain
 from django.core.exceptions import ValidationError
 from rest_framework import viewsets, status
 from .models import Conversation, Message, Call,Attachment
-from .serializers import ConversationSerializer, MessageSerializer, CallSerializer, AttachmentSerializer
+from .serializers import ConversationSerializer, MessageSerializer, CallSerializer, AttachmentSerializer, TimelineSerializer
+from .timeline import ConversationTimeline
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.db import models
-from rest_framework.exceptions import NotFound
+from rest_framework.exceptions import NotFound, ValidationError as DRFValidationError
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework.decorators import action
 
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
@@ -28,7 +29,25 @@ class ConversationViewSet(viewsets.ModelViewSet):
         """
         user = self.request.user
 
-        return Conversation.objects.filter(models.Q(patient=user) | models.Q(doctor=user))
+        return Conversation.objects.filter(
+            models.Q(patient=user) | models.Q(doctor=user)
+        ).select_related(
+            'patient__patient_profile',
+            'doctor__doctor_profile',
+            'last_message__sender__patient_profile',
+            'last_message__sender__doctor_profile',
+        ).prefetch_related(
+            'last_message__attachments'
+        ).order_by('-last_activity_at', '-id')
+
+    @action(detail=True, methods=['post'])
+    def mark_as_read(self, request, pk=None):
+        """
+        A custom action to reset the unread message counter of the authenticated user.
+        """
+        conversation = self.get_object()
+        conversation.mark_as_read(request.user)
+        return Response({'status': 'conversation marked as read'}, status=status.HTTP_200_OK)
 
 
 class MessageViewSet(viewsets.ModelViewSet):
@@ -41,11 +60,10 @@ class MessageViewSet(viewsets.ModelViewSet):
     parser_classes = (MultiPartParser, FormParser, JSONParser)
 
     
-    def get_queryset(self):
+    def get_conversation_id(self):
+        """
+        Return the conversation ID from the URL, ensuring the user is part of the conversation.
         """
-        This view should return a combined list of messages and calls within a conversation, sorted by timestamp.
-        """        
-               
         user = self.request.user
 
         conversation_id = self.kwargs.get('conversation_id')
@@ -60,36 +78,47 @@ class MessageViewSet(viewsets.ModelViewSet):
             ).exists():
             raise NotFound("Conversation not found")
 
-        # Fetch messages and calls
-        messages = Message.objects.filter(conversation_id=conversation_id)
-        calls = Call.objects.filter(conversation_id=conversation_id)
+        return conversation_id
 
-        # Combine and sort by timestamp
-        combined = sorted(
-            chain(messages, calls), 
-            key=lambda instance: instance.timestamp if isinstance(instance, Message) else instance.start_time
-        )
-        
-        return combined
+    def get_queryset(self):
+        """
+        This view should return the messages within a conversation.
+        """
+        return Message.objects.filter(conversation_id=self.get_conversation_id())
     
     def list(self, request, *args, **kwargs):
         """
-        Retrieve a list of messages within a conversation, along with any associated calls.
-        """        
-        queryset = self.get_queryset()  # This returns combined Message and Call instances
+        Retrieve a page of messages within a conversation, along with any associated calls.
+
+        The most recent items are returned by default. Pass the `before` cursor of a
+        response to load older items, or its `after` cursor to load newer ones.
+        Loading the latest or newer items resets the user's unread message counter.
+        """
+        page_size = request.query_params.get('page_size')
+        if page_size is not None:
+            if not page_size.isdigit() or int(page_size) < 1:
+                raise DRFValidationError({'page_size': 'A positive integer is required.'})
+            page_size = int(page_size)
+
+        conversation_id = self.get_conversation_id()
+        if not request.query_params.get('before'):
+            # The latest messages are being read
+            Conversation.mark_as_read_by(conversation_id, request.user)
+
+        timeline = ConversationTimeline(conversation_id)
+        page = timeline.page(
+            before=request.query_params.get('before'),
+            after=request.query_params.get('after'),
+            page_size=page_size,
+        )
 
-        # Serialize each object with the appropriate serializer
-        serialized_data = []
-        for item in queryset:
-            if isinstance(item, Message):
-                serializer = MessageSerializer(item)
-            elif isinstance(item, Call):
-                serializer = CallSerializer(item)
-            else:
-                continue  # Skip if the object is neither Message nor Call
-            serialized_data.append(serializer.data)
+        serialized_data = TimelineSerializer(page.items, context=self.get_serializer_context()).data
 
-        return Response(serialized_data)
+        return Response({
+            'before': page.before,
+            'after': page.after,
+            'results': serialized_data,
+        })
 
     
     def perform_create(self, serializer):
@@ -111,6 +140,7 @@ class MessageViewSet(viewsets.ModelViewSet):
         attachments_data = self.request.FILES
         for file in attachments_data.getlist('file'):
             Attachment.objects.create(message=message, file=file)
+        Conversation.record_messages([message])
           
 
 class FileUploadView(APIView):
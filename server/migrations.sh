@@ -1,4 +1,6 @@
 python manage.py makemigrations
+python manage.py dedupe_appointments
 python manage.py migrate
+python manage.py rebuild_doctor_search --missing
 python manage.py shell < create_superuser.py
 python manage.py collectstatic --noinput
\ No newline at end of file
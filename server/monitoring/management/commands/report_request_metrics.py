@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from monitoring.metrics import collect_records, summarize
+
+COLUMNS = (
+    ('route', 'Route'),
+    ('requests', 'Count'),
+    ('p50_ms', 'p50 ms'),
+    ('p95_ms', 'p95 ms'),
+    ('p99_ms', 'p99 ms'),
+    ('sql_count_p50', 'SQL p50'),
+    ('sql_count_p95', 'SQL p95'),
+    ('sql_ms_p95', 'SQL ms p95'),
+    ('serializer_ms_p95', 'Ser. ms p95'),
+    ('errors', '5xx'),
+)
+
+
+class Command(BaseCommand):
+    """
+    Print the per-route percentiles of the requests recorded by every process.
+    """
+
+    help = 'Report per-route latency, SQL and serializer percentiles of the recorded requests.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', default='p95_ms', choices=[key for key, _ in COLUMNS],
+                            help='Column to sort the routes by, in descending order.')
+        parser.add_argument('--limit', type=int, default=20, help='Maximum number of routes to show.')
+        parser.add_argument('--route', help='Only show routes containing this text.')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON.')
+
+    def handle(self, *args, **options):
+        # This process has no records of its own, only the ones the servers published
+        rows = summarize(collect_records(local=False))
+        if options['route']:
+            rows = [row for row in rows if options['route'] in row['route']]
+        rows.sort(key=lambda row: row[options['sort']], reverse=True)
+        rows = rows[:options['limit']]
+
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        if not rows:
+            self.stdout.write('No requests recorded. Is REQUEST_METRICS enabled?')
+            return
+
+        table = [[label for _, label in COLUMNS]] + [[str(row[key]) for key, _ in COLUMNS] for row in rows]
+        widths = [max(len(line[i]) for line in table) for i in range(len(COLUMNS))]
+        for line in table:
+            self.stdout.write('  '.join(
+                value.ljust(width) if i == 0 else value.rjust(width)
+                for i, (value, width) in enumerate(zip(line, widths))
+            ))
@@ -0,0 +1,200 @@
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from collections import deque, namedtuple
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# One instrumented request
+RequestRecord = namedtuple('RequestRecord', [
+    'route', 'status', 'total_ms', 'sql_count', 'sql_ms', 'serializer_ms', 'timestamp',
+])
+
+# Identifies this process among the ones publishing their records
+PROCESS_ID = f'{socket.gethostname()}:{os.getpid()}'
+
+PROCESSES_KEY = 'request_metrics:processes'
+
+
+def records_key(process):
+    """
+    Cache key of the records published by a process.
+    """
+    return f'request_metrics:{process}'
+
+# Measurements of the request being handled in the current thread or task
+current_measurement = ContextVar('current_measurement', default=None)
+
+# Depth of nested serializer `.data` calls, so only the outermost one is timed
+serializer_depth = ContextVar('serializer_depth', default=0)
+
+
+def get_config():
+    """
+    Return the request metrics settings with their defaults.
+    """
+    return {
+        'ENABLED': False,
+        'BUFFER_SIZE': 10000,
+        'SAMPLE_RATE': 1.0,
+        'PUBLISH_INTERVAL': 10,
+        **getattr(settings, 'REQUEST_METRICS', {}),
+    }
+
+
+class Measurement:
+    """
+    Running totals of the SQL and serializer work of one request.
+    """
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Used as a database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.sql_count += 1
+
+
+class MetricsBuffer:
+    """
+    Thread-safe ring buffer of the latest request records of this process,
+    periodically published to the cache so reports can cover every process.
+    """
+
+    def __init__(self, size=10000):
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._published_at = 0.0
+
+    def resize(self, size):
+        """
+        Change the capacity of the buffer, keeping the latest records.
+        """
+        with self._lock:
+            if self._records.maxlen != size:
+                self._records = deque(self._records, maxlen=size)
+
+    def append(self, record):
+        """
+        Add a record, evicting the oldest one when the buffer is full.
+        """
+        with self._lock:
+            self._records.append(record)
+
+    def snapshot(self):
+        """
+        Return a copy of the records in the buffer.
+        """
+        with self._lock:
+            return list(self._records)
+
+    def clear(self):
+        """
+        Remove every record from the buffer.
+        """
+        with self._lock:
+            self._records.clear()
+
+    def publish_if_due(self, interval):
+        """
+        Publish the records to the cache if the last publication is older than the interval.
+        Called while serving requests, so a cache failure is logged rather than raised.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._published_at < interval:
+                return
+            self._published_at = now
+        try:
+            self.publish(ttl=max(interval * 6, 60))
+        except Exception:
+            logger.exception("Failed to publish the request metrics of %s", PROCESS_ID)
+
+    def publish(self, ttl=60):
+        """
+        Store the records of this process in the cache and register the process.
+
+        The registry is rewritten on every publication with the processes whose records
+        have not expired, so stopped processes drop out of it, and a registration lost
+        to a concurrent rewrite is restored by that process's next publication.
+        """
+        cache.set(records_key(PROCESS_ID), self.snapshot(), ttl)
+        processes = (cache.get(PROCESSES_KEY) or set()) - {PROCESS_ID}
+        published = cache.get_many([records_key(process) for process in processes])
+        alive = {process for process in processes if records_key(process) in published}
+        cache.set(PROCESSES_KEY, alive | {PROCESS_ID}, ttl)
+
+
+buffer = MetricsBuffer(get_config()['BUFFER_SIZE'])
+
+
+def collect_records(local=True, published=True):
+    """
+    Gather the live records of this process and the ones the processes published.
+    """
+    records = buffer.snapshot() if local else []
+    if published:
+        processes = cache.get(PROCESSES_KEY) or set()
+        if local:
+            # The live buffer is more recent than what this process published
+            processes = processes - {PROCESS_ID}
+        published = cache.get_many([records_key(process) for process in processes])
+        for process_records in published.values():
+            records.extend(RequestRecord(*record) for record in process_records)
+    return records
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of a sorted list of values.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[max(rank, 1) - 1]
+
+
+def summarize(records):
+    """
+    Aggregate request records per route into latency, SQL and serializer percentiles,
+    slowest routes by p95 first.
+    """
+    by_route = {}
+    for record in records:
+        by_route.setdefault(record.route, []).append(record)
+
+    rows = []
+    for route, route_records in by_route.items():
+        total = sorted(record.total_ms for record in route_records)
+        sql_count = sorted(record.sql_count for record in route_records)
+        sql_ms = sorted(record.sql_ms for record in route_records)
+        serializer_ms = sorted(record.serializer_ms for record in route_records)
+        rows.append({
+            'route': route,
+            'requests': len(route_records),
+            'errors': sum(1 for record in route_records if record.status >= 500),
+            'p50_ms': round(percentile(total, 0.50), 2),
+            'p95_ms': round(percentile(total, 0.95), 2),
+            'p99_ms': round(percentile(total, 0.99), 2),
+            'sql_count_p50': percentile(sql_count, 0.50),
+            'sql_count_p95': percentile(sql_count, 0.95),
+            'sql_count_max': sql_count[-1],
+            'sql_ms_p95': round(percentile(sql_ms, 0.95), 2),
+            'serializer_ms_p95': round(percentile(serializer_ms, 0.95), 2),
+        })
+    rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+    return rows
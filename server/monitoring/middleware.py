@@ -0,0 +1,92 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+from .metrics import RequestRecord, Measurement, buffer, current_measurement, get_config, serializer_depth
+
+
+def install_serializer_timing():
+    """
+    Wrap `BaseSerializer.data` so the outermost serialization of a request is timed.
+    """
+    data = BaseSerializer.data
+    if getattr(data.fget, 'is_timed', False):
+        return
+
+    def timed_data(self):
+        measurement = current_measurement.get()
+        if measurement is None:
+            return data.fget(self)
+        depth = serializer_depth.get()
+        token = serializer_depth.set(depth + 1)
+        start = time.perf_counter()
+        try:
+            return data.fget(self)
+        finally:
+            serializer_depth.reset(token)
+            if depth == 0:
+                measurement.serializer_time += time.perf_counter() - start
+
+    timed_data.is_timed = True
+    BaseSerializer.data = property(timed_data)
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the SQL query count, SQL time, serializer time and total time of each
+    request, per route, in the in-process metrics buffer.
+
+    When `REQUEST_METRICS['ENABLED']` is off, the middleware removes itself from the
+    middleware chain at startup, so it costs nothing.
+    """
+
+    def __init__(self, get_response):
+        config = get_config()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = config['SAMPLE_RATE']
+        self.publish_interval = config['PUBLISH_INTERVAL']
+        buffer.resize(config['BUFFER_SIZE'])
+        install_serializer_timing()
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        measurement = Measurement()
+        token = current_measurement.set(measurement)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(measurement))
+                response = self.get_response(request)
+        finally:
+            current_measurement.reset(token)
+        total = time.perf_counter() - start
+
+        buffer.append(RequestRecord(
+            route=self.get_route(request),
+            status=response.status_code,
+            total_ms=total * 1000,
+            sql_count=measurement.sql_count,
+            sql_ms=measurement.sql_time * 1000,
+            serializer_ms=measurement.serializer_time * 1000,
+            timestamp=time.time(),
+        ))
+        buffer.publish_if_due(self.publish_interval)
+        return response
+
+    def get_route(self, request):
+        """
+        Name the route of a request by its method and URL pattern, so requests for different objects are grouped.
+        """
+        match = request.resolver_match
+        if match is None:
+            return f'{request.method} <unresolved>'
+        return f'{request.method} {match.view_name or match.route}'
@@ -0,0 +1,124 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from .metrics import PROCESS_ID, PROCESSES_KEY, RequestRecord, buffer, percentile, records_key, summarize
+from .middleware import RequestMetricsMiddleware
+
+User = get_user_model()
+
+METRICS_SETTINGS = {
+    'REQUEST_METRICS': {'ENABLED': True, 'PUBLISH_INTERVAL': 0},
+}
+
+
+@override_settings(**METRICS_SETTINGS)
+class RequestMetricsMiddlewareTestCase(APITestCase):
+    """
+    Test case for the request metrics middleware and its report endpoint.
+    """
+
+    def setUp(self):
+        """
+        Set up an empty buffer, doctors to list and a staff user.
+        """
+        
+        cache.clear()
+        buffer.clear()
+        for i in range(3):
+            User.objects.create_user(username=f'doctor{i}', email=f'd{i}@email.com', password='testpass123', account_type='doctor')
+        self.staff = User.objects.create_user(username='staff', email='s@email.com', password='testpass123', is_staff=True)
+
+    def test_records_queries_and_timings_per_route(self):
+        """
+        Test that each request is recorded under its route with its SQL and serializer work.
+        """
+        
+        self.client.get(reverse('doctor-list'))
+        self.client.get(reverse('doctor-list'))
+        records = buffer.snapshot()
+        self.assertEqual([record.route for record in records], ['GET doctor-list'] * 2)
+        self.assertGreater(records[0].sql_count, 0)
+        self.assertGreater(records[0].serializer_ms, 0)
+        self.assertGreaterEqual(records[0].total_ms, records[0].sql_ms + records[0].serializer_ms)
+
+    def test_report_endpoint_is_staff_only(self):
+        """
+        Test that the per-route report is only available to staff.
+        """
+        
+        self.client.get(reverse('doctor-list'))
+        self.assertEqual(self.client.get(reverse('request-metrics')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get(reverse('request-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        routes = {row['route']: row for row in response.data['routes']}
+        self.assertEqual(routes['GET doctor-list']['requests'], 1)
+
+    def test_report_command_reads_published_records(self):
+        """
+        Test that the command reports the records published to the cache.
+        """
+        
+        self.client.get(reverse('doctor-list'))
+        buffer.clear()
+        out = StringIO()
+        call_command('report_request_metrics', stdout=out)
+        self.assertIn('GET doctor-list', out.getvalue())
+
+    def test_publishing_drops_stopped_processes(self):
+        """
+        Test that the registry only keeps the processes whose records have not expired.
+        """
+        
+        cache.set(records_key('alive:1'), [], 60)
+        cache.set(PROCESSES_KEY, {'alive:1', 'stopped:2'})
+        buffer.publish()
+        self.assertEqual(cache.get(PROCESSES_KEY), {'alive:1', PROCESS_ID})
+
+    def test_cache_failures_do_not_fail_requests(self):
+        """
+        Test that a request is served when its records cannot be published.
+        """
+        
+        with mock.patch('monitoring.metrics.cache.set', side_effect=ConnectionError), \
+                self.assertLogs('monitoring.metrics', 'ERROR'):
+            response = self.client.get(reverse('doctor-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class RequestMetricsSummaryTestCase(SimpleTestCase):
+    """
+    Test case for the aggregation of request records.
+    """
+
+    def test_disabled_middleware_is_not_used(self):
+        """
+        Test that the middleware takes itself out of the chain when disabled.
+        """
+        
+        with override_settings(REQUEST_METRICS={'ENABLED': False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                RequestMetricsMiddleware(lambda request: None)
+
+    def test_percentiles(self):
+        """
+        Test the nearest-rank percentiles of the per-route summary.
+        """
+        
+        self.assertEqual(percentile(list(range(1, 101)), 0.95), 95)
+        records = [RequestRecord('GET a', 200, float(ms), 3, 1.0, 1.0, 0) for ms in range(1, 101)]
+        records.append(RequestRecord('GET b', 500, 1.0, 1, 0.5, 0.0, 0))
+        rows = summarize(records)
+        self.assertEqual([row['route'] for row in rows], ['GET a', 'GET b'])
+        self.assertEqual((rows[0]['p50_ms'], rows[0]['p95_ms'], rows[0]['p99_ms']), (50, 95, 99))
+        self.assertEqual(rows[1]['errors'], 1)
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import RequestMetricsView
+
+urlpatterns = [
+    path('requests/', RequestMetricsView.as_view(), name='request-metrics'),
+]
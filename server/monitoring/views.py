@@ -0,0 +1,24 @@
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import PROCESS_ID, collect_records, summarize
+
+
+class RequestMetricsView(APIView):
+    """
+    Per-route latency, SQL and serializer percentiles of the recorded requests.
+
+    Covers every process that published its records, or only the process serving
+    the request with `?scope=local`.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        records = collect_records(published=request.query_params.get('scope') != 'local')
+        return Response({
+            'process': PROCESS_ID,
+            'requests': len(records),
+            'routes': summarize(records),
+        })
@@ -0,0 +1,91 @@
+import json
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from conversation.consumers import ConsumerUtilities
+
+from .cursors import after_cursor, committed_after_cursor, encode_cursor
+from .models import Notification
+from .outbox import notification_group
+from .serializers import NotificationSerializer
+
+# Most notifications replayed on reconnect; a client further behind refetches the list
+RESYNC_LIMIT = 100
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Websocket consumer pushing new notifications to their recipient.
+
+    A client reconnecting with the `cursor` of the last notification it received
+    is first sent the notifications it missed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.group_name = None
+
+    async def connect(self):
+        """
+        Connect to websocket and replay the notifications missed since the cursor.
+        """
+        query_string = self.scope['query_string'].decode('utf-8')
+        token = ConsumerUtilities.get_token_from_query_string(query_string)
+        self.user = await ConsumerUtilities.get_user_from_token(token)
+        if not self.user:
+            await self.close(code=4001)  # Authentication error
+            return
+
+        # Join the group before reading the missed notifications, so none falls in between
+        self.group_name = notification_group(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        cursor = parse_qs(query_string).get('cursor', [None])[0]
+        if cursor:
+            await self.send(text_data=json.dumps(await self.get_resync(cursor)))
+
+    async def disconnect(self, close_code):
+        """
+        Disconnect from websocket.
+        """
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def notification_created(self, event):
+        """
+        Receive a new or updated notification from the user's group.
+        """
+        await self.send(text_data=json.dumps({
+            'type': 'notification',
+            'notification': event['notification'],
+            'cursor': event['cursor'],
+        }))
+
+    @database_sync_to_async
+    def get_resync(self, cursor):
+        """
+        The notifications created or updated after a cursor, oldest first, preceded
+        by the ones before it that may have been committed after it was issued.
+
+        `reset` tells the client to refetch its notifications instead, when the
+        cursor is invalid or more than RESYNC_LIMIT notifications were missed.
+        """
+        notifications = Notification.objects.filter(recipient=self.user)
+        try:
+            late = list(committed_after_cursor(notifications, cursor)[:RESYNC_LIMIT])
+            queryset = after_cursor(notifications, cursor)
+        except ValueError:
+            return {'type': 'notification_resync', 'notifications': [], 'cursor': None, 'reset': True}
+
+        notifications = list(queryset[:RESYNC_LIMIT + 1])
+        if len(notifications) > RESYNC_LIMIT:
+            return {'type': 'notification_resync', 'notifications': [], 'cursor': None, 'reset': True}
+        return {
+            'type': 'notification_resync',
+            'notifications': NotificationSerializer(late + notifications, many=True).data,
+            'cursor': encode_cursor(notifications[-1]) if notifications else cursor,
+            'reset': False,
+        }
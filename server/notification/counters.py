@@ -0,0 +1,113 @@
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Notification
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+# Counters expire so that any drift they accumulated is bounded even without reconciliation
+UNREAD_COUNT_CACHE_TIMEOUT = getattr(settings, 'UNREAD_COUNT_CACHE_TIMEOUT', 24 * 3600)
+
+
+def unread_count_key(user_id):
+    """
+    Cache key of the number of unread notifications of a user.
+    """
+    return f'unread_notifications:{user_id}'
+
+
+def get_unread_count(user_id):
+    """
+    Return the number of unread notifications of a user, counting them in the
+    database and caching the result when the counter is not cached. The
+    database count is returned as is while the cache is unreachable.
+    """
+    try:
+        count = cache.get(unread_count_key(user_id))
+        if count is None:
+            count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+            # A counter incremented in the meantime is more recent than this count
+            if not cache.add(unread_count_key(user_id), count, UNREAD_COUNT_CACHE_TIMEOUT):
+                count = cache.get(unread_count_key(user_id), count)
+    except Exception:
+        logger.exception("Failed to read the unread notification counter of user %s", user_id)
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+    return max(count, 0)
+
+
+def _adjust(counts):
+    for user_id, delta in counts.items():
+        try:
+            if delta > 0:
+                cache.incr(unread_count_key(user_id), delta)
+            elif delta < 0:
+                cache.decr(unread_count_key(user_id), -delta)
+        except ValueError:
+            # Counters that are not cached are counted in the database when next read
+            pass
+        except Exception:
+            # The notifications are committed either way; the counter is dropped to be
+            # recounted if the cache allows it, or left to expire or be reconciled
+            logger.exception("Failed to adjust the unread notification counter of user %s", user_id)
+            try:
+                cache.delete(unread_count_key(user_id))
+            except Exception:
+                pass
+
+
+def adjust_unread_counts(counts):
+    """
+    Add to the cached counters of users, once the transaction is committed.
+    Cache errors are logged rather than raised, as the notifications are stored.
+    `counts` maps user ids to the number of notifications that became unread,
+    or read when negative.
+    """
+    counts = {user_id: delta for user_id, delta in counts.items() if delta}
+    if counts:
+        transaction.on_commit(lambda: _adjust(counts), robust=True)
+
+
+def notifications_created(notifications):
+    """
+    Count new unread notifications in their recipients' counters.
+    """
+    adjust_unread_counts(Counter(notification.recipient_id for notification in notifications if not notification.is_read))
+
+
+def reset_unread_count(user_id):
+    """
+    Set the counter of a user whose notifications were all read to zero, once committed.
+    """
+    transaction.on_commit(lambda: cache.set(unread_count_key(user_id), 0, UNREAD_COUNT_CACHE_TIMEOUT), robust=True)
+
+
+def reconcile_unread_counts(batch_size=1000):
+    """
+    Overwrite the counters of every user with their number of unread notifications
+    in the database, one batch of users at a time. Returns the number of users.
+
+    Counters hold increments made while their batch is counted, so a notification
+    created meanwhile may be missed until the next reconciliation.
+    """
+    reconciled = 0
+    last_id = 0
+    while True:
+        user_ids = list(User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not user_ids:
+            return reconciled
+        counts = dict.fromkeys(user_ids, 0)
+        counts.update(
+            Notification.objects.filter(recipient_id__in=user_ids, is_read=False)
+            .values_list('recipient_id').annotate(unread=Count('id')).order_by()
+        )
+        cache.set_many({unread_count_key(user_id): count for user_id, count in counts.items()}, UNREAD_COUNT_CACHE_TIMEOUT)
+        reconciled += len(user_ids)
+        last_id = user_ids[-1]
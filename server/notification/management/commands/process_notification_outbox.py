@@ -0,0 +1,45 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from notification.outbox import get_config, process_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """
+    Turn the events of the notification outbox into notifications, as a long-running worker.
+    """
+
+    help = 'Drain the notification outbox, creating and pushing notifications in bulk.'
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'],
+                            help='Events turned into notifications per transaction.')
+        parser.add_argument('--poll-interval', type=float, default=config['POLL_INTERVAL'],
+                            help='Seconds to sleep when the outbox is empty.')
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit.')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            try:
+                processed = process_outbox(options['batch_size'])
+            except Exception:
+                # The batch was rolled back and is retried on the next poll
+                logger.exception("Failed to process the notification outbox")
+                close_old_connections()
+                processed = 0
+                if options['once']:
+                    raise
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} outbox events.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from notification.retention import get_config, purge_notifications
+
+
+class Command(BaseCommand):
+    """
+    Delete the read notifications past their retention period, to be run periodically.
+    """
+
+    help = 'Delete read notifications older than the retention period of their type, in batches.'
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'],
+                            help='Notifications deleted per statement.')
+        parser.add_argument('--sleep', type=float, default=config['SLEEP'],
+                            help='Seconds to pause between batches.')
+        parser.add_argument('--dry-run', action='store_true', help='Count the expired notifications without deleting them.')
+
+    def handle(self, *args, **options):
+        deleted = purge_notifications(batch_size=options['batch_size'], sleep=options['sleep'], dry_run=options['dry_run'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        for notification_type, count in deleted.items():
+            self.stdout.write(f'{verb} {count} {notification_type} notifications.')
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sum(deleted.values())} notifications in total.'))
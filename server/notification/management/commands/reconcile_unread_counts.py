@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from notification.counters import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    """
+    Correct the cached unread notification counters from the database, to be run periodically.
+    """
+
+    help = 'Overwrite the cached unread notification counters with the counts in the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users reconciled per query.')
+
+    def handle(self, *args, **options):
+        reconciled = reconcile_unread_counts(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Reconciled the unread counts of {reconciled} users.'))
@@ -22,6 +22,22 @@ class Notification(models.Model):
     text = models.TextField() 
     is_read = models.BooleanField(default=False) 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Conversation of a message notification
+    conversation = models.ForeignKey('conversation.Conversation', on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    # Number of messages a coalesced message notification stands for, whose
+    # created_at is then the time of the latest one
+    count = models.PositiveIntegerField(default=1)
+    # Set while a coalesced message notification is unread, so the next messages
+    # of its conversation are merged into it; unique among the rows that have one
+    coalesce_key = models.CharField(max_length=50, unique=True, null=True, blank=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        """
+        Stop merging messages into the notification once it has been read.
+        """
+        if self.is_read:
+            self.coalesce_key = None
+        super().save(*args, **kwargs)
 
     def __str__(self):
         """
@@ -34,3 +50,36 @@ class Notification(models.Model):
         Meta options for the Notification model.
         """        
         ordering = ['-created_at']  # Newest notifications first
+        indexes = [
+            # A user's notifications newest first, and their unread ones for counts and mark-read
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notification_recipient_idx'),
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='notification_unread_idx'),
+            # Read notifications past their retention period, for the purge
+            models.Index(fields=['notification_type', 'created_at'], condition=models.Q(is_read=True),
+                         name='notification_read_expiry_idx'),
+        ]
+
+
+class NotificationOutbox(models.Model):
+    """
+    Model to represent an event waiting to be turned into a notification.
+
+    Saving a message, call or appointment only records the event here, in the same
+    transaction. The outbox worker builds the notifications in bulk and pushes them.
+    """
+
+    EVENT_TYPES = (
+        ('message', 'Message'),
+        ('call', 'Call'),
+        ('appointment', 'Appointment'),
+    )
+
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    object_id = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        """
+        String representation of the outbox event.
+        """
+        return f"{self.event_type} {self.object_id}"
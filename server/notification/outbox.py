@@ -0,0 +1,213 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from appointment.models import Appointment
+from conversation.models import Call, Message
+
+from .counters import notifications_created
+from .cursors import encode_cursor
+from .models import Notification, NotificationOutbox
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    """
+    Return the notification outbox settings with their defaults.
+    """
+    return {
+        'ENABLED': False,
+        'BATCH_SIZE': 500,
+        'POLL_INTERVAL': 1.0,
+        **getattr(settings, 'NOTIFICATION_OUTBOX', {}),
+    }
+
+
+def notification_group(user_id):
+    """
+    Name of the channel layer group of a user's connections, which their
+    notifications are pushed to.
+    """
+    return f'user_{user_id}'
+
+
+def message_notifications(ids):
+    messages = Message.objects.filter(id__in=ids).select_related('conversation', 'sender')
+    for message in messages:
+        conversation = message.conversation
+        # The recipient is the participant who did not send the message
+        if message.sender_id == conversation.patient_id:
+            recipient_id = conversation.doctor_id
+        else:
+            recipient_id = conversation.patient_id
+        yield Notification(
+            recipient_id=recipient_id,
+            sender=message.sender,
+            conversation_id=message.conversation_id,
+            notification_type='message',
+            text=f'New message from {message.sender.username}'
+        )
+
+
+def call_notifications(ids):
+    for call in Call.objects.filter(id__in=ids).select_related('caller'):
+        yield Notification(
+            recipient_id=call.receiver_id,
+            sender_id=call.caller_id,
+            notification_type='call',
+            text=f'New call from {call.caller.first_name} {call.caller.last_name}'
+        )
+
+
+def appointment_notifications(ids):
+    for appointment in Appointment.objects.filter(id__in=ids).select_related('patient'):
+        yield Notification(
+            recipient_id=appointment.doctor_id,
+            sender_id=appointment.patient_id,
+            notification_type='appointment',
+            text=f'New appointment from {appointment.patient.first_name} {appointment.patient.last_name}'
+        )
+
+
+# Event type: builder of the notifications of the events' objects, from their ids
+BUILDERS = {
+    'message': message_notifications,
+    'call': call_notifications,
+    'appointment': appointment_notifications,
+}
+
+
+def coalesce_message_notifications(notifications):
+    """
+    Merge message notifications into the unread notification of their recipient
+    and conversation, with a single upsert that adds to its count, rewrites its
+    text and moves its timestamp to now. Returns the notifications created or
+    updated, as the upsert returns them.
+
+    Only the rows the upsert inserted count as new unread notifications: their
+    count is that of the batch, which a row merged into always exceeds.
+    """
+    counts = {}
+    latest = {}
+    for notification in notifications:
+        key = f'{notification.recipient_id}:{notification.conversation_id}'
+        counts[key] = counts.get(key, 0) + 1
+        latest[key] = notification
+    if not latest:
+        return []
+
+    # Django's upserts can only overwrite columns, not add to them, hence the SQL
+    now = Notification._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+    quote = connection.ops.quote_name
+    table = quote(Notification._meta.db_table)
+    users = quote(Notification._meta.get_field('sender').related_model._meta.db_table)
+    columns = ('recipient_id', 'sender_id', 'conversation_id', 'notification_type', 'text', 'is_read', 'created_at', 'count', 'coalesce_key')
+    params = []
+    for key, notification in latest.items():
+        text = notification.text
+        if counts[key] > 1:
+            text = f'{counts[key]} new messages from {notification.sender.username}'
+        params += [notification.recipient_id, notification.sender_id, notification.conversation_id,
+                   'message', text, False, now, counts[key], key]
+    merged = list(Notification.objects.raw(
+        f"INSERT INTO {table} ({', '.join(quote(column) for column in columns)}) "
+        f"VALUES {', '.join(['(' + ', '.join(['%s'] * len(columns)) + ')'] * len(latest))} "
+        f"ON CONFLICT ({quote('coalesce_key')}) DO UPDATE SET "
+        f"{quote('count')} = {table}.{quote('count')} + excluded.{quote('count')}, "
+        f"{quote('text')} = CAST({table}.{quote('count')} + excluded.{quote('count')} AS TEXT) || ' new messages from ' || "
+        f"(SELECT {quote('username')} FROM {users} WHERE {quote('id')} = excluded.{quote('sender_id')}), "
+        f"{quote('sender_id')} = excluded.{quote('sender_id')}, "
+        f"{quote('created_at')} = excluded.{quote('created_at')} "
+        f"RETURNING {quote('id')}, {', '.join(quote(column) for column in columns)}",
+        params,
+    ))
+    notifications_created([notification for notification in merged if notification.count == counts[notification.coalesce_key]])
+    return merged
+
+
+def create_notifications(event_type, object_ids):
+    """
+    Create the notifications of events with one query per event type and one bulk insert.
+    Objects deleted since their event was recorded get no notification.
+
+    Message notifications are merged per recipient and conversation instead when
+    COALESCE_MESSAGE_NOTIFICATIONS is on.
+    """
+    notifications = list(BUILDERS[event_type](object_ids))
+    if event_type == 'message' and getattr(settings, 'COALESCE_MESSAGE_NOTIFICATIONS', False):
+        return coalesce_message_notifications(notifications)
+    notifications = Notification.objects.bulk_create(notifications)
+    notifications_created(notifications)
+    return notifications
+
+
+def record_events(event_type, object_ids):
+    """
+    Record that objects were created, for the outbox worker to notify their recipients.
+
+    When the outbox is disabled, the notifications are created straight away
+    instead, and pushed once the transaction is committed.
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+    if not get_config()['ENABLED']:
+        notifications = create_notifications(event_type, object_ids)
+        transaction.on_commit(lambda: push_notifications(notifications))
+        return
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(event_type=event_type, object_id=object_id) for object_id in object_ids
+    ])
+
+
+def push_notifications(notifications):
+    """
+    Send new notifications to the channel layer groups of their recipients.
+    A channel layer outage is logged, since the notifications are already saved.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        for notification in notifications:
+            async_to_sync(channel_layer.group_send)(notification_group(notification.recipient_id), {
+                'type': 'notification_created',
+                'notification': NotificationSerializer(notification).data,
+                'cursor': encode_cursor(notification),
+            })
+    except Exception:
+        logger.exception("Failed to push %d notifications", len(notifications))
+
+
+def process_outbox(batch_size=None):
+    """
+    Turn a batch of outbox events into notifications, delete the events and push
+    the notifications once committed. Returns the number of events processed.
+
+    Events are claimed with `SKIP LOCKED` where the database supports it, so
+    several workers can drain the outbox side by side.
+    """
+    batch_size = batch_size or get_config()['BATCH_SIZE']
+    with transaction.atomic():
+        events = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .order_by('id').values_list('id', 'event_type', 'object_id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        by_type = {}
+        for _, event_type, object_id in events:
+            by_type.setdefault(event_type, []).append(object_id)
+        notifications = []
+        for event_type, object_ids in by_type.items():
+            notifications.extend(create_notifications(event_type, object_ids))
+        NotificationOutbox.objects.filter(id__in=[event_id for event_id, _, _ in events]).delete()
+        transaction.on_commit(lambda: push_notifications(notifications))
+    return len(events)
@@ -0,0 +1,80 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+from .cursors import after_cursor, before_cursor, committed_after_cursor, encode_cursor
+
+
+class NotificationCursorPagination(BasePagination):
+    """
+    Keyset pagination of a user's notifications on (created_at, id).
+
+    Pages are newest first, and each one continues from the `next_cursor` of the
+    previous page. The first page also returns a `sync_cursor`: passing it as
+    `since` later returns only the notifications created or merged into since
+    then, oldest first, with a new `sync_cursor` to continue from. The cursors
+    are the ones pushed over the notification websocket, so a client can resync
+    from either.
+
+    A coalesced notification moves to the top when merged into, so it may be
+    listed again on a later page or sync; clients replace notifications by id.
+    A sync also returns, first, the recent notifications before its cursor that
+    may have been committed after the cursor was issued.
+    Read state changes do not move notifications and are not part of a sync.
+    """
+
+    cursor_query_param = 'cursor'
+    since_query_param = 'since'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        if page_size < 1:
+            raise ValidationError({'page_size': 'Must be a positive integer.'})
+        return min(page_size, self.max_page_size)
+
+    def filter_queryset(self, queryset, param, cursor_filter):
+        try:
+            return cursor_filter(queryset, self.request.query_params[param])
+        except ValueError:
+            raise ValidationError({param: 'Invalid cursor.'})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.since = request.query_params.get(self.since_query_param)
+        self.cursor = request.query_params.get(self.cursor_query_param)
+        page_size = self.get_page_size(request)
+        late = []
+        if self.since:
+            late = list(self.filter_queryset(queryset, self.since_query_param, committed_after_cursor)[:page_size])
+            queryset = self.filter_queryset(queryset, self.since_query_param, after_cursor)
+        elif self.cursor:
+            queryset = self.filter_queryset(queryset, self.cursor_query_param, before_cursor)
+        else:
+            queryset = queryset.order_by('-created_at', '-id')
+
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return late + self.page
+
+    def get_paginated_response(self, data):
+        if self.since:
+            # Newer notifications are synced oldest first, from the last one returned
+            return Response({
+                'sync_cursor': encode_cursor(self.page[-1]) if self.page else self.since,
+                'has_more': self.has_next,
+                'results': data,
+            })
+
+        response = {'next_cursor': encode_cursor(self.page[-1]) if self.has_next else None}
+        if not self.cursor:
+            # The newest notification, or none yet: a sync from the start returns everything
+            response['sync_cursor'] = encode_cursor(self.page[0]) if self.page else None
+        response['results'] = data
+        return Response(response)
@@ -0,0 +1,73 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Notification
+
+
+def get_config():
+    """
+    Return the notification retention settings with their defaults.
+    """
+    return {
+        'DAYS': {},
+        'DEFAULT_DAYS': 90,
+        'BATCH_SIZE': 1000,
+        'SLEEP': 0.0,
+        **getattr(settings, 'NOTIFICATION_RETENTION', {}),
+    }
+
+
+def retention_cutoffs(now=None, config=None):
+    """
+    Return the creation time before which read notifications of each type expire,
+    leaving out the types that are kept forever.
+    """
+    now = now or timezone.now()
+    config = config or get_config()
+    cutoffs = {}
+    for notification_type, _ in Notification.NOTIFICATION_TYPES:
+        days = config['DAYS'].get(notification_type, config['DEFAULT_DAYS'])
+        if days is not None:
+            cutoffs[notification_type] = now - timedelta(days=days)
+    return cutoffs
+
+
+def expired_notifications(notification_type, cutoff):
+    """
+    Read notifications of a type created before a cutoff.
+    """
+    return Notification.objects.filter(notification_type=notification_type, is_read=True, created_at__lt=cutoff)
+
+
+def purge_notifications(now=None, batch_size=None, sleep=None, dry_run=False):
+    """
+    Delete the read notifications past their retention period, in batches of
+    `batch_size` selected by primary key, so that each delete is a short
+    statement on its own. Returns the number deleted per type, or the number
+    that would be when `dry_run` is set.
+    """
+    config = get_config()
+    batch_size = batch_size or config['BATCH_SIZE']
+    sleep = config['SLEEP'] if sleep is None else sleep
+
+    deleted = {}
+    for notification_type, cutoff in retention_cutoffs(now, config).items():
+        expired = expired_notifications(notification_type, cutoff)
+        if dry_run:
+            deleted[notification_type] = expired.count()
+            continue
+        deleted[notification_type] = 0
+        while True:
+            ids = list(expired.order_by().values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            # Read notifications are not in the unread counters, so these stay as they are
+            deleted[notification_type] += Notification.objects.filter(id__in=ids).delete()[0]
+            if len(ids) < batch_size:
+                break
+            if sleep:
+                time.sleep(sleep)
+    return deleted
@@ -1,9 +1,27 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
 from .models import Notification
-from datetime import datetime
+from datetime import datetime, timedelta
+from io import StringIO
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.management import call_command
+from appointment.models import Appointment
+from conversation.models import Conversation, Message, Call
+from .models import NotificationOutbox
+from .outbox import coalesce_message_notifications, message_notifications, notification_group, process_outbox
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from rest_framework_simplejwt.tokens import AccessToken
+from .cursors import decode_cursor, encode_cursor
+from .routing import websocket_urlpatterns
+from unittest import mock
+from django.core.cache import cache
+from .counters import get_unread_count, unread_count_key
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -48,7 +66,7 @@ class NotificationTestCase(TestCase):
         response = self.client.get(url) 
         # response = self.client.get('/api/notifications/')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
         
     def test_notification_mark_as_read(self):
         """
@@ -66,4 +84,494 @@ class NotificationTestCase(TestCase):
         """        
         self.client.force_authenticate(user=self.doctor_user)  
         response = self.client.get('/notifications/')
-        self.assertEqual(response.status_code, 404)
\ No newline at end of file
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(NOTIFICATION_OUTBOX={'ENABLED': True})
+class NotificationOutboxTestCase(TestCase):
+    """
+    Test case for the transactional notification outbox.
+    """
+
+    def setUp(self):
+        """
+        Set up a conversation between a patient and a doctor.
+        """
+        
+        self.patient_user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient", first_name="Pat", last_name="Ient")
+        self.doctor_user = User.objects.create_user(username="doctor", email='doctor@example.com', password="testpass123", account_type="doctor", first_name="Doc", last_name="Tor")
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+
+    def test_saving_records_an_event_instead_of_a_notification(self):
+        """
+        Test that saving a message only adds an outbox event.
+        """
+        
+        Message.objects.create(conversation=self.conversation, sender=self.patient_user, text="Hello")
+        self.assertEqual(NotificationOutbox.objects.filter(event_type='message').count(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_worker_creates_notifications_in_bulk(self):
+        """
+        Test that processing the outbox notifies the right recipients and empties the outbox.
+        """
+        
+        Message.objects.create(conversation=self.conversation, sender=self.patient_user, text="Hello")
+        Message.objects.create(conversation=self.conversation, sender=self.doctor_user, text="Hi")
+        Call.objects.create(conversation=self.conversation, caller=self.doctor_user, receiver=self.patient_user)
+        Appointment.objects.create(patient=self.patient_user, doctor=self.doctor_user, date='2030-01-01', time='10:00')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(process_outbox(), 4)
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertEqual(
+            sorted(Notification.objects.values_list('recipient__username', 'notification_type', 'text')),
+            [
+                ('doctor', 'appointment', 'New appointment from Pat Ient'),
+                ('doctor', 'message', 'New message from patient'),
+                ('patient', 'call', 'New call from Doc Tor'),
+                ('patient', 'message', 'New message from doctor'),
+            ],
+        )
+
+    def test_worker_pushes_notifications_to_their_recipient(self):
+        """
+        Test that created notifications are sent to the recipient's channel layer group.
+        """
+        
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(notification_group(self.doctor_user.id), channel)
+
+        Message.objects.create(conversation=self.conversation, sender=self.patient_user, text="Hello")
+        with self.captureOnCommitCallbacks(execute=True):
+            process_outbox()
+        event = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(event['type'], 'notification_created')
+        self.assertEqual(event['notification']['text'], 'New message from patient')
+
+    def test_deleted_objects_are_not_notified(self):
+        """
+        Test that events of objects deleted before processing are dropped.
+        """
+        
+        message = Message.objects.create(conversation=self.conversation, sender=self.patient_user, text="Hello")
+        message.delete()
+        call_command('process_notification_outbox', '--once', stdout=StringIO())
+        self.assertFalse(NotificationOutbox.objects.exists())
+        self.assertFalse(Notification.objects.exists())
+
+
+@override_settings(COALESCE_MESSAGE_NOTIFICATIONS=True)
+class CoalescedMessageNotificationTestCase(TestCase):
+    """
+    Test case for message notifications coalesced per recipient and conversation.
+    """
+
+    def setUp(self):
+        """
+        Set up a doctor in conversation with two patients.
+        """
+        
+        self.client = APIClient()
+        self.doctor_user = User.objects.create_user(username="doctor", email='doctor@example.com', password="testpass123", account_type="doctor")
+        self.patient_user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+        self.other_patient = User.objects.create_user(username="other", email='other@example.com', password="testpass123", account_type="patient")
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+        self.other_conversation = Conversation.objects.create(patient=self.other_patient, doctor=self.doctor_user)
+
+    def send(self, conversation, sender, count=1):
+        """
+        Write messages to a conversation.
+        """
+        
+        for i in range(count):
+            Message.objects.create(conversation=conversation, sender=sender, text=f"Message {i}")
+
+    def test_unread_messages_are_merged_per_conversation(self):
+        """
+        Test that unread messages of a conversation share one notification with a count.
+        """
+        
+        self.send(self.conversation, self.patient_user, 3)
+        self.send(self.other_conversation, self.other_patient)
+
+        notifications = Notification.objects.filter(recipient=self.doctor_user).order_by('id')
+        self.assertEqual(
+            [(n.conversation_id, n.count, n.text) for n in notifications],
+            [(self.conversation.id, 3, '3 new messages from patient'), (self.other_conversation.id, 1, 'New message from other')],
+        )
+
+    def test_read_notifications_are_not_merged_into(self):
+        """
+        Test that messages arriving after a notification was read get a new notification.
+        """
+        
+        self.send(self.conversation, self.patient_user, 2)
+        self.client.force_authenticate(user=self.doctor_user)
+        self.client.patch(reverse('notification-mark-all-as-read'))
+        self.send(self.conversation, self.patient_user)
+
+        notifications = Notification.objects.filter(recipient=self.doctor_user).order_by('id')
+        self.assertEqual([(n.is_read, n.count) for n in notifications], [(True, 2), (False, 1)])
+
+    @override_settings(NOTIFICATION_OUTBOX={'ENABLED': True})
+    def test_outbox_batches_are_merged_with_one_upsert(self):
+        """
+        Test that the outbox worker merges a batch of messages into the unread notification.
+        """
+        
+        self.send(self.conversation, self.patient_user)
+        process_outbox()
+        self.send(self.conversation, self.patient_user, 4)
+        self.send(self.conversation, self.doctor_user)
+        process_outbox()
+
+        notification = Notification.objects.get(recipient=self.doctor_user)
+        self.assertEqual((notification.count, notification.text), (5, '5 new messages from patient'))
+        self.assertEqual(Notification.objects.get(recipient=self.patient_user).count, 1)
+
+        self.client.force_authenticate(user=self.doctor_user)
+        response = self.client.get(reverse('notification-list'))
+        self.assertEqual(response.data['results'][0]['count'], 5)
+        self.assertNotIn('coalesce_key', response.data['results'][0])
+
+        # Merging into the notification takes the upsert alone, which returns the merged row
+        notifications = list(message_notifications(Message.objects.filter(sender=self.patient_user).values_list('id', flat=True)[:2]))
+        with self.assertNumQueries(1):
+            merged = coalesce_message_notifications(notifications)
+        self.assertEqual([(n.id, n.count, n.text) for n in merged], [(notification.id, 7, '7 new messages from patient')])
+        self.assertGreater(merged[0].created_at, notification.created_at)
+
+
+class NotificationConsumerTestCase(TransactionTestCase):
+    """
+    Test case for the per-user notification websocket.
+    """
+
+    def setUp(self):
+        """
+        Set up a conversation between a patient and a doctor.
+        """
+        
+        self.patient_user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+        self.doctor_user = User.objects.create_user(username="doctor", email='doctor@example.com', password="testpass123", account_type="doctor")
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+
+    def communicator(self, user, cursor=None):
+        """
+        Build a websocket client of a user's notifications.
+        """
+        
+        path = f"/notifications/?token={AccessToken.for_user(user)}"
+        if cursor:
+            path += f"&cursor={cursor}"
+        return WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+
+    def test_rejects_anonymous_connections(self):
+        """
+        Test that a connection without a valid token is closed.
+        """
+        
+        async def connect():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/notifications/?token=invalid")
+            connected, code = await communicator.connect()
+            await communicator.disconnect()
+            return connected, code
+
+        self.assertEqual(async_to_sync(connect)(), (False, 4001))
+
+    def test_new_notifications_are_pushed_to_their_recipient(self):
+        """
+        Test that a saved message is pushed to the recipient's connection only.
+        """
+        
+        async def exchange():
+            doctor, patient = self.communicator(self.doctor_user), self.communicator(self.patient_user)
+            await doctor.connect()
+            await patient.connect()
+            await database_sync_to_async(Message.objects.create)(conversation=self.conversation, sender=self.patient_user, text="Hello")
+            event = await doctor.receive_json_from(timeout=5)
+            nothing = await patient.receive_nothing()
+            await doctor.disconnect()
+            await patient.disconnect()
+            return event, nothing
+
+        event, nothing = async_to_sync(exchange)()
+        notification = Notification.objects.get(recipient=self.doctor_user)
+        self.assertEqual(event['type'], 'notification')
+        self.assertEqual(event['notification']['id'], notification.id)
+        self.assertEqual(decode_cursor(event['cursor'])[:2], (notification.created_at, notification.id))
+        self.assertTrue(nothing)
+
+    def test_reconnecting_replays_missed_notifications(self):
+        """
+        Test that connecting with a cursor first sends the notifications created after it.
+        """
+        
+        Message.objects.create(conversation=self.conversation, sender=self.patient_user, text="Seen")
+        cursor = encode_cursor(Notification.objects.get(recipient=self.doctor_user))
+        Message.objects.create(conversation=self.conversation, sender=self.patient_user, text="Missed")
+        Message.objects.create(conversation=self.conversation, sender=self.patient_user, text="Missed too")
+        missed = list(Notification.objects.filter(recipient=self.doctor_user).order_by('id')[1:])
+
+        async def resync(cursor):
+            communicator = self.communicator(self.doctor_user, cursor)
+            await communicator.connect()
+            event = await communicator.receive_json_from(timeout=5)
+            await communicator.disconnect()
+            return event
+
+        event = async_to_sync(resync)(cursor)
+        self.assertEqual(event['type'], 'notification_resync')
+        self.assertFalse(event['reset'])
+        self.assertEqual([n['id'] for n in event['notifications']], [n.id for n in missed])
+        self.assertEqual(decode_cursor(event['cursor'])[:2], (missed[-1].created_at, missed[-1].id))
+
+        event = async_to_sync(resync)('not-a-cursor')
+        self.assertEqual((event['notifications'], event['reset']), ([], True))
+
+
+class UnreadCountTestCase(TestCase):
+    """
+    Test case for the cached unread notification counters.
+    """
+
+    def setUp(self):
+        """
+        Set up a conversation and an empty cache.
+        """
+        
+        cache.clear()
+        self.client = APIClient()
+        self.patient_user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+        self.doctor_user = User.objects.create_user(username="doctor", email='doctor@example.com', password="testpass123", account_type="doctor")
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+        self.client.force_authenticate(user=self.doctor_user)
+
+    def send(self, count=1):
+        """
+        Write messages from the patient to the doctor and commit them.
+        """
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(count):
+                Message.objects.create(conversation=self.conversation, sender=self.patient_user, text=f"Message {i}")
+
+    def unread_count(self):
+        """
+        Read the doctor's unread count through the API.
+        """
+        
+        response = self.client.get(reverse('notification-unread-count'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['unread_count']
+
+    def test_counter_is_counted_once_then_cached(self):
+        """
+        Test that a missing counter is counted in the database, then served from the cache.
+        """
+        
+        self.send(2)
+        cache.clear()
+        self.assertEqual(self.unread_count(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.doctor_user.id), 2)
+
+    def test_counter_follows_creations_and_reads(self):
+        """
+        Test that the counter is incremented, decremented and reset without recounting.
+        """
+        
+        self.assertEqual(self.unread_count(), 0)
+        self.send(3)
+        self.assertEqual(self.unread_count(), 3)
+
+        notification = Notification.objects.filter(recipient=self.doctor_user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('notification-detail', args=[notification.id]), {'is_read': True})
+        self.assertEqual(self.unread_count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('notification-mark-all-as-read'))
+        self.assertEqual(self.unread_count(), 0)
+        self.assertEqual(cache.get(unread_count_key(self.doctor_user.id)), 0)
+
+    def test_cache_failures_fall_back_to_the_database(self):
+        """
+        Test that notifications are stored and counted in the database while the cache is unreachable.
+        """
+        
+        unreachable = {f'{method}.side_effect': ConnectionError for method in ('get', 'add', 'incr', 'decr', 'set', 'delete')}
+        with mock.patch('notification.counters.cache', **unreachable), self.assertLogs('notification.counters', 'ERROR'):
+            self.send(2)
+            self.assertEqual(self.unread_count(), 2)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.patch(reverse('notification-mark-all-as-read'))
+            self.assertEqual(self.unread_count(), 0)
+        self.assertEqual(Notification.objects.filter(recipient=self.doctor_user).count(), 2)
+
+    @override_settings(COALESCE_MESSAGE_NOTIFICATIONS=True)
+    def test_merged_messages_count_once(self):
+        """
+        Test that messages merged into an unread notification do not add to the counter.
+        """
+        
+        self.assertEqual(self.unread_count(), 0)
+        self.send(3)
+        self.assertEqual(self.unread_count(), 1)
+
+    def test_reconcile_overwrites_drifted_counters(self):
+        """
+        Test that reconciliation sets every counter to the database count.
+        """
+        
+        self.send(2)
+        cache.set(unread_count_key(self.doctor_user.id), 7)
+        cache.set(unread_count_key(self.patient_user.id), 3)
+        out = StringIO()
+        call_command('reconcile_unread_counts', '--batch-size', '1', stdout=out)
+        self.assertIn('2 users', out.getvalue())
+        self.assertEqual(cache.get(unread_count_key(self.doctor_user.id)), 2)
+        self.assertEqual(cache.get(unread_count_key(self.patient_user.id)), 0)
+
+
+@override_settings(NOTIFICATION_RETENTION={'DAYS': {'message': 30, 'alert': None}, 'DEFAULT_DAYS': 90})
+class NotificationRetentionTestCase(TestCase):
+    """
+    Test case for the purge of read notifications past their retention period.
+    """
+
+    def setUp(self):
+        """
+        Set up a user and a notification factory.
+        """
+        
+        self.user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+
+    def notify(self, notification_type, days_ago, is_read=True, count=1):
+        """
+        Create notifications of a type, as if created some days ago.
+        """
+        
+        notifications = Notification.objects.bulk_create([
+            Notification(recipient=self.user, notification_type=notification_type, text="Hello", is_read=is_read)
+            for _ in range(count)
+        ])
+        ids = [notification.id for notification in notifications]
+        Notification.objects.filter(id__in=ids).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return ids
+
+    def test_purges_only_expired_read_notifications(self):
+        """
+        Test that read notifications past their type's period are deleted in batches, and the others kept.
+        """
+        
+        expired = self.notify('message', 31, count=5) + self.notify('call', 91)
+        kept = (
+            self.notify('message', 29) + self.notify('message', 31, is_read=False)
+            + self.notify('call', 89) + self.notify('alert', 1000)
+        )
+
+        out = StringIO()
+        call_command('purge_notifications', '--batch-size', '2', stdout=out)
+        self.assertIn('Deleted 5 message notifications.', out.getvalue())
+        self.assertIn('Deleted 6 notifications in total.', out.getvalue())
+        self.assertFalse(Notification.objects.filter(id__in=expired).exists())
+        self.assertEqual(sorted(Notification.objects.values_list('id', flat=True)), sorted(kept))
+
+    def test_dry_run_deletes_nothing(self):
+        """
+        Test that a dry run only counts the expired notifications.
+        """
+        
+        self.notify('appointment', 100, count=3)
+        out = StringIO()
+        call_command('purge_notifications', '--dry-run', stdout=out)
+        self.assertIn('Would delete 3 appointment notifications.', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 3)
+
+
+class NotificationPaginationTestCase(TestCase):
+    """
+    Test case for the keyset pagination and since-cursor sync of notifications.
+    """
+
+    def setUp(self):
+        """
+        Set up a user with notifications sharing creation times, which the ids order.
+        """
+        
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="patient", email='patient@example.com', password="testpass123", account_type="patient")
+        other = User.objects.create_user(username="other", email='other@example.com', password="testpass123", account_type="patient")
+        Notification.objects.create(recipient=other, notification_type='alert', text="Not yours")
+        self.notifications = [
+            Notification.objects.create(recipient=self.user, notification_type='alert', text=f"Alert {i}") for i in range(5)
+        ]
+        Notification.objects.filter(recipient=self.user).update(created_at=timezone.now() - timedelta(hours=1))
+        self.client.force_authenticate(user=self.user)
+
+    def get(self, **params):
+        """
+        List the user's notifications.
+        """
+        
+        response = self.client.get(reverse('notification-list'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_pages_are_newest_first_without_overlap(self):
+        """
+        Test that following next_cursor walks every notification once, newest first.
+        """
+        
+        first = self.get(page_size=2)
+        self.assertIsNotNone(first['sync_cursor'])
+        second = self.get(page_size=2, cursor=first['next_cursor'])
+        third = self.get(page_size=2, cursor=second['next_cursor'])
+        self.assertIsNone(third['next_cursor'])
+        self.assertNotIn('sync_cursor', second)
+
+        ids = [n['id'] for page in (first, second, third) for n in page['results']]
+        self.assertEqual(ids, [n.id for n in reversed(self.notifications)])
+
+    def test_since_returns_only_newer_notifications(self):
+        """
+        Test that a sync from the first page's cursor returns the notifications created since, oldest first.
+        """
+        
+        sync_cursor = self.get()['sync_cursor']
+        self.assertEqual(self.get(since=sync_cursor), {'sync_cursor': sync_cursor, 'has_more': False, 'results': []})
+
+        new = [Notification.objects.create(recipient=self.user, notification_type='alert', text=f"New {i}") for i in range(3)]
+        delta = self.get(since=sync_cursor, page_size=2)
+        self.assertEqual([n['id'] for n in delta['results']], [new[0].id, new[1].id])
+        self.assertTrue(delta['has_more'])
+        delta = self.get(since=delta['sync_cursor'], page_size=2)
+        # new[0] was stamped just before the cursor was issued, so it is returned again in case it committed late
+        self.assertEqual([n['id'] for n in delta['results']], [new[0].id, new[2].id])
+        self.assertFalse(delta['has_more'])
+
+    def test_since_returns_notifications_committed_after_the_cursor(self):
+        """
+        Test that a notification stamped before a sync cursor but committed after it was issued is synced.
+        """
+        
+        newest = Notification.objects.create(recipient=self.user, notification_type='alert', text="Newest")
+        sync_cursor = self.get()['sync_cursor']
+        late = Notification.objects.create(recipient=self.user, notification_type='alert', text="Late")
+        Notification.objects.filter(pk=late.pk).update(created_at=newest.created_at - timedelta(seconds=1))
+        self.assertEqual([n['id'] for n in self.get(since=sync_cursor)['results']], [late.id])
+
+        # Notifications stamped long before the cursor was issued were committed by then
+        Notification.objects.filter(pk=late.pk).update(created_at=newest.created_at - timedelta(minutes=5))
+        self.assertEqual(self.get(since=sync_cursor)['results'], [])
+
+    def test_invalid_cursors_are_rejected(self):
+        """
+        Test that malformed cursors are a bad request.
+        """
+        
+        self.assertEqual(self.client.get(reverse('notification-list'), {'since': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('notification-list'), {'cursor': 'nope'}).status_code, 400)
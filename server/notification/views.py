@@ -5,7 +5,8 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
-
+from .pagination import NotificationCursorPagination
+from .counters import adjust_unread_counts, get_unread_count, notifications_created, reset_unread_count
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
@@ -13,6 +14,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     A viewset for viewing and editing notification instances.
     """
     serializer_class = NotificationSerializer
+    pagination_class = NotificationCursorPagination
     queryset = Notification.objects.all()
     permission_classes = [IsAuthenticated]
 
@@ -24,6 +26,27 @@ class NotificationViewSet(viewsets.ModelViewSet):
         user = self.request.user
         return Notification.objects.filter(recipient=user)
 
+    def perform_create(self, serializer):
+        """
+        Count a new unread notification in its recipient's unread counter.
+        """
+        notifications_created([serializer.save()])
+
+    def perform_update(self, serializer):
+        """
+        Keep the unread counter of the recipient in step when a notification is read or unread.
+        """
+        was_read = serializer.instance.is_read
+        notification = serializer.save()
+        adjust_unread_counts({notification.recipient_id: int(was_read) - int(notification.is_read)})
+
+    def perform_destroy(self, instance):
+        """
+        Remove a deleted unread notification from its recipient's unread counter.
+        """
+        instance.delete()
+        if not instance.is_read:
+            adjust_unread_counts({instance.recipient_id: -1})
 
     @action(detail=False, methods=['patch'], permission_classes=[IsAuthenticated])
     def mark_all_as_read(self, request):
@@ -32,5 +55,13 @@ class NotificationViewSet(viewsets.ModelViewSet):
         """
         user = request.user
         notifications = Notification.objects.filter(recipient=user, is_read=False)
-        notifications.update(is_read=True)
+        notifications.update(is_read=True, coalesce_key=None)
+        reset_unread_count(user.id)
         return Response({'status': 'notifications marked as read'}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def unread_count(self, request):
+        """
+        The number of unread notifications of the authenticated user, from a cached counter.
+        """
+        return Response({'unread_count': get_unread_count(request.user.id)}, status=status.HTTP_200_OK)
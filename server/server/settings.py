@@ -72,9 +72,13 @@ INSTALLED_APPS = [
     "medical_record",
     "conversation",
     "notification",
+    "monitoring",
+    "benchmark",
 ]
 
 MIDDLEWARE = [
+    # Removes itself from the chain unless REQUEST_METRICS is enabled
+    "monitoring.middleware.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -191,10 +195,55 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Validated JWT cache, shared by the REST authentication class and the websocket consumers
+JWT_AUTH_CACHE = {
+    'MAX_ENTRIES': 10000,
+    # Upper bound on how long a cached user snapshot may be served, in seconds
+    'MAX_TTL': 300,
+}
+
+# Per-process cache of the public profile snapshots used in chat and call payloads
+PROFILE_SNAPSHOT_CACHE = {
+    'MAX_ENTRIES': 10000,
+    # Upper bound on how long a snapshot changed in another process may be served, in seconds
+    'MAX_TTL': 300,
+}
+
+# Per-route request instrumentation: SQL query count, SQL time, serializer time and total time
+REQUEST_METRICS = {
+    'ENABLED': bool(os.environ.get('REQUEST_METRICS')),
+    # Latest requests kept per process
+    'BUFFER_SIZE': 10000,
+    # Fraction of the requests recorded
+    'SAMPLE_RATE': 1.0,
+    # How often each process publishes its records to the cache for reports, in seconds
+    'PUBLISH_INTERVAL': 10,
+}
+
+# API benchmark suite (python manage.py run_benchmarks)
+BENCHMARKS = {
+    # Results a run is compared with, written by --save-baseline
+    'BASELINE': BASE_DIR / 'benchmark' / 'baseline.json',
+    # Growth of a scenario's p95 latency, as a fraction of the baseline, that fails the run
+    'THRESHOLD': 0.25,
+    # Latency growth in milliseconds ignored whatever the threshold, as noise on fast scenarios
+    'TOLERANCE_MS': 2.0,
+}
+
+# Lifetime of the cached per-day booking bitmaps of the availability calendar, in seconds
+AVAILABILITY_CACHE_TIMEOUT = 3600
+
+# How long a patient checking out holds an appointment slot, in seconds
+APPOINTMENT_HOLD_TIMEOUT = 300
+
+# Lifetime of the cached unread notification counters, in seconds, which bounds
+# their drift between runs of reconcile_unread_counts
+UNREAD_COUNT_CACHE_TIMEOUT = 24 * 3600
+
 # Rest Framework Settings
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
     ),
     # 'DEFAULT_AUTHENTICATION_CLASSES': (
     #     'rest_framework.authentication.TokenAuthentication',
@@ -262,6 +311,9 @@ CACHES = {
     }
 }
 
+# Replaces CACHES and CHANNEL_LAYERS with local ones, so the tests run without Redis
+TEST_RUNNER = 'server.test_runner.TestRunner'
+
 CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
@@ -271,6 +323,49 @@ CHANNEL_LAYERS = {
     },
 }
 
+# Write-behind chat persistence: broadcast first, then save messages in micro-batches
+CHAT_WRITE_BEHIND = {
+    'ENABLED': bool(os.environ.get("CHAT_WRITE_BEHIND", default="")),
+    'BATCH_SIZE': 100,
+    # Maximum time a message waits for its batch to fill up, in seconds
+    'FLUSH_INTERVAL': 0.05,
+}
+
+# Notifications built from an outbox drained by `process_notification_outbox`,
+# instead of synchronously by the request that saved the message, call or appointment
+NOTIFICATION_OUTBOX = {
+    'ENABLED': bool(os.environ.get("NOTIFICATION_OUTBOX", default="")),
+    # Events turned into notifications per transaction
+    'BATCH_SIZE': 500,
+    # How long the worker sleeps when the outbox is empty, in seconds
+    'POLL_INTERVAL': 1.0,
+}
+
+# Merge the unread message notifications of a recipient in a conversation into one row with a count
+COALESCE_MESSAGE_NOTIFICATIONS = bool(os.environ.get("COALESCE_MESSAGE_NOTIFICATIONS", default=""))
+
+# Seconds a notification may be stamped before its transaction commits. Notification
+# syncs re-read the notifications stamped this long before their cursor was issued
+NOTIFICATION_SYNC_LOOKBACK = 30
+
+# Read notifications deleted by `purge_notifications` once older than their type's
+# retention period; unread notifications are always kept
+NOTIFICATION_RETENTION = {
+    # Days a read notification is kept, per notification type; None keeps them forever
+    'DAYS': {
+        'message': 30,
+        'call': 90,
+        'appointment': 180,
+        'alert': 365,
+    },
+    # Days kept for types missing from DAYS
+    'DEFAULT_DAYS': 90,
+    # Notifications deleted per statement, to keep locks and transactions short
+    'BATCH_SIZE': 1000,
+    # Pause between batches, in seconds, to leave room for replication and other writers
+    'SLEEP': 0.0,
+}
+
 
 
 SWAGGER_SETTINGS = {
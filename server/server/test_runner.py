@@ -0,0 +1,40 @@
+import unittest
+
+from django.core.cache import caches
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# The test suite runs without Redis, on a cache and channel layer local to the process
+TEST_SETTINGS = {
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    'CHANNEL_LAYERS': {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+}
+
+
+class CacheClearingTextTestResult(unittest.TextTestResult):
+    """
+    Test result that empties the caches before each test, so no test sees what another one cached.
+    """
+
+    def startTest(self, test):
+        for cache in caches.all(initialized_only=True):
+            cache.clear()
+        super().startTest(test)
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Test runner that replaces the Redis cache and channel layer of the settings with local ones.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = override_settings(**TEST_SETTINGS)
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        return super().get_resultclass() or CacheClearingTextTestResult
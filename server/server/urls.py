@@ -60,6 +60,7 @@ urlpatterns += [
     path('api/conversations/', include('conversation.urls')),
     path('api/medical_records/', include('medical_record.urls')),
     path('api/notifications/', include('notification.urls')),
+    path('api/monitoring/', include('monitoring.urls')),
     # Admin endpoint
     path('admin/', admin.site.urls),
     # Auth endpoints
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from server.cache import LRUCache
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+# User fields kept in a token's snapshot. Any other field is loaded lazily on access.
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'email', 'account_type',
+    'timezone', 'is_active', 'is_staff', 'is_superuser',
+)
+
+JWT_AUTH_CACHE = getattr(settings, 'JWT_AUTH_CACHE', {})
+
+# Validated tokens, keyed by the SHA-256 hash of the raw token
+token_cache = LRUCache(max_entries=JWT_AUTH_CACHE.get('MAX_ENTRIES', 10000))
+
+
+def hash_token(raw_token):
+    """
+    Hash a raw token so the token itself is never kept in memory as a key.
+    """
+    if isinstance(raw_token, str):
+        raw_token = raw_token.encode('utf-8')
+    return hashlib.sha256(raw_token).hexdigest()
+
+
+def snapshot_user(user):
+    """
+    Take a lightweight snapshot of the fields of a user.
+    """
+    return {field: getattr(user, field) for field in SNAPSHOT_FIELDS}
+
+
+def user_from_snapshot(snapshot):
+    """
+    Build a user instance from a snapshot without touching the database.
+    """
+    field_names = [field.attname for field in User._meta.concrete_fields if field.attname in snapshot]
+    return User.from_db('default', field_names, [snapshot[name] for name in field_names])
+
+
+def user_version_key(user_id):
+    """
+    Shared cache key of the version of a user, which changes whenever the user is saved or deleted.
+    """
+    return f'jwt_user_version:{user_id}'
+
+
+def get_user_version(user_id):
+    """
+    Return the current version of a user, or raise when the shared cache is unreachable.
+    """
+    return cache.get(user_version_key(user_id))
+
+
+def bump_user_version(user_id):
+    """
+    Give a user a new version, so every process stops trusting the tokens it cached for them.
+    The version outlives any cached token, which is kept at most `MAX_TTL` seconds.
+    """
+    cache.set(user_version_key(user_id), uuid.uuid4().hex, JWT_AUTH_CACHE.get('MAX_TTL', 300))
+
+
+def invalidate_user(user_id):
+    """
+    Drop every cached token of the given user in this process, and in the other
+    processes by bumping the user's version once the transaction is committed.
+    """
+    token_cache.delete_where(lambda entry: entry[0]['id'] == user_id)
+    transaction.on_commit(lambda: bump_user_version(user_id), robust=True)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that caches validated tokens.
+
+    The first request with a token verifies its signature and loads the user as
+    usual. Later requests with the same token reuse the validated token and a
+    snapshot of the user until the token expires or `MAX_TTL` seconds have passed,
+    whichever comes first, so they need neither a signature check nor a query.
+
+    A cached token is only trusted while the user's version in the shared cache
+    is the one it was cached with, so saving or deleting a user in any process
+    invalidates their tokens everywhere.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        return self.authenticate_token(raw_token)
+
+    def authenticate_token(self, raw_token):
+        """
+        Return the (user, validated token) pair for a raw token, using the cache when possible.
+        """
+        key = hash_token(raw_token)
+        entry = token_cache.get(key)
+        if entry is not None:
+            snapshot, validated_token, version = entry
+            try:
+                if get_user_version(snapshot['id']) == version:
+                    return user_from_snapshot(snapshot), validated_token
+            except Exception:
+                # Without the shared cache a revocation cannot be ruled out
+                logger.exception("Failed to read the version of user %s", snapshot['id'])
+            token_cache.delete(key)
+
+        validated_token = self.get_validated_token(raw_token)
+        # Read the version before the user, so a change committed in between invalidates the entry
+        try:
+            version = get_user_version(validated_token.get(api_settings.USER_ID_CLAIM))
+        except Exception:
+            logger.exception("Failed to read the version of a user")
+            return self.get_user(validated_token), validated_token
+        user = self.get_user(validated_token)
+
+        expires_at = min(validated_token['exp'], time.time() + JWT_AUTH_CACHE.get('MAX_TTL', 300))
+        token_cache.set(key, (snapshot_user(user), validated_token, version), expires_at=expires_at)
+        return user, validated_token
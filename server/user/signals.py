@@ -0,0 +1,15 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from .authentication import invalidate_user
+
+User = get_user_model()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    """
+    Signal receiver function to drop the cached tokens of a user after it's been updated or deleted,
+    so a deactivated user is rejected on their next request.
+    """
+    invalidate_user(instance.id)
@@ -2,6 +2,10 @@ from django.test import TestCase
 from django.contrib.auth import get_user_model
 from .models import CustomUser
 from .serializers import UserSerializer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from unittest import mock
+from .authentication import CachedJWTAuthentication, bump_user_version, token_cache
 
 class CustomUserTestCase(TestCase):
     """
@@ -86,3 +90,91 @@ class UserSerializerTestCase(TestCase):
         Test the presence of the timezone field in the serializer.
         """        
         self.assertIn('timezone', self.serializer.fields)
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+    """
+    Test case for the cached JWT authentication.
+    """
+
+    def setUp(self):
+        """
+        Set up a user with an access token.
+        """
+        
+        token_cache.clear()
+        self.user = get_user_model().objects.create_user(username='patient', email='patient@example.com', password='testpass123', account_type='patient')
+        self.token = str(AccessToken.for_user(self.user))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_cached_token_skips_user_lookup(self):
+        """
+        Test that a token is only validated against the database once.
+        """
+        
+        authentication = CachedJWTAuthentication()
+        with self.assertNumQueries(1):
+            user, _ = authentication.authenticate_token(self.token)
+        with self.assertNumQueries(0):
+            cached_user, _ = authentication.authenticate_token(self.token)
+        self.assertEqual(cached_user.pk, user.pk)
+        self.assertEqual(cached_user.account_type, 'patient')
+        self.assertTrue(cached_user.is_authenticated)
+
+    def test_rest_requests_use_cache(self):
+        """
+        Test that REST requests authenticate with the cached token.
+        """
+        
+        response = self.client.get('/api/notifications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(token_cache), 1)
+
+    def test_deactivated_user_is_rejected(self):
+        """
+        Test that deactivating a user invalidates their cached tokens.
+        """
+        
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(len(token_cache), 0)
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+
+    def test_user_changed_in_another_process_is_reloaded(self):
+        """
+        Test that a cached token is validated again once the user's shared version changed,
+        as it does when another process saves the user.
+        """
+        
+        authentication = CachedJWTAuthentication()
+        authentication.authenticate_token(self.token)
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+        bump_user_version(self.user.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+
+    def test_saving_a_user_bumps_their_version_on_commit(self):
+        """
+        Test that saving a user invalidates the tokens every process cached for them.
+        """
+        
+        with mock.patch('user.authentication.bump_user_version') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.first_name = 'Ada'
+                self.user.save()
+                bump.assert_not_called()
+        bump.assert_called_with(self.user.pk)
+
+    def test_cached_token_is_not_trusted_without_the_shared_cache(self):
+        """
+        Test that a cached token is validated against the database while the shared cache is unreachable.
+        """
+        
+        authentication = CachedJWTAuthentication()
+        authentication.authenticate_token(self.token)
+        with mock.patch('user.authentication.cache.get', side_effect=ConnectionError), \
+                self.assertLogs('user.authentication', 'ERROR'), self.assertNumQueries(1):
+            user, _ = authentication.authenticate_token(self.token)
+        self.assertEqual(user.pk, self.user.pk)
@@ -7,5 +7,8 @@ class UserProfileConfig(AppConfig):
     
     def ready(self):
         import user_profile.signals
+        from django.db.models.signals import post_migrate
+        from .search import create_search_indexes
+        post_migrate.connect(create_search_indexes, sender=self)
 
 
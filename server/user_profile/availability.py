@@ -0,0 +1,130 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import make_aware
+
+from appointment.models import Appointment
+
+# Bookings are tracked per UTC day in 15 minute steps, so slots stay aligned
+# for doctors and patients in timezones with half or quarter hour offsets.
+SLOT_MINUTES = 15
+
+AVAILABILITY_CACHE_TIMEOUT = getattr(settings, 'AVAILABILITY_CACHE_TIMEOUT', 3600)
+
+
+def bitmap_key(doctor_id, day):
+    """
+    Cache key of the booking bitmap of a doctor on a UTC day.
+    """
+    return f'availability:{doctor_id}:{day.isoformat()}'
+
+
+def slot_bit(datetime_utc):
+    """
+    Bit of the bitmap that represents the given UTC datetime.
+    """
+    return 1 << ((datetime_utc.hour * 60 + datetime_utc.minute) // SLOT_MINUTES)
+
+
+def get_booked_bitmaps(doctor_id, days):
+    """
+    Return the booking bitmap of a doctor for each of the given UTC days.
+
+    Bitmaps are read from the cache, and the missing ones are built from the
+    doctor's appointments with a single query and cached.
+    """
+    keys = {bitmap_key(doctor_id, day): day for day in days}
+    bitmaps = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+    missing = [day for day in days if day not in bitmaps]
+    if missing:
+        built = {day: 0 for day in missing}
+        appointments = Appointment.objects.filter(
+            doctor_id=doctor_id,
+            datetime_utc__gte=datetime.combine(min(missing), time.min, tzinfo=dt_timezone.utc),
+            datetime_utc__lt=datetime.combine(max(missing) + timedelta(days=1), time.min, tzinfo=dt_timezone.utc),
+        ).values_list('datetime_utc', flat=True)
+        for datetime_utc in appointments:
+            datetime_utc = datetime_utc.astimezone(dt_timezone.utc)
+            if datetime_utc.date() in built:
+                built[datetime_utc.date()] |= slot_bit(datetime_utc)
+        cache.set_many({bitmap_key(doctor_id, day): value for day, value in built.items()}, AVAILABILITY_CACHE_TIMEOUT)
+        bitmaps.update(built)
+
+    return bitmaps
+
+
+def mark_booked(doctor_id, datetime_utc):
+    """
+    Set the bit of a new booking in the cached bitmap of its day, if that bitmap is cached.
+
+    Bitmaps expire after AVAILABILITY_CACHE_TIMEOUT, which bounds the effect of
+    two bookings on the same day updating the bitmap concurrently.
+    """
+    datetime_utc = datetime_utc.astimezone(dt_timezone.utc)
+    key = bitmap_key(doctor_id, datetime_utc.date())
+    bitmap = cache.get(key)
+    if bitmap is not None:
+        cache.set(key, bitmap | slot_bit(datetime_utc), AVAILABILITY_CACHE_TIMEOUT)
+
+
+def record_booking(doctor_id, datetime_utc):
+    """
+    Mark a new booking in the cached bitmap of its day, dropping that bitmap
+    instead when it could not be updated, so it is rebuilt from the database.
+    """
+    try:
+        mark_booked(doctor_id, datetime_utc)
+    except Exception:
+        invalidate_day(doctor_id, datetime_utc)
+
+
+def invalidate_day(doctor_id, datetime_utc):
+    """
+    Drop the cached bitmap of the day of the given UTC datetime.
+    """
+    cache.delete(bitmap_key(doctor_id, datetime_utc.astimezone(dt_timezone.utc).date()))
+
+
+def availability_calendar(doctor, user_tz, start_date, end_date, now=None):
+    """
+    Build the hourly slots of a doctor for every day between start_date and end_date
+    (inclusive, in the user's timezone), with their booked status.
+    """
+    now = now or datetime.now(tz=user_tz)
+    doctor_tz = ZoneInfo(str(doctor.get_timezone()))
+
+    # Doctor's local days that can have slots falling on the requested user days
+    first_day = make_aware(datetime.combine(start_date, time.min), timezone=user_tz).astimezone(doctor_tz).date()
+    last_day = make_aware(datetime.combine(end_date, time.max), timezone=user_tz).astimezone(doctor_tz).date()
+
+    slots = []
+    day = first_day
+    while day <= last_day:
+        for hour in range(doctor.availability_start.hour, doctor.availability_end.hour):
+            slot_utc_datetime = make_aware(datetime.combine(day, time(hour, 0)), timezone=doctor_tz).astimezone(dt_timezone.utc)
+            slot_user_tz_datetime = slot_utc_datetime.astimezone(user_tz)
+            if start_date <= slot_user_tz_datetime.date() <= end_date and slot_user_tz_datetime >= now:
+                slots.append((slot_utc_datetime, slot_user_tz_datetime))
+        day += timedelta(days=1)
+
+    bitmaps = get_booked_bitmaps(doctor.pk, sorted({slot_utc.date() for slot_utc, _ in slots}))
+
+    days = {}
+    current = start_date
+    while current <= end_date:
+        days[current] = []
+        current += timedelta(days=1)
+
+    for slot_utc_datetime, slot_user_tz_datetime in slots:
+        is_booked = bitmaps[slot_utc_datetime.date()] & slot_bit(slot_utc_datetime)
+        days[slot_user_tz_datetime.date()].append({
+            'time': slot_user_tz_datetime.strftime('%H:%M'),
+            'status': 'booked' if is_booked else 'unbooked',
+            'datetime_utc': slot_utc_datetime.isoformat(),
+            'datetime_user_tz': slot_user_tz_datetime.isoformat(),
+        })
+
+    return [{'date': day.isoformat(), 'slots': day_slots} for day, day_slots in days.items()]
@@ -0,0 +1,99 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from rest_framework.exceptions import ValidationError
+
+from .filters import DoctorFilter
+from .models import Doctor
+from .search import normalize
+
+# Facet name: (field the doctors are grouped by, filter parameter of the facet)
+DOCTOR_FACETS = {
+    'speciality': ('specialties__name', 'speciality'),
+    'language': ('languages__name', 'language'),
+    'qualification': ('qualifications__name', 'qualification'),
+    'availability': ('availability', 'availability'),
+}
+
+# Parameters matched as lists of exact values, in any order
+LIST_PARAMS = ('language', 'qualification', 'availability')
+# Parameters matched as search text
+TEXT_PARAMS = ('q', 'doctor_name', 'location')
+# Other parameters, range filters being read from their _min and _max parameters
+EXACT_PARAMS = ('speciality', 'experience_min', 'experience_max', 'cost_min', 'cost_max')
+
+DOCTOR_FACETS_CACHE_TIMEOUT = getattr(settings, 'DOCTOR_FACETS_CACHE_TIMEOUT', 300)
+
+
+def normalize_filters(query_params):
+    """
+    Reduce the directory filters of a request to a canonical form, so requests
+    that filter the same way share their cached facet counts.
+    """
+    filters = {}
+    for name, value in query_params.items():
+        if name in LIST_PARAMS:
+            items = sorted({item.strip() for raw in query_params.getlist(name) for item in raw.split(',') if item.strip()})
+            if items:
+                filters[name] = ','.join(items)
+        elif name in TEXT_PARAMS and normalize(value):
+            filters[name] = normalize(value)
+        elif name in EXACT_PARAMS and value.strip():
+            filters[name] = value.strip().lower() if name == 'speciality' else value.strip()
+    return filters
+
+
+def filter_doctors(queryset, filters, request=None):
+    """
+    Apply the directory filters to a queryset of doctors.
+    """
+    filterset = DoctorFilter(filters, queryset=queryset, request=request)
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    return filterset.qs
+
+
+def compute_facets(queryset, filters):
+    """
+    Count the doctors for every value of every facet.
+
+    Facets are disjunctive: the counts of a facet apply every filter except the
+    facet's own, so they tell how many doctors selecting another value would
+    return. Each facet takes one grouped query.
+    """
+    facets = {}
+    for facet, (field, param) in DOCTOR_FACETS.items():
+        others = {name: value for name, value in filters.items() if name != param}
+        doctor_ids = filter_doctors(queryset, others).values('pk')
+        rows = (
+            Doctor.objects.filter(pk__in=doctor_ids)
+            .exclude(**{f'{field}__isnull': True})
+            .values(field)
+            .annotate(count=Count('pk', distinct=True))
+            .order_by()
+        )
+        facets[facet] = sorted(
+            ({'value': row[field], 'count': row['count']} for row in rows),
+            key=lambda item: (-item['count'], item['value']),
+        )
+    return {
+        'count': filter_doctors(queryset, filters).order_by().count(),
+        'facets': facets,
+    }
+
+
+def get_facets(queryset, query_params):
+    """
+    Return the facet counts of the directory under the given filters, cached per filter signature.
+    """
+    filters = normalize_filters(query_params)
+    signature = hashlib.sha256(json.dumps(filters, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f'doctor_facets:{signature}'
+    result = cache.get(key)
+    if result is None:
+        result = compute_facets(queryset, filters)
+        cache.set(key, result, DOCTOR_FACETS_CACHE_TIMEOUT)
+    return result
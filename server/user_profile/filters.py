@@ -1,6 +1,7 @@
 from django_filters import rest_framework as filters, Filter, BaseInFilter, CharFilter, NumberFilter
 from django.db.models import Q
 from .models import Doctor, Speciality, Qualification
+from .search import normalize, term_filter, document_filter, rank_search_results
 
 
 class ListFilter(BaseInFilter, CharFilter):
@@ -16,6 +17,7 @@ class DoctorFilter(filters.FilterSet):
     Filter set for Doctor model.
     """
     
+    q = filters.CharFilter(method='filter_search')
     doctor_name = filters.CharFilter(method='filter_doctor_name')
     location = filters.CharFilter(method='filter_location')
     experience = filters.RangeFilter()
@@ -30,21 +32,47 @@ class DoctorFilter(filters.FilterSet):
         model = Doctor
         fields = []
 
+    def filter_queryset(self, queryset):
+        """
+        Filter the doctors and rank them by how well they match the search terms.
+
+        Results are ordered by rank unless the client asked for an explicit ordering
+        or pages with a cursor, which needs the ordering to stay fixed.
+        """
+        self.search_terms = []
+        queryset = super().filter_queryset(queryset)
+        if self.search_terms:
+            params = self.request.query_params if self.request is not None else {}
+            reorder = 'ordering' not in params and 'cursor' not in params
+            queryset = rank_search_results(queryset, self.search_terms, reorder=reorder)
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        """
+        Custom method to filter doctors by every word of a free text search over their
+        name, specialties, languages, qualifications and address.
+        """
+        words = normalize(value).split()
+        if not words:
+            return queryset
+        self.search_terms += words
+        return queryset.filter(document_filter(words))
+
     def filter_doctor_name(self, queryset, name, value):
         """
         Custom method to filter doctors by their first name, last name, or a combination of both.
         """
         # Split the search term into words
-        name_parts = value.split()
+        name_parts = normalize(value).split()
+        if not name_parts:
+            return queryset
 
-        # Start with an empty query
+        # Match doctors whose name contains any of the words
         name_query = Q()
-
-        # Add a query condition for each part of the name
         for part in name_parts:
-            name_query |= Q(user__first_name__icontains=part) | Q(user__last_name__icontains=part)
+            name_query |= term_filter('name', part)
 
-        # Filter the queryset with the combined query
+        self.search_terms += name_parts
         return queryset.filter(name_query)
 
 
@@ -53,13 +81,10 @@ class DoctorFilter(filters.FilterSet):
         Custom method to filter doctors by location.
         """
         
-        return queryset.filter(
-            Q(hospital_address__street__icontains=value) |
-            Q(hospital_address__city__icontains=value) |
-            Q(hospital_address__state__icontains=value) |
-            Q(hospital_address__postal_code__icontains=value) |
-            Q(hospital_address__country__icontains=value)
-        ).distinct()
+        location = normalize(value)
+        if not location:
+            return queryset
+        return queryset.filter(term_filter('location', location))
         
     
     def filter_availability(self, queryset, name, value):
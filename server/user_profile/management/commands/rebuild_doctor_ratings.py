@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from user_profile.models import Doctor, Review
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the rating count and rating sum of every doctor from their reviews.
+    """
+
+    help = 'Rebuild the rating aggregates of every doctor from their reviews.'
+
+    def handle(self, *args, **options):
+        reviews = Review.objects.filter(doctor=OuterRef('pk')).order_by().values('doctor')
+
+        updated = Doctor.objects.update(
+            rating_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count')), 0,
+                                  output_field=IntegerField()),
+            rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total')), 0,
+                                output_field=IntegerField()),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the ratings of {updated} doctors.'))
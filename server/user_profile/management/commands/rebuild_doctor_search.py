@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from user_profile.models import Doctor
+from user_profile.search import index_doctors
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the search documents of every doctor, or with --missing only index the
+    doctors without one, which migrations.sh runs after migrating to backfill the index.
+    """
+
+    help = 'Rebuild the search index of the doctor directory.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of doctors indexed per transaction.')
+        parser.add_argument('--missing', action='store_true',
+                            help='Only index the doctors that have no search document.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        doctors = Doctor.objects.order_by('pk')
+        if options['missing']:
+            doctors = doctors.filter(search_document__isnull=True)
+        doctor_ids = list(doctors.values_list('pk', flat=True))
+
+        indexed = 0
+        for start in range(0, len(doctor_ids), batch_size):
+            indexed += index_doctors(doctor_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} doctors.'))
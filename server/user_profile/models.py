@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, DecimalField, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Cast, Coalesce
+from decimal import Decimal
 from django.contrib.auth import get_user_model
 from datetime import datetime, timedelta, time
 from conversation.models import Conversation
@@ -91,6 +94,19 @@ class Qualification(models.Model):
         return f"{self.name} from {self.university}"
     
 
+# Sort keys of the doctor directory. Missing values sort as zero, so every
+# doctor has a comparable key and (key, id) is a unique, stable position.
+DOCTOR_SORT_KEYS = {
+    'rating': Case(
+        When(rating_count__gt=0, then=Cast('rating_sum', FloatField()) / Cast('rating_count', FloatField())),
+        default=Value(0.0),
+        output_field=FloatField(),
+    ),
+    'cost': Coalesce('cost', Value(Decimal('0')), output_field=DecimalField(max_digits=10, decimal_places=2)),
+    'experience': Coalesce('experience', Value(0), output_field=IntegerField()),
+}
+
+
 class Doctor(models.Model):
     """
     Model to represent a doctor.
@@ -115,15 +131,33 @@ class Doctor(models.Model):
     currency = models.CharField(max_length=3, null=True, blank=True)
     description = models.TextField(null=True, blank=True)
     availability = models.CharField(max_length=10, choices=AVAILABILITY_CHOICES, null=True, blank=True)
+    # Rating aggregates, kept in step with the doctor's reviews
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(DOCTOR_SORT_KEYS[key], F('user_id'), name=f'doctor_{key}_order_idx')
+            for key in ('rating', 'cost', 'experience')
+        ]
 
     def average_rating(self):
         """
         Calculate the average rating of the doctor based on reviews.
         """
         
-        total = sum(review.rating for review in self.reviews.all())
-        count = self.reviews.count()
-        return total / count if count > 0 else 0
+        return self.rating_sum / self.rating_count if self.rating_count > 0 else 0
+
+    @classmethod
+    def update_rating(cls, doctor_id, count_delta, sum_delta):
+        """
+        Apply a change in reviews to the rating aggregates of a doctor.
+        """
+        
+        cls.objects.filter(pk=doctor_id).update(
+            rating_count=F('rating_count') + count_delta,
+            rating_sum=F('rating_sum') + sum_delta,
+        )
     
     def get_timezone(self):
         """
@@ -193,5 +227,54 @@ class Review(models.Model):
     conversation = models.OneToOneField(Conversation, on_delete=models.CASCADE, null=True, blank=True)
     date_created = models.DateTimeField(auto_now_add=True)
 
+    def save(self, *args, **kwargs):
+        """
+        Save the review and update the rating aggregates of its doctor in the same transaction.
+        """
+        
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.rating} Star review by {self.patient.user.username} for {self.doctor.user.username}"
+
+
+class DoctorSearchDocument(models.Model):
+    """
+    Model to hold the normalized search text of a doctor.
+    """
+    
+    doctor = models.OneToOneField(Doctor, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    name = models.TextField(blank=True, default='')
+    location = models.TextField(blank=True, default='')
+    # Name, specialties, languages, qualifications and address
+    document = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Search document of {self.doctor_id}"
+
+
+class DoctorSearchTrigram(models.Model):
+    """
+    Model to represent a trigram of a doctor's search text.
+
+    Used as the search index on databases without trigram indexes of their own.
+    """
+    
+    FIELD_CHOICES = [
+        ('name', 'Name'),
+        ('location', 'Location'),
+        ('document', 'Document'),
+    ]
+    document = models.ForeignKey(DoctorSearchDocument, on_delete=models.CASCADE, related_name='trigrams')
+    field = models.CharField(max_length=8, choices=FIELD_CHOICES)
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['field', 'trigram', 'document'], name='doctor_search_trigram_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.field}:{self.trigram}"
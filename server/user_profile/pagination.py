@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+
+from .models import DOCTOR_SORT_KEYS
+
+DOCTOR_ORDERINGS = {**DOCTOR_SORT_KEYS, 'id': F('user_id')}
+
+DEFAULT_DOCTOR_ORDERING = 'id'
+
+DOCTOR_COUNT_CACHE_TIMEOUT = getattr(settings, 'DOCTOR_COUNT_CACHE_TIMEOUT', 60)
+
+
+def parse_ordering(value):
+    """
+    Split an ordering parameter such as `-rating` into its key and direction.
+    """
+    value = value or DEFAULT_DOCTOR_ORDERING
+    key = value.lstrip('-')
+    if key not in DOCTOR_ORDERINGS or value.count('-') > 1:
+        raise ValidationError({'ordering': f"Must be one of {', '.join(DOCTOR_ORDERINGS)}, optionally prefixed with '-'."})
+    return key, value.startswith('-')
+
+
+def order_doctors(queryset, ordering):
+    """
+    Annotate doctors with the sort key of the ordering and order them by it, ties broken by id.
+    """
+    key, descending = parse_ordering(ordering)
+    queryset = queryset.annotate(sort_key=DOCTOR_ORDERINGS[key])
+    if descending:
+        return queryset.order_by('-sort_key', '-user_id')
+    return queryset.order_by('sort_key', 'user_id')
+
+
+class DoctorCursorPagination(BasePagination):
+    """
+    Keyset pagination for the doctor directory.
+
+    Each page continues from the (sort key, id) of the last doctor of the previous
+    page, so every page costs the same however deep the client scrolls and no
+    `COUNT(*)` is run. The total count is only computed when `with_count` is
+    given, and is then cached for a short while per filter combination.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def encode_cursor(self, ordering, value, pk):
+        """
+        Encode the position of a doctor into an opaque cursor string.
+        """
+        if isinstance(value, Decimal):
+            value = str(value)
+        raw = json.dumps([ordering, value, pk], separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor, ordering):
+        """
+        Decode a cursor string back into a (sort key, id) position for the ordering.
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            cursor_ordering, value, pk = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if cursor_ordering != ordering:
+                raise ValueError(cursor_ordering)
+            key, _ = parse_ordering(ordering)
+            if key == 'cost':
+                value = Decimal(value)
+            elif key == 'rating':
+                value = float(value)
+            else:
+                value = int(value)
+            return value, int(pk)
+        except (TypeError, ValueError, ArithmeticError, UnicodeError, ValidationError):
+            raise ValidationError({'cursor': 'Invalid cursor.'})
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({'page_size': 'Must be an integer.'})
+        if page_size < 1:
+            raise ValidationError({'page_size': 'Must be a positive integer.'})
+        return min(page_size, self.max_page_size)
+
+    def get_count(self, queryset, request):
+        """
+        Count the filtered doctors, caching the count per filter combination.
+        """
+        params = sorted(
+            (key, request.query_params.getlist(key)) for key in request.query_params
+            if key not in (self.cursor_query_param, self.page_size_query_param, 'ordering', 'with_count')
+        )
+        signature = hashlib.sha256(json.dumps(params).encode('utf-8')).hexdigest()
+        key = f'doctor_count:{signature}'
+        count = cache.get(key)
+        if count is None:
+            count = queryset.order_by().count()
+            cache.set(key, count, DOCTOR_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = request.query_params.get('ordering') or DEFAULT_DOCTOR_ORDERING
+        _, descending = parse_ordering(self.ordering)
+        self.count = self.get_count(queryset, request) if 'with_count' in request.query_params else None
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            value, pk = self.decode_cursor(cursor, self.ordering)
+            if descending:
+                queryset = queryset.filter(Q(sort_key__lt=value) | Q(sort_key=value, user_id__lt=pk))
+            else:
+                queryset = queryset.filter(Q(sort_key__gt=value) | Q(sort_key=value, user_id__gt=pk))
+
+        page_size = self.get_page_size(request)
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        self.page = page[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        next_cursor = None
+        if self.has_next:
+            last = self.page[-1]
+            next_cursor = self.encode_cursor(self.ordering, last.sort_key, last.pk)
+
+        response = {'next_cursor': next_cursor}
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
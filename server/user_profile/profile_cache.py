@@ -0,0 +1,110 @@
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DOCTOR_PROFILE_CACHE_TIMEOUT = getattr(settings, 'DOCTOR_PROFILE_CACHE_TIMEOUT', 3600)
+
+
+class CacheStats:
+    """
+    Thread-safe hit and miss counters of a cache, per process.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, hit):
+        """
+        Count a lookup as a hit or a miss.
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        """
+        Return the counters and the hit ratio.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'hit_ratio': self.hits / total if total else 0.0}
+
+    def reset(self):
+        """
+        Reset the counters to zero.
+        """
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+profile_cache_stats = CacheStats()
+
+
+def version_key(doctor_id):
+    """
+    Cache key of the profile version of a doctor.
+    """
+    return f'doctor_profile_version:{doctor_id}'
+
+
+def get_version(doctor_id):
+    """
+    Return the current profile version of a doctor, starting a new one if it has none.
+    """
+    version = cache.get(version_key(doctor_id))
+    if version is None:
+        # If another request started a version in the meantime, use theirs
+        cache.add(version_key(doctor_id), uuid.uuid4().hex, None)
+        version = cache.get(version_key(doctor_id))
+    return version
+
+
+def bump_versions(doctor_ids):
+    """
+    Give the doctors a new profile version once the current transaction commits,
+    so their cached profiles are no longer used. A cache outage is logged rather
+    than failing the write that was just committed.
+
+    Versions are random rather than incremented, so a version key that was evicted
+    from the cache can never bring back a profile cached under an old version.
+    """
+    doctor_ids = list(doctor_ids)
+    if doctor_ids:
+        transaction.on_commit(lambda: cache.set_many(
+            {version_key(doctor_id): uuid.uuid4().hex for doctor_id in doctor_ids}, None,
+        ), robust=True)
+
+
+def profile_key(doctor_id, version, request):
+    """
+    Cache key of the profile of a doctor at a version, as served to the origin of the request.
+    """
+    origin = request.build_absolute_uri('/') if request is not None else ''
+    origin_hash = hashlib.sha256(origin.encode('utf-8')).hexdigest()[:16]
+    return f'doctor_profile:{doctor_id}:{version}:{origin_hash}'
+
+
+def get_cached_profile(doctor, request, build):
+    """
+    Return the time-independent part of a doctor's profile, building and caching
+    it with `build(doctor)` when the current version is not cached yet.
+
+    Returns the profile and whether it was served from the cache.
+    """
+    key = profile_key(doctor.pk, get_version(doctor.pk), request)
+    profile = cache.get(key)
+    hit = profile is not None
+    profile_cache_stats.record(hit)
+    if not hit:
+        profile = build(doctor)
+        cache.set(key, profile, DOCTOR_PROFILE_CACHE_TIMEOUT)
+    return profile, hit
@@ -0,0 +1,192 @@
+import re
+import threading
+import unicodedata
+
+from django.db import connection, connections, transaction
+from django.db.models import BooleanField, Case, Count, F, Func, IntegerField, Q, Value, When
+
+from .models import Doctor, DoctorSearchDocument, DoctorSearchTrigram
+
+SEARCH_FIELDS = ('name', 'location', 'document')
+
+# Search terms shorter than a trigram cannot use the trigram index
+MIN_INDEXED_TERM_LENGTH = 3
+
+_pending = threading.local()
+
+
+def normalize(text):
+    """
+    Lowercase a text, strip its accents and reduce it to words separated by single spaces.
+    """
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(re.findall(r'[^\W_]+', text))
+
+
+def trigrams(text):
+    """
+    Return the set of three character substrings of a normalized text.
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def uses_trigram_table():
+    """
+    Whether searches go through the trigram table instead of the database's own indexes.
+    """
+    return connection.vendor != 'postgresql'
+
+
+def build_document(doctor):
+    """
+    Build the normalized search texts of a doctor with its related objects prefetched.
+    """
+    user = doctor.user
+    name = normalize(f'{user.first_name} {user.last_name} {user.username}')
+
+    address = doctor.hospital_address
+    location = ''
+    if address is not None:
+        location = normalize(' '.join([address.street, address.city, address.state, address.postal_code, address.country]))
+
+    document = normalize(' '.join([
+        name,
+        *(speciality.name for speciality in doctor.specialties.all()),
+        *(language.name for language in doctor.languages.all()),
+        *(f'{qualification.name} {qualification.university}' for qualification in doctor.qualifications.all()),
+        location,
+    ]))
+    return {'name': name, 'location': location, 'document': document}
+
+
+def index_doctors(doctor_ids):
+    """
+    Rebuild the search documents, and trigrams where they are used, of the given doctors.
+    """
+    doctors = (
+        Doctor.objects.filter(pk__in=doctor_ids)
+        .select_related('user', 'hospital_address')
+        .prefetch_related('specialties', 'languages', 'qualifications')
+    )
+    documents = [DoctorSearchDocument(doctor=doctor, **build_document(doctor)) for doctor in doctors]
+
+    with transaction.atomic():
+        DoctorSearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['doctor'],
+            update_fields=['name', 'location', 'document', 'updated_at'],
+        )
+        if uses_trigram_table():
+            DoctorSearchTrigram.objects.filter(document_id__in=[document.pk for document in documents]).delete()
+            DoctorSearchTrigram.objects.bulk_create([
+                DoctorSearchTrigram(document_id=document.pk, field=field, trigram=trigram)
+                for document in documents
+                for field in SEARCH_FIELDS
+                for trigram in trigrams(getattr(document, field))
+            ], batch_size=1000)
+    return len(documents)
+
+
+def _index_pending():
+    ids = getattr(_pending, 'ids', None)
+    _pending.ids = None
+    if ids:
+        index_doctors(ids)
+
+
+def schedule_index(doctor_ids):
+    """
+    Reindex the given doctors once the current transaction commits.
+
+    Ids are collected per thread, so all the changes made to a doctor in one
+    transaction, such as a nested profile update, are indexed together.
+    """
+    doctor_ids = list(doctor_ids)
+    if not doctor_ids:
+        return
+    if getattr(_pending, 'ids', None) is None:
+        _pending.ids = set()
+    _pending.ids.update(doctor_ids)
+    transaction.on_commit(_index_pending)
+
+
+class FullTextMatch(Func):
+    """
+    `to_tsvector('simple', text) @@ to_tsquery('simple', query)` on Postgres.
+    """
+
+    template = "to_tsvector('simple'::regconfig, %(expressions)s)"
+    arg_joiner = ") @@ to_tsquery('simple'::regconfig, "
+    output_field = BooleanField()
+
+
+def term_filter(field, term):
+    """
+    Match doctors whose search text for the field contains the normalized term.
+    """
+    condition = Q(**{f'search_document__{field}__contains': term})
+    if uses_trigram_table() and len(term) >= MIN_INDEXED_TERM_LENGTH:
+        grams = trigrams(term)
+        candidates = (
+            DoctorSearchTrigram.objects.filter(field=field, trigram__in=grams)
+            .values('document_id')
+            .annotate(hits=Count('trigram'))
+            .filter(hits=len(grams))
+            .values('document_id')
+        )
+        condition &= Q(pk__in=candidates)
+    return condition
+
+
+def document_filter(words):
+    """
+    Match doctors whose search document contains every word, as a prefix on Postgres.
+    """
+    if not uses_trigram_table():
+        query = ' & '.join(f'{word}:*' for word in words)
+        return Q(FullTextMatch(F('search_document__document'), Value(query)))
+    condition = Q()
+    for word in words:
+        condition &= term_filter('document', word)
+    return condition
+
+
+def rank_search_results(queryset, words, reorder=True):
+    """
+    Annotate doctors with a search rank, names matching counting more than the
+    rest of the document, and optionally order them by it.
+    """
+    rank = Value(0)
+    for word in words:
+        rank = rank + Case(
+            When(search_document__name__contains=word, then=Value(2)),
+            When(search_document__document__contains=word, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    queryset = queryset.annotate(search_rank=rank)
+    if reorder:
+        queryset = queryset.order_by('-search_rank', *queryset.query.order_by)
+    return queryset
+
+
+def create_search_indexes(using='default', **kwargs):
+    """
+    Create the trigram and full-text indexes of the search documents on Postgres.
+    """
+    db = connections[using]
+    if db.vendor != 'postgresql':
+        return
+    table = DoctorSearchDocument._meta.db_table
+    with db.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for field in SEARCH_FIELDS:
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS doctor_search_{field}_trgm_idx ON {table} USING gin ({field} gin_trgm_ops)'
+            )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS doctor_search_document_fts_idx ON {table} "
+            f"USING gin (to_tsvector('simple'::regconfig, document))"
+        )
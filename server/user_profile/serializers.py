@@ -12,10 +12,103 @@ from django.utils.timezone import make_aware, now
 from django.conf import settings
 from django.db import transaction
 from zoneinfo import ZoneInfo
+from .snapshots import get_cached_snapshot, profile_snapshots
+from .slots import compute_appointment_slots
+from django.db import models
+from django.db.models import Prefetch, prefetch_related_objects
+from rest_framework.permissions import SAFE_METHODS
 
 # Get the User model
 User = get_user_model()
 
+
+def split_param(value):
+    """
+    Split a comma separated query parameter into a set of names.
+    """
+    return {name.strip() for name in (value or '').split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin letting clients choose the top-level fields of a read with
+    `?fields=` and add heavy nested fields with `?expand=`.
+
+    Without either parameter every field is rendered. `?expand=` on its own renders
+    the fields not listed in `Meta.expandable_fields` plus the expanded ones. Only
+    the top-level serializer of a response is trimmed, and writes always see every
+    field. Fields that are not rendered are not serialized, and `optimize_queryset`
+    skips their joins and prefetches.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.get_selected_fields(fields)
+        if selected is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+    def get_selected_fields(self, fields):
+        """
+        Return the names of the fields requested by the client, or None for every field.
+        """
+        request = self.context.get('request')
+        if request is None or self.context.get('all_fields') or request.method not in SAFE_METHODS:
+            return None
+        is_top_level = self.parent is None or (isinstance(self.parent, serializers.ListSerializer) and self.parent.parent is None)
+        if not is_top_level:
+            return None
+
+        params = request.query_params
+        if 'fields' not in params and 'expand' not in params:
+            return None
+        if 'fields' in params:
+            selected = split_param(params['fields'])
+        else:
+            expandable = getattr(self.Meta, 'expandable_fields', ())
+            selected = {name for name in fields if name not in expandable}
+        return selected | split_param(params.get('expand'))
+
+    def get_field_prefetches(self):
+        """
+        Relations to prefetch for each field.
+        """
+        return {}
+
+    def get_prefetch_lookups(self):
+        """
+        Prefetch lookups of the rendered fields.
+        """
+        return [
+            lookup
+            for name, lookups in self.get_field_prefetches().items() if name in self.fields
+            for lookup in lookups
+        ]
+
+    def optimize_queryset(self, queryset):
+        """
+        Join and prefetch only the relations of the rendered fields.
+        """
+        related = [
+            relation
+            for name, relations in getattr(self.Meta, 'field_select_related', {}).items() if name in self.fields
+            for relation in relations
+        ]
+        if related:
+            queryset = queryset.select_related(*related)
+        lookups = self.get_prefetch_lookups()
+        if lookups:
+            queryset = queryset.prefetch_related(*lookups)
+        return queryset
+
+    def prefetch_instances(self, instances):
+        """
+        Prefetch the relations of the rendered fields on already loaded instances.
+        """
+        lookups = self.get_prefetch_lookups()
+        if lookups:
+            prefetch_related_objects(instances, *lookups)
+
 class AddressSerializer(serializers.ModelSerializer):
     """
     Serializer for Address model.
@@ -109,7 +202,19 @@ class DoctorQualificationSerializer(serializers.ModelSerializer):
         extra_kwargs = {'id': {'read_only': False, 'required': False}}
         
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorListSerializer(serializers.ListSerializer):
+    """
+    List serializer for Doctor model that computes the appointment slots of a whole page at once.
+    """
+
+    def to_representation(self, data):
+        doctors = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if 'appointment_slots' in self.child.fields and self.context.get('request') is not None:
+            self.context['appointment_slots'] = compute_appointment_slots(doctors, self.context['request'])
+        return super().to_representation(doctors)
+
+
+class DoctorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for Doctor model.
     """    
@@ -126,9 +231,27 @@ class DoctorSerializer(serializers.ModelSerializer):
     class Meta:
         model = Doctor
         fields = '__all__'
+        read_only_fields = ('rating_count', 'rating_sum')
+        list_serializer_class = DoctorListSerializer
+        expandable_fields = ('reviews', 'qualifications', 'languages', 'appointment_slots')
+        field_select_related = {'user': ('user',), 'hospital_address': ('hospital_address',)}
+
+    def get_field_prefetches(self):
+        """
+        Relations to prefetch for each field, the reviews being limited to the five latest per doctor.
+        """
+        return {
+            'specialties': ('specialties',),
+            'languages': (Prefetch('doctor_language_proficiencies', queryset=DoctorLanguageProficiency.objects.select_related('language')),),
+            'qualifications': (Prefetch('doctor_qualifications', queryset=DoctorQualification.objects.select_related('qualification')),),
+            'reviews': (Prefetch('reviews', queryset=Review.objects.select_related('patient__user').order_by('-date_created', '-id')[:5], to_attr='top_reviews'),),
+        }
         
     def get_reviews(self, obj):
-        return ReviewSerializer(obj.reviews.all()[:5], many=True).data
+        reviews = getattr(obj, 'top_reviews', None)
+        if reviews is None:
+            reviews = obj.reviews.select_related('patient__user').order_by('-date_created', '-id')[:5]
+        return ReviewSerializer(reviews, many=True).data
     
     def get_average_rating(self, obj):
         return obj.average_rating()
@@ -138,67 +261,10 @@ class DoctorSerializer(serializers.ModelSerializer):
         """
         Get available appointment slots for the doctor.
         """        
-        request = self.context.get('request')
-        user_timezone_str = request.query_params.get('timezone', 'UTC')
-        user_tz = ZoneInfo(user_timezone_str)
-
-
-        datetime_str = request.query_params.get('datetime')
-        
-        # Get the requested datetime in the user's timezone or the current datetime
-        if datetime_str:
-            requested_datetime_user_tz = datetime.fromisoformat(datetime_str)
-        else:
-            user_tz = ZoneInfo(request.query_params.get('timezone', 'UTC'))
-            requested_datetime_user_tz = make_aware(datetime.now(), timezone=user_tz)
-
-        # Get the doctor's timezone
-        doctor_tz = ZoneInfo(str(obj.get_timezone()))
-        # ZoneInfo(obj.get_timezone())
-        requested_datetime_doctor_tz = requested_datetime_user_tz.astimezone(doctor_tz)
-        requested_date_doctor_tz = requested_datetime_doctor_tz.date()
-        
-        # Get current datetime in the user's timezone to filter out past slots
-        current_datetime_user_tz = datetime.now(tz=user_tz)
-
-        slots_with_status = []
-        # Get the doctor's availability hours
-        start_hour = obj.availability_start.hour
-        end_hour = obj.availability_end.hour
-
-        # Generate slots for the requested day in the doctor's timezone
-        for hour in range(start_hour, end_hour):
-            slot_time = time(hour, 0)
-            slot_naive_datetime = datetime.combine(requested_date_doctor_tz, slot_time)
-            slot_aware_datetime = make_aware(slot_naive_datetime, timezone=doctor_tz)
-            slot_utc_datetime = slot_aware_datetime.astimezone(ZoneInfo('UTC'))
-            
-            # Convert the slot datetime back to the user's timezone for displaying
-            slot_user_tz_datetime = slot_utc_datetime.astimezone(user_tz)
-            
-            # Filter out slots that have already passed in the user's timezone
-            if slot_user_tz_datetime < current_datetime_user_tz:
-                continue            
-
-
-            is_booked = Appointment.objects.filter(
-                doctor=obj.user,
-                date=slot_utc_datetime.date(),
-                time=slot_utc_datetime.time()
-            ).exists()
-
-            # Convert the slot datetime back to the user's timezone for displaying
-            slot_user_tz_datetime = slot_utc_datetime.astimezone(user_tz)
-
-            slots_with_status.append({
-                'date': slot_user_tz_datetime.strftime('%Y-%m-%d'),
-                'time': slot_user_tz_datetime.strftime('%H:%M'),
-                'status': 'booked' if is_booked else 'unbooked',
-                'datetime_utc': slot_utc_datetime.isoformat(),
-                'datetime_user_tz': slot_user_tz_datetime.isoformat(),
-            })
-
-        return slots_with_status
+        slots = self.context.get('appointment_slots')
+        if slots is None or obj.pk not in slots:
+            slots = compute_appointment_slots([obj], self.context.get('request'))
+        return slots[obj.pk]
 
     
     def update(self, instance, validated_data):
@@ -310,7 +376,15 @@ class DoctorSerializer(serializers.ModelSerializer):
 
         
 
-class PatientSerializer(serializers.ModelSerializer):
+
+class DoctorProfileSerializer(DoctorSerializer):
+    """
+    Serializer for the parts of a doctor's profile that do not depend on the time of the request.
+    """
+    
+    appointment_slots = None
+
+class PatientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for Patient model.
     """    
@@ -323,6 +397,16 @@ class PatientSerializer(serializers.ModelSerializer):
         model = Patient
         fields = '__all__'
         # fields = ['languages', 'address', 'user']
+        expandable_fields = ('languages',)
+        field_select_related = {'user': ('user',), 'address': ('address',)}
+
+    def get_field_prefetches(self):
+        """
+        Relations to prefetch for each field.
+        """
+        return {
+            'languages': (Prefetch('patient_language_proficiencies', queryset=PatientLanguageProficiency.objects.select_related('language')),),
+        }
         
     def update(self, instance, validated_data):
         """
@@ -451,6 +535,16 @@ class SimpleProfileSerializer(serializers.ModelSerializer):
     
     # def get_profile_pic(self, obj):
     #     return obj.profile_pic.url if obj.profile_pic else None
+
+    def to_representation(self, instance):
+        """
+        Serve the profile from the shared snapshot cache, filling it on a miss.
+        """
+        snapshot = get_cached_snapshot(instance.pk)
+        if snapshot is None:
+            snapshot = dict(super().to_representation(instance))
+            profile_snapshots.set(instance.pk, dict(snapshot))
+        return snapshot
     
     def get_profile_pic(self, obj):
         """
@@ -474,6 +568,7 @@ class SimpleDoctorProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = Doctor
         fields = '__all__'
+        read_only_fields = ('rating_count', 'rating_sum')
             
     def get_average_rating(self, obj):
         """
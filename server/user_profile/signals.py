@@ -1,10 +1,29 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.db import transaction
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from .models import Doctor, Patient
+from appointment.models import Appointment
+from .models import (
+    Doctor, Patient, Review, Address, Speciality, Language, Qualification,
+    DoctorLanguageProficiency, DoctorQualification,
+)
+from .snapshots import invalidate_snapshot
+from .availability import record_booking, invalidate_day
+from .search import schedule_index
+from .profile_cache import bump_versions
 
 User = get_user_model()
 
+
+def doctors_changed(doctor_ids):
+    """
+    Reindex the doctors for search and expire their cached profiles.
+    """
+    doctor_ids = list(doctor_ids)
+    schedule_index(doctor_ids)
+    bump_versions(doctor_ids)
+
+
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """
@@ -20,8 +39,156 @@ def create_user_profile(sender, instance, created, **kwargs):
 def save_user_profile(sender, instance, **kwargs):
     """
     Signal receiver function to save the profile of a user after it's been updated.
+    Logins only update last_login, which the profile does not depend on.
     """    
+    if kwargs.get('update_fields') == {'last_login'}:
+        return
     if hasattr(instance, 'doctor_profile'):
         instance.doctor_profile.save()
     elif hasattr(instance, 'patient_profile'):
         instance.patient_profile.save()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def invalidate_profile_snapshot(sender, instance, **kwargs):
+    """
+    Signal receiver function to drop the cached profile snapshot of a user after the user or their profile changed.
+    """
+    invalidate_snapshot(instance.pk)
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_previous_slot(sender, instance, **kwargs):
+    """
+    Signal receiver function to remember the doctor and time of an appointment before it's updated.
+    """
+    instance._previous_slot = None
+    if instance.pk is not None:
+        instance._previous_slot = Appointment.objects.filter(pk=instance.pk).values_list('doctor_id', 'datetime_utc').first()
+
+
+@receiver(post_save, sender=Appointment)
+def update_availability_bitmap(sender, instance, created, **kwargs):
+    """
+    Signal receiver function to keep the cached availability bitmap of a doctor in step with their appointments.
+
+    A new booking is marked in its day's bitmap, while an updated appointment drops
+    the bitmaps of the day it left and the day it moved to. Bitmaps are only updated
+    once the appointment is committed, and a cache failure is logged rather than
+    failing a booking that is already saved.
+    """
+    current = (instance.doctor_id, instance.datetime_utc)
+    if created:
+        if instance.datetime_utc is not None:
+            transaction.on_commit(lambda: record_booking(*current), robust=True)
+        return
+    for doctor_id, datetime_utc in {current, getattr(instance, '_previous_slot', None) or current}:
+        if datetime_utc is not None:
+            transaction.on_commit(lambda doctor_id=doctor_id, datetime_utc=datetime_utc: invalidate_day(doctor_id, datetime_utc), robust=True)
+
+
+@receiver(post_delete, sender=Appointment)
+def clear_availability_bitmap(sender, instance, **kwargs):
+    """
+    Signal receiver function to drop the cached availability bitmap of the day of a deleted appointment.
+    """
+    if instance.datetime_utc is not None:
+        doctor_id, datetime_utc = instance.doctor_id, instance.datetime_utc
+        transaction.on_commit(lambda: invalidate_day(doctor_id, datetime_utc), robust=True)
+
+
+@receiver(pre_save, sender=Review)
+def remember_previous_rating(sender, instance, **kwargs):
+    """
+    Signal receiver function to remember the doctor and rating of a review before it's updated.
+    """
+    instance._previous_rating = None
+    if instance.pk is not None:
+        instance._previous_rating = (
+            Review.objects.select_for_update().filter(pk=instance.pk).values_list('doctor_id', 'rating').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_doctor_rating(sender, instance, created, **kwargs):
+    """
+    Signal receiver function to update the rating aggregates of a doctor after a review is created or updated.
+    """
+    previous = getattr(instance, '_previous_rating', None)
+    if previous is None:
+        Doctor.update_rating(instance.doctor_id, 1, instance.rating)
+    elif previous[0] == instance.doctor_id:
+        if previous[1] != instance.rating:
+            Doctor.update_rating(instance.doctor_id, 0, instance.rating - previous[1])
+    else:
+        Doctor.update_rating(previous[0], -1, -previous[1])
+        Doctor.update_rating(instance.doctor_id, 1, instance.rating)
+        bump_versions([previous[0]])
+    bump_versions([instance.doctor_id])
+
+
+@receiver(post_delete, sender=Review)
+def remove_doctor_rating(sender, instance, **kwargs):
+    """
+    Signal receiver function to remove a deleted review from the rating aggregates of its doctor.
+    """
+    Doctor.update_rating(instance.doctor_id, -1, -instance.rating)
+    bump_versions([instance.doctor_id])
+
+
+@receiver(post_save, sender=Doctor)
+def index_doctor(sender, instance, **kwargs):
+    """
+    Signal receiver function to reindex a doctor for search after their profile changed.
+    Saving a user also saves their profile, so this covers name changes too.
+    """
+    doctors_changed([instance.pk])
+
+
+@receiver(post_save, sender=DoctorLanguageProficiency)
+@receiver(post_delete, sender=DoctorLanguageProficiency)
+@receiver(post_save, sender=DoctorQualification)
+@receiver(post_delete, sender=DoctorQualification)
+def index_doctor_relation(sender, instance, **kwargs):
+    """
+    Signal receiver function to reindex a doctor for search after a language or qualification was added or removed.
+    """
+    doctors_changed([instance.doctor_id])
+
+
+@receiver(m2m_changed, sender=Doctor.specialties.through)
+def index_doctor_specialties(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal receiver function to reindex doctors for search after their specialties changed.
+    """
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        doctors_changed([instance.pk])
+    elif reverse and action in ('post_add', 'post_remove'):
+        doctors_changed(pk_set)
+    elif reverse and action == 'pre_clear':
+        doctors_changed(instance.doctors.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Address)
+@receiver(post_save, sender=Speciality)
+@receiver(post_save, sender=Language)
+@receiver(post_save, sender=Qualification)
+def index_related_doctors(sender, instance, created, **kwargs):
+    """
+    Signal receiver function to reindex the doctors linked to an address, speciality,
+    language or qualification after it changed.
+    """
+    if created:
+        return
+    lookup = {
+        Address: 'hospital_address',
+        Speciality: 'specialties',
+        Language: 'languages',
+        Qualification: 'qualifications',
+    }[sender]
+    doctors_changed(Doctor.objects.filter(**{lookup: instance}).values_list('pk', flat=True))
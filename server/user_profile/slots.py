@@ -0,0 +1,93 @@
+from collections import defaultdict
+from datetime import datetime, time, timezone as dt_timezone
+from zoneinfo import ZoneInfo
+
+from django.utils.timezone import make_aware
+
+from appointment.models import Appointment
+
+
+def get_requested_window(request):
+    """
+    Read the user's timezone and requested datetime from the query parameters.
+
+    Returns the user's timezone, the requested datetime and the current datetime in that timezone.
+    """
+    user_tz = ZoneInfo(request.query_params.get('timezone', 'UTC'))
+    datetime_str = request.query_params.get('datetime')
+
+    # Get the requested datetime in the user's timezone or the current datetime
+    if datetime_str:
+        requested_datetime_user_tz = datetime.fromisoformat(datetime_str)
+    else:
+        requested_datetime_user_tz = make_aware(datetime.now(), timezone=user_tz)
+
+    return user_tz, requested_datetime_user_tz, datetime.now(tz=user_tz)
+
+
+def candidate_slots(doctor, requested_datetime_user_tz, current_datetime_user_tz):
+    """
+    List the hourly slots of a doctor on the requested day, in UTC, skipping the ones that have passed.
+    """
+    # Get the requested day in the doctor's timezone
+    doctor_tz = ZoneInfo(str(doctor.get_timezone()))
+    requested_date_doctor_tz = requested_datetime_user_tz.astimezone(doctor_tz).date()
+
+    slots = []
+    for hour in range(doctor.availability_start.hour, doctor.availability_end.hour):
+        slot_aware_datetime = make_aware(datetime.combine(requested_date_doctor_tz, time(hour, 0)), timezone=doctor_tz)
+        slot_utc_datetime = slot_aware_datetime.astimezone(dt_timezone.utc)
+        # Filter out slots that have already passed
+        if slot_utc_datetime < current_datetime_user_tz:
+            continue
+        slots.append(slot_utc_datetime)
+    return slots
+
+
+def booked_datetimes(doctor_ids, start, end):
+    """
+    Fetch the booked appointment datetimes of the given doctors between start and end, in one query.
+    """
+    booked = defaultdict(set)
+    appointments = Appointment.objects.filter(
+        doctor_id__in=doctor_ids,
+        datetime_utc__gte=start,
+        datetime_utc__lte=end,
+    ).values_list('doctor_id', 'datetime_utc')
+    for doctor_id, datetime_utc in appointments:
+        booked[doctor_id].add(datetime_utc.astimezone(dt_timezone.utc))
+    return booked
+
+
+def compute_appointment_slots(doctors, request):
+    """
+    Compute the appointment slots of several doctors for the requested day.
+
+    All the bookings in the window covered by the doctors' slots are fetched with a
+    single query, and the booked status of each slot is then resolved in memory.
+    Returns a mapping of doctor primary key to the list of slots with their status.
+    """
+    user_tz, requested_datetime_user_tz, current_datetime_user_tz = get_requested_window(request)
+
+    slots_by_doctor = {
+        doctor.pk: candidate_slots(doctor, requested_datetime_user_tz, current_datetime_user_tz)
+        for doctor in doctors
+    }
+    all_slots = [slot for slots in slots_by_doctor.values() for slot in slots]
+    booked = booked_datetimes(list(slots_by_doctor), min(all_slots), max(all_slots)) if all_slots else {}
+
+    result = {}
+    for doctor_pk, slots in slots_by_doctor.items():
+        booked_for_doctor = booked.get(doctor_pk, set())
+        result[doctor_pk] = []
+        for slot_utc_datetime in slots:
+            # Convert the slot datetime back to the user's timezone for displaying
+            slot_user_tz_datetime = slot_utc_datetime.astimezone(user_tz)
+            result[doctor_pk].append({
+                'date': slot_user_tz_datetime.strftime('%Y-%m-%d'),
+                'time': slot_user_tz_datetime.strftime('%H:%M'),
+                'status': 'booked' if slot_utc_datetime in booked_for_doctor else 'unbooked',
+                'datetime_utc': slot_utc_datetime.isoformat(),
+                'datetime_user_tz': slot_user_tz_datetime.isoformat(),
+            })
+    return result
@@ -0,0 +1,62 @@
+import time
+
+from django.conf import settings
+
+from server.cache import LRUCache
+from .models import Doctor, Patient
+
+PROFILE_SNAPSHOT_CACHE = getattr(settings, 'PROFILE_SNAPSHOT_CACHE', {})
+
+# Serialized profiles, keyed by user ID. Kept up to date by the signals in user_profile.signals,
+# which only reach the current process, so snapshots also expire after MAX_TTL seconds.
+profile_snapshots = LRUCache(max_entries=PROFILE_SNAPSHOT_CACHE.get('MAX_ENTRIES', 10000))
+
+
+def build_snapshot(user, profile):
+    """
+    Build the public snapshot of a user and their patient or doctor profile.
+    """
+    return {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'email': user.email,
+        'profile_pic': f"{settings.BASE_URL}{profile.profile_pic.url}" if profile and profile.profile_pic else None,
+        'account_type': user.account_type,
+        'timezone': str(user.timezone),
+    }
+
+
+def get_cached_snapshot(user_id):
+    """
+    Return a copy of the cached snapshot of a user, or None if it is not cached.
+    """
+    snapshot = profile_snapshots.get(user_id)
+    return dict(snapshot) if snapshot is not None else None
+
+
+def get_profile_snapshot(user):
+    """
+    Return the snapshot of a user, loading their profile on a cache miss.
+    """
+    snapshot = get_cached_snapshot(user.id)
+    if snapshot is not None:
+        return snapshot
+
+    profile = None
+    if user.account_type == 'patient':
+        profile = Patient.objects.filter(user_id=user.id).first()
+    elif user.account_type == 'doctor':
+        profile = Doctor.objects.filter(user_id=user.id).first()
+
+    snapshot = build_snapshot(user, profile)
+    profile_snapshots.set(user.id, snapshot, expires_at=time.time() + PROFILE_SNAPSHOT_CACHE.get('MAX_TTL', 300))
+    return dict(snapshot)
+
+
+def invalidate_snapshot(user_id):
+    """
+    Drop the cached snapshot of a user.
+    """
+    profile_snapshots.delete(user_id)
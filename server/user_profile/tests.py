@@ -5,6 +5,22 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 from .models import Doctor, Address, Speciality
 from rest_framework.test import APIClient
+from .snapshots import get_profile_snapshot, profile_snapshots
+from .serializers import SimpleProfileSerializer
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.test.utils import CaptureQueriesContext
+from appointment.models import Appointment
+from unittest import mock
+from django.db import connection, transaction
+from django.core.cache import cache
+from .availability import bitmap_key
+from io import StringIO
+from django.core.management import call_command
+from conversation.models import Conversation
+from .models import Patient, Review
+from decimal import Decimal
+from .models import Language, DoctorLanguageProficiency, DoctorSearchDocument
+from .profile_cache import profile_cache_stats
 
 class DoctorViewSetTestCase(APITestCase):
     """
@@ -83,3 +99,785 @@ class DoctorReviewsAPIViewTestCase(APITestCase):
         url = reverse('doctor-reviews', kwargs={'username': doctor_username})  
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ProfileSnapshotCacheTestCase(APITestCase):
+    """
+    Test case for the profile snapshot cache.
+    """
+
+    def setUp(self):
+        """
+        Set up a doctor with a profile.
+        """
+        
+        profile_snapshots.clear()
+        self.user = User.objects.create_user(username='doctor1', email='u1@email.com', password='testpass123', account_type='doctor', first_name='Ada')
+
+    def test_snapshot_is_cached(self):
+        """
+        Test that a snapshot only queries the profile once.
+        """
+        
+        with self.assertNumQueries(1):
+            snapshot = get_profile_snapshot(self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_profile_snapshot(self.user), snapshot)
+        self.assertEqual(snapshot['first_name'], 'Ada')
+        self.assertEqual(snapshot['account_type'], 'doctor')
+        self.assertIsNone(snapshot['profile_pic'])
+
+    def test_snapshot_matches_serializer(self):
+        """
+        Test that the snapshot and the simple profile serializer agree and share the cache.
+        """
+        
+        profile = Doctor.objects.select_related('user').get(user=self.user)
+        data = SimpleProfileSerializer(profile).data
+        self.assertEqual(data, get_profile_snapshot(self.user))
+
+    def test_snapshot_is_invalidated_on_save(self):
+        """
+        Test that saving the user or the profile drops the cached snapshot.
+        """
+        
+        get_profile_snapshot(self.user)
+        self.user.first_name = 'Grace'
+        self.user.save()
+        self.assertEqual(get_profile_snapshot(self.user)['first_name'], 'Grace')
+
+        self.user.doctor_profile.profile_pic = 'profile_pic/doctor/pic.jpg'
+        self.user.doctor_profile.save()
+        self.assertTrue(get_profile_snapshot(self.user)['profile_pic'].endswith('/media/profile_pic/doctor/pic.jpg'))
+
+    def test_snapshot_expires(self):
+        """
+        Test that a snapshot changed without this process's signals is reloaded after MAX_TTL seconds.
+        """
+        
+        get_profile_snapshot(self.user)
+        User.objects.filter(pk=self.user.pk).update(first_name='Grace')
+        self.user.first_name = 'Grace'
+        self.assertEqual(get_profile_snapshot(self.user)['first_name'], 'Ada')
+        with mock.patch('time.time', return_value=datetime.now().timestamp() + 301):
+            self.assertEqual(get_profile_snapshot(self.user)['first_name'], 'Grace')
+
+
+class AppointmentSlotEngineTestCase(APITestCase):
+    """
+    Test case for the batched appointment slot computation.
+    """
+
+    def setUp(self):
+        """
+        Set up doctors available all day, with a booking for tomorrow.
+        """
+        
+        self.patient = User.objects.create_user(username='patient', email='p@email.com', password='testpass123', account_type='patient')
+        self.doctors = []
+        for i in range(3):
+            user = User.objects.create_user(username=f'doctor{i}', email=f'd{i}@email.com', password='testpass123', account_type='doctor')
+            Doctor.objects.filter(user=user).update(availability_start=time(0, 0), availability_end=time(23, 0))
+            self.doctors.append(user)
+
+        self.tomorrow = (datetime.now(dt_timezone.utc) + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        Appointment.objects.create(patient=self.patient, doctor=self.doctors[0], date=self.tomorrow.date(),
+                                   time=self.tomorrow.time(), datetime_utc=self.tomorrow)
+
+    def get_list(self):
+        """
+        Fetch the doctor list for tomorrow, returning the response and the number of queries.
+        """
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('doctor-list'), {'datetime': self.tomorrow.isoformat(), 'timezone': 'UTC'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, [query['sql'] for query in queries if 'appointment_appointment' in query['sql']]
+
+    def test_booked_slot_status(self):
+        """
+        Test that only the booked slot of the booked doctor is marked as booked.
+        """
+        
+        response, _ = self.get_list()
+        for doctor in response.data['results']:
+            booked = [slot['time'] for slot in doctor['appointment_slots'] if slot['status'] == 'booked']
+            self.assertEqual(booked, ['10:00'] if doctor['user']['username'] == 'doctor0' else [])
+            self.assertEqual(len(doctor['appointment_slots']), 23)
+
+    def test_slot_queries_do_not_grow_with_page(self):
+        """
+        Test that the bookings of a whole page are fetched with a single query.
+        """
+        
+        for i in range(3, 6):
+            User.objects.create_user(username=f'doctor{i}', email=f'd{i}@email.com', password='testpass123', account_type='doctor')
+        response, booking_queries = self.get_list()
+        self.assertEqual(len(response.data['results']), 6)
+        self.assertEqual(len(booking_queries), 1)
+
+
+class AvailabilityCalendarTestCase(APITestCase):
+    """
+    Test case for the multi-day availability calendar.
+    """
+
+    def setUp(self):
+        """
+        Set up a doctor available all day, with a booking in two days.
+        """
+        
+        cache.clear()
+        self.patient = User.objects.create_user(username='patient', email='p@email.com', password='testpass123', account_type='patient')
+        self.doctor = User.objects.create_user(username='doctor', email='d@email.com', password='testpass123', account_type='doctor')
+        Doctor.objects.filter(user=self.doctor).update(availability_start=time(0, 0), availability_end=time(23, 0))
+
+        self.start = (datetime.now(dt_timezone.utc) + timedelta(days=1)).date()
+        self.booked = datetime.combine(self.start + timedelta(days=1), time(10, 0), tzinfo=dt_timezone.utc)
+        self.book(self.booked)
+        self.url = reverse('doctor-availability', kwargs={'user__username': 'doctor'})
+
+    def book(self, datetime_utc):
+        """
+        Book the doctor at the given UTC datetime, and commit the booking.
+        """
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=datetime_utc.date(),
+                                              time=datetime_utc.time(), datetime_utc=datetime_utc)
+
+    def get_calendar(self, days=30, timezone='UTC'):
+        """
+        Fetch the calendar starting tomorrow, returning the booked slots of each day and the booking queries.
+        """
+        
+        params = {'from': self.start.isoformat(), 'to': (self.start + timedelta(days=days - 1)).isoformat(), 'timezone': timezone}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        booked = {
+            day['date']: [slot['time'] for slot in day['slots'] if slot['status'] == 'booked']
+            for day in response.data['days']
+        }
+        return response, booked, [query['sql'] for query in queries if 'appointment_appointment' in query['sql']]
+
+    def test_calendar_marks_booked_slots(self):
+        """
+        Test that a 30 day calendar lists every day with the booked slot marked.
+        """
+        
+        response, booked, booking_queries = self.get_calendar()
+        self.assertEqual(len(response.data['days']), 30)
+        self.assertTrue(all(len(day['slots']) == 23 for day in response.data['days']))
+        self.assertEqual(booked[self.booked.date().isoformat()], ['10:00'])
+        self.assertEqual(sum(len(times) for times in booked.values()), 1)
+        self.assertEqual(len(booking_queries), 1)
+
+    def test_calendar_in_user_timezone(self):
+        """
+        Test that slots are grouped by day and displayed in the user's timezone.
+        """
+        
+        _, booked, _ = self.get_calendar(timezone='Asia/Kolkata')
+        self.assertEqual(booked[self.booked.date().isoformat()], ['15:30'])
+
+    def test_bitmaps_are_cached_and_updated_on_booking(self):
+        """
+        Test that a second request reads the cached bitmaps, including a booking made in between.
+        """
+        
+        self.get_calendar()
+        self.assertIsNotNone(cache.get(bitmap_key(self.doctor.id, self.booked.date())))
+
+        later = self.booked + timedelta(hours=3)
+        self.book(later)
+        _, booked, booking_queries = self.get_calendar()
+        self.assertEqual(booked[later.date().isoformat()], ['10:00', '13:00'])
+        self.assertEqual(booking_queries, [])
+
+    def test_cancelled_booking_frees_slot(self):
+        """
+        Test that deleting an appointment frees its slot.
+        """
+        
+        self.get_calendar()
+        with self.captureOnCommitCallbacks(execute=True):
+            Appointment.objects.filter(datetime_utc=self.booked).delete()
+        _, booked, _ = self.get_calendar()
+        self.assertEqual(sum(len(times) for times in booked.values()), 0)
+
+    def test_moved_or_cleared_booking_frees_its_previous_day(self):
+        """
+        Test that moving an appointment to another day, or clearing its time, frees the slot it left.
+        """
+        
+        self.get_calendar()
+        appointment = Appointment.objects.get(datetime_utc=self.booked)
+        moved = self.booked + timedelta(days=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.datetime_utc = moved
+            appointment.save()
+        _, booked, _ = self.get_calendar()
+        self.assertEqual({day: times for day, times in booked.items() if times}, {moved.date().isoformat(): ['10:00']})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.datetime_utc = None
+            appointment.save()
+        _, booked, _ = self.get_calendar()
+        self.assertEqual(sum(len(times) for times in booked.values()), 0)
+
+    def test_rolled_back_booking_is_not_marked(self):
+        """
+        Test that a booking whose transaction rolled back leaves the cached bitmap as it was.
+        """
+        
+        self.get_calendar()
+        later = self.booked + timedelta(hours=3)
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=later.date(),
+                                       time=later.time(), datetime_utc=later)
+            transaction.set_rollback(True)
+        _, booked, booking_queries = self.get_calendar()
+        self.assertEqual(booked[self.booked.date().isoformat()], ['10:00'])
+        self.assertEqual(booking_queries, [])
+
+    def test_cache_failure_does_not_fail_booking(self):
+        """
+        Test that a bitmap that cannot be updated is dropped, and that a cache outage does not fail the booking.
+        """
+        
+        self.get_calendar()
+        later = self.booked + timedelta(hours=3)
+        with mock.patch('user_profile.availability.mark_booked', side_effect=ConnectionError):
+            self.book(later)
+        self.assertIsNone(cache.get(bitmap_key(self.doctor.id, later.date())))
+
+        with mock.patch('user_profile.availability.cache.get', side_effect=ConnectionError), \
+                mock.patch('user_profile.availability.cache.delete', side_effect=ConnectionError):
+            appointment = self.book(later + timedelta(hours=3))
+        self.assertTrue(Appointment.objects.filter(id=appointment.id).exists())
+
+    def test_invalid_ranges(self):
+        """
+        Test that malformed dates, reversed or too long ranges and unknown timezones are rejected.
+        """
+        
+        for params in [
+            {'from': 'tomorrow'},
+            {'from': '2030-01-10', 'to': '2030-01-01'},
+            {'from': '2030-01-01', 'to': '2030-06-01'},
+            {'timezone': 'Mars/Olympus'},
+        ]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class DoctorRatingAggregatesTestCase(APITestCase):
+    """
+    Test case for the rating aggregates stored on doctors.
+    """
+
+    def setUp(self):
+        """
+        Set up a doctor and a patient with a conversation between them.
+        """
+        
+        self.doctor_user = User.objects.create_user(username='doctor', email='d@email.com', password='testpass123', account_type='doctor')
+        self.patient_user = User.objects.create_user(username='patient', email='p@email.com', password='testpass123', account_type='patient')
+        self.doctor = Doctor.objects.get(user=self.doctor_user)
+        self.patient = Patient.objects.get(user=self.patient_user)
+        self.conversation = Conversation.objects.create(patient=self.patient_user, doctor=self.doctor_user)
+
+    def assertRating(self, count, total):
+        """
+        Assert the stored rating aggregates of the doctor.
+        """
+        
+        self.doctor.refresh_from_db()
+        self.assertEqual((self.doctor.rating_count, self.doctor.rating_sum), (count, total))
+
+    def test_aggregates_follow_reviews(self):
+        """
+        Test that creating, updating and deleting reviews keeps the aggregates in step.
+        """
+        
+        review = Review.objects.create(doctor=self.doctor, patient=self.patient, rating=4, comment='Good')
+        Review.objects.create(doctor=self.doctor, patient=self.patient, rating=2, comment='Late')
+        self.assertRating(2, 6)
+        self.assertEqual(self.doctor.average_rating(), 3)
+
+        review.rating = 5
+        review.save()
+        self.assertRating(2, 7)
+
+        review.delete()
+        self.assertRating(1, 2)
+
+    def test_review_endpoint_update_or_create(self):
+        """
+        Test that reviewing the same conversation twice replaces the rating instead of adding one.
+        """
+        
+        self.client.force_authenticate(user=self.patient_user)
+        url = reverse('review-list')
+        response = self.client.post(url, {'rating': 5, 'comment': 'Great', 'conversation_id': self.conversation.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(url, {'rating': 3, 'comment': 'Fine', 'conversation_id': self.conversation.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRating(1, 3)
+
+    def test_rebuild_command(self):
+        """
+        Test that the rebuild command restores aggregates that drifted from the reviews.
+        """
+        
+        Review.objects.create(doctor=self.doctor, patient=self.patient, rating=4, comment='Good')
+        Doctor.objects.update(rating_count=10, rating_sum=0)
+        call_command('rebuild_doctor_ratings', stdout=StringIO())
+        self.assertRating(1, 4)
+
+
+class DoctorKeysetPaginationTestCase(APITestCase):
+    """
+    Test case for keyset pagination and ordering of the doctor directory.
+    """
+
+    def setUp(self):
+        """
+        Set up doctors with repeated and missing costs and ratings.
+        """
+        
+        cache.clear()
+        for i in range(7):
+            user = User.objects.create_user(username=f'doctor{i}', email=f'd{i}@email.com', password='testpass123', account_type='doctor')
+            Doctor.objects.filter(user=user).update(
+                cost=None if i % 3 == 0 else Decimal(i % 2 * 50 + 25),
+                rating_count=i % 2, rating_sum=(i % 5) * (i % 2),
+            )
+
+    def collect(self, ordering, page_size=3):
+        """
+        Page through the directory with cursors, returning the usernames in order and the number of pages.
+        """
+        
+        usernames, cursor, pages = [], '', 0
+        while cursor is not None:
+            response = self.client.get(reverse('doctor-list'), {'cursor': cursor, 'ordering': ordering, 'page_size': page_size})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            usernames += [doctor['user']['username'] for doctor in response.data['results']]
+            cursor = response.data['next_cursor']
+            pages += 1
+        return usernames, pages
+
+    def test_orderings_are_stable_and_complete(self):
+        """
+        Test that paging with cursors yields every doctor exactly once, in the same order as a single page.
+        """
+        
+        for ordering in ['id', '-id', 'rating', '-rating', 'cost', '-cost', 'experience', '-experience']:
+            usernames, pages = self.collect(ordering)
+            single_page, _ = self.collect(ordering, page_size=100)
+            self.assertEqual(usernames, single_page, ordering)
+            self.assertEqual(sorted(usernames), sorted(f'doctor{i}' for i in range(7)))
+            self.assertEqual(pages, 3)
+
+    def test_rating_ordering(self):
+        """
+        Test that doctors are ordered by average rating, ties broken by id.
+        """
+        
+        usernames, _ = self.collect('-rating', page_size=100)
+        self.assertEqual(usernames, ['doctor3', 'doctor1', 'doctor6', 'doctor5', 'doctor4', 'doctor2', 'doctor0'])
+
+    def test_optional_cached_count(self):
+        """
+        Test that the total count is only returned when asked for, and is cached per filter combination.
+        """
+        
+        response = self.client.get(reverse('doctor-list'), {'cursor': ''})
+        self.assertNotIn('count', response.data)
+        response = self.client.get(reverse('doctor-list'), {'cursor': '', 'with_count': 1})
+        self.assertEqual(response.data['count'], 7)
+        User.objects.create_user(username='doctor7', email='d7@email.com', password='testpass123', account_type='doctor')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('doctor-list'), {'cursor': '', 'with_count': 1})
+        self.assertEqual(response.data['count'], 7)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+
+    def test_invalid_parameters(self):
+        """
+        Test that unknown orderings and tampered or mismatched cursors are rejected.
+        """
+        
+        response = self.client.get(reverse('doctor-list'), {'cursor': '', 'ordering': 'name'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('doctor-list'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('doctor-list'), {'cursor': '', 'ordering': 'cost', 'page_size': 2})
+        response = self.client.get(reverse('doctor-list'), {'cursor': response.data['next_cursor'], 'ordering': 'rating'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class DoctorSearchTestCase(APITestCase):
+    """
+    Test case for the indexed doctor search.
+    """
+
+    def setUp(self):
+        """
+        Set up indexed doctors with names, addresses, specialties and languages.
+        """
+        
+        self.cardiology = Speciality.objects.create(name='Cardiology')
+        self.french = Language.objects.create(name='French')
+        london = Address.objects.create(street='1 Harley Street', city='London', state='Greater London', postal_code='W1G 9QD', country='UK')
+        paris = Address.objects.create(street='2 Rue de Rivoli', city='Paris', state='Île-de-France', postal_code='75001', country='France')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.jose = self.create_doctor('jose', 'José', 'Smith', paris)
+            self.jose.specialties.add(self.cardiology)
+            DoctorLanguageProficiency.objects.create(doctor=self.jose, language=self.french)
+            self.john = self.create_doctor('john', 'John', 'Smithers', london)
+            self.create_doctor('anna', 'Anna', 'Jones', london)
+
+    def create_doctor(self, username, first_name, last_name, address):
+        """
+        Create a doctor with a name and hospital address.
+        """
+        
+        user = User.objects.create_user(username=username, email=f'{username}@email.com', password='testpass123',
+                                        account_type='doctor', first_name=first_name, last_name=last_name)
+        doctor = Doctor.objects.get(user=user)
+        doctor.hospital_address = address
+        doctor.save()
+        return doctor
+
+    def search(self, **params):
+        """
+        Search the directory, returning the usernames in the order returned.
+        """
+        
+        response = self.client.get(reverse('doctor-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [doctor['user']['username'] for doctor in response.data['results']]
+
+    def test_name_search(self):
+        """
+        Test that any word of the name matches, ignoring case and accents, best matches first.
+        """
+        
+        self.assertEqual(self.search(doctor_name='jose smith'), ['jose', 'john'])
+        self.assertEqual(self.search(doctor_name='SMITHERS'), ['john'])
+        self.assertEqual(self.search(doctor_name='nobody'), [])
+
+    def test_location_search(self):
+        """
+        Test that the location matches any part of the hospital address.
+        """
+        
+        self.assertEqual(sorted(self.search(location='london')), ['anna', 'john'])
+        self.assertEqual(self.search(location='ile-de-france'), ['jose'])
+
+    def test_free_text_search(self):
+        """
+        Test that every word of a free text search must match the name, specialties, languages or address.
+        """
+        
+        self.assertEqual(self.search(q='cardio french'), ['jose'])
+        self.assertEqual(self.search(q='cardiology london'), [])
+
+    def test_index_follows_changes(self):
+        """
+        Test that renaming a doctor or changing their specialties updates the index.
+        """
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            user = self.john.user
+            user.last_name = 'Brown'
+            user.save()
+            self.john.specialties.add(self.cardiology)
+        self.assertEqual(self.search(doctor_name='brown'), ['john'])
+        self.assertEqual(sorted(self.search(q='cardiology')), ['john', 'jose'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cardiology.name = 'Neurology'
+            self.cardiology.save()
+        self.assertEqual(sorted(self.search(q='neurology')), ['john', 'jose'])
+
+    def test_rebuild_command(self):
+        """
+        Test that the rebuild command indexes doctors that were never indexed.
+        """
+        
+        DoctorSearchDocument.objects.all().delete()
+        self.assertEqual(self.search(doctor_name='anna'), [])
+        call_command('rebuild_doctor_search', stdout=StringIO())
+        self.assertEqual(self.search(doctor_name='anna'), ['anna'])
+
+    def test_rebuild_command_backfills_missing_documents(self):
+        """
+        Test that the rebuild command with --missing indexes only the doctors without a search document.
+        """
+        
+        DoctorSearchDocument.objects.filter(doctor=self.john).delete()
+        self.assertEqual(self.search(doctor_name='smithers'), [])
+        out = StringIO()
+        call_command('rebuild_doctor_search', '--missing', stdout=out)
+        self.assertIn('Indexed 1 doctors.', out.getvalue())
+        self.assertEqual(self.search(doctor_name='smithers'), ['john'])
+
+    def test_logins_do_not_reindex(self):
+        """
+        Test that a login, which only updates last_login, does not reindex the doctor.
+        """
+        
+        with mock.patch('user_profile.signals.schedule_index') as schedule_index:
+            self.client.login(username='john', password='testpass123')
+            schedule_index.assert_not_called()
+            self.john.user.save()
+            schedule_index.assert_called_once_with([self.john.pk])
+
+
+class DoctorFacetsTestCase(APITestCase):
+    """
+    Test case for the facet counts of the doctor directory.
+    """
+
+    def setUp(self):
+        """
+        Set up doctors with overlapping specialties, languages and availability.
+        """
+        
+        cache.clear()
+        cardiology = Speciality.objects.create(name='Cardiology')
+        neurology = Speciality.objects.create(name='Neurology')
+        english = Language.objects.create(name='English')
+        french = Language.objects.create(name='French')
+        for i, (specialties, languages, availability) in enumerate([
+            ([cardiology], [english], 'full-time'),
+            ([cardiology, neurology], [english, french], 'part-time'),
+            ([neurology], [french], 'full-time'),
+            ([], [], None),
+        ]):
+            user = User.objects.create_user(username=f'doctor{i}', email=f'd{i}@email.com', password='testpass123', account_type='doctor')
+            doctor = Doctor.objects.get(user=user)
+            doctor.availability = availability
+            doctor.save()
+            doctor.specialties.set(specialties)
+            for language in languages:
+                DoctorLanguageProficiency.objects.create(doctor=doctor, language=language)
+
+    def get_facets(self, **params):
+        """
+        Fetch the facets, returning the response data and the number of queries.
+        """
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('doctor-facets'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        counts = {
+            facet: {item['value']: item['count'] for item in items}
+            for facet, items in response.data['facets'].items()
+        }
+        return response.data['count'], counts, len(queries)
+
+    def test_unfiltered_counts(self):
+        """
+        Test that every facet value is counted over the whole directory.
+        """
+        
+        count, facets, _ = self.get_facets()
+        self.assertEqual(count, 4)
+        self.assertEqual(facets['speciality'], {'Cardiology': 2, 'Neurology': 2})
+        self.assertEqual(facets['language'], {'English': 2, 'French': 2})
+        self.assertEqual(facets['availability'], {'full-time': 2, 'part-time': 1})
+
+    def test_disjunctive_counts(self):
+        """
+        Test that a facet's own filter does not narrow its counts while the other filters do.
+        """
+        
+        count, facets, _ = self.get_facets(language='French')
+        self.assertEqual(count, 2)
+        self.assertEqual(facets['language'], {'English': 2, 'French': 2})
+        self.assertEqual(facets['speciality'], {'Cardiology': 1, 'Neurology': 2})
+        self.assertEqual(facets['availability'], {'full-time': 1, 'part-time': 1})
+
+    def test_counts_are_cached_per_filter_signature(self):
+        """
+        Test that equivalent filters share the cached counts, with no query on a hit.
+        """
+        
+        _, first, queries = self.get_facets(language='French,English', speciality='Cardiology')
+        self.assertLessEqual(queries, 5)
+        _, second, queries = self.get_facets(language='English,French', speciality='cardiology', page=2)
+        self.assertEqual(first, second)
+        self.assertEqual(queries, 0)
+
+
+class DoctorProfileCacheTestCase(APITestCase):
+    """
+    Test case for the versioned doctor profile cache.
+    """
+
+    def setUp(self):
+        """
+        Set up a doctor available all day and a patient.
+        """
+        
+        cache.clear()
+        profile_cache_stats.reset()
+        self.doctor_user = User.objects.create_user(username='doctor', email='d@email.com', password='testpass123', account_type='doctor')
+        self.patient_user = User.objects.create_user(username='patient', email='p@email.com', password='testpass123', account_type='patient')
+        Doctor.objects.filter(user=self.doctor_user).update(availability_start=time(0, 0), availability_end=time(23, 0))
+        self.doctor = Doctor.objects.get(user=self.doctor_user)
+        self.patient = Patient.objects.get(user=self.patient_user)
+        self.tomorrow = (datetime.now(dt_timezone.utc) + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+        self.url = reverse('doctor-detail', kwargs={'user__username': 'doctor'})
+
+    def get_profile(self):
+        """
+        Fetch the profile of the doctor for tomorrow.
+        """
+        
+        response = self.client.get(self.url, {'datetime': self.tomorrow.isoformat(), 'timezone': 'UTC'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_profile_is_cached_but_slots_are_not(self):
+        """
+        Test that a second view is served from the cache while its slots still reflect new bookings.
+        """
+        
+        self.assertEqual(self.get_profile()['X-Profile-Cache'], 'miss')
+        Appointment.objects.create(patient=self.patient_user, doctor=self.doctor_user, date=self.tomorrow.date(),
+                                   time=self.tomorrow.time(), datetime_utc=self.tomorrow)
+        response = self.get_profile()
+        self.assertEqual(response['X-Profile-Cache'], 'hit')
+        booked = [slot['time'] for slot in response.data['appointment_slots'] if slot['status'] == 'booked']
+        self.assertEqual(booked, ['10:00'])
+        self.assertEqual(profile_cache_stats.snapshot()['hits'], 1)
+        self.assertEqual(profile_cache_stats.snapshot()['misses'], 1)
+
+    def test_changes_bump_the_version(self):
+        """
+        Test that profile and review changes expire the cached profile once committed.
+        """
+        
+        self.get_profile()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.description = 'Cardiologist'
+            self.doctor.save()
+        response = self.get_profile()
+        self.assertEqual(response['X-Profile-Cache'], 'miss')
+        self.assertEqual(response.data['description'], 'Cardiologist')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(doctor=self.doctor, patient=self.patient, rating=4, comment='Good')
+        response = self.get_profile()
+        self.assertEqual(response['X-Profile-Cache'], 'miss')
+        self.assertEqual(response.data['average_rating'], 4)
+        self.assertEqual(len(response.data['reviews']), 1)
+
+    def test_stats_are_staff_only(self):
+        """
+        Test that only staff can read the cache counters.
+        """
+        
+        url = reverse('doctor-profile-cache-stats')
+        self.client.force_authenticate(user=self.patient_user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.patient_user.is_staff = True
+        self.client.force_authenticate(user=self.patient_user)
+        self.get_profile()
+        self.assertEqual(self.client.get(url).data['misses'], 1)
+
+
+class SparseFieldsetTestCase(APITestCase):
+    """
+    Test case for the ?fields= and ?expand= parameters of the doctor and patient endpoints.
+    """
+
+    def setUp(self):
+        """
+        Set up doctors with specialties, languages and reviews, and a patient.
+        """
+        
+        cache.clear()
+        self.patient_user = User.objects.create_user(username='patient', email='p@email.com', password='testpass123', account_type='patient')
+        patient = Patient.objects.get(user=self.patient_user)
+        speciality = Speciality.objects.create(name='Cardiology')
+        english = Language.objects.create(name='English')
+        for i in range(4):
+            user = User.objects.create_user(username=f'doctor{i}', email=f'd{i}@email.com', password='testpass123', account_type='doctor')
+            doctor = Doctor.objects.get(user=user)
+            doctor.specialties.add(speciality)
+            DoctorLanguageProficiency.objects.create(doctor=doctor, language=english)
+            for rating in range(1, 8):
+                Review.objects.create(doctor=doctor, patient=patient, rating=rating % 5 + 1, comment=f'Review {rating}')
+
+    def get_list(self, **params):
+        """
+        Fetch the doctor list, returning the results and the number of queries.
+        """
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('doctor-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data['results'], len(queries)
+
+    def test_default_renders_every_field(self):
+        """
+        Test that without the parameters every field is rendered, as before.
+        """
+        
+        results, _ = self.get_list()
+        self.assertTrue({'user', 'reviews', 'languages', 'qualifications', 'appointment_slots'} <= set(results[0]))
+        self.assertEqual(len(results[0]['reviews']), 5)
+
+    def test_fields_limit_serialization_and_queries(self):
+        """
+        Test that only the requested fields are rendered and that a card list needs a single query.
+        """
+        
+        results, queries = self.get_list(fields='user,cost,average_rating')
+        self.assertEqual(set(results[0]), {'user', 'cost', 'average_rating'})
+        # One query for the page, plus the page-number count
+        self.assertEqual(queries, 2)
+
+    def test_expand_adds_heavy_fields_with_constant_queries(self):
+        """
+        Test that expand adds nested fields to the light representation, prefetched in one query each.
+        """
+        
+        results, _ = self.get_list(expand='')
+        self.assertNotIn('reviews', results[0])
+        self.assertIn('specialties', results[0])
+
+        results, queries = self.get_list(expand='reviews')
+        self.assertEqual(len(results[0]['reviews']), 5)
+        self.assertNotIn('languages', results[0])
+        User.objects.create_user(username='doctor9', email='d9@email.com', password='testpass123', account_type='doctor')
+        _, more_queries = self.get_list(expand='reviews')
+        self.assertEqual(queries, more_queries)
+
+    def test_retrieve_fields(self):
+        """
+        Test that a profile can be trimmed, including from the profile cache.
+        """
+        
+        url = reverse('doctor-detail', kwargs={'user__username': 'doctor0'})
+        for _ in range(2):
+            response = self.client.get(url, {'fields': 'user,average_rating'})
+            self.assertEqual(set(response.data), {'user', 'average_rating'})
+
+    def test_patient_fields(self):
+        """
+        Test that the patient endpoint accepts the same parameters.
+        """
+        
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.get(reverse('patient-detail', kwargs={'user__username': 'patient'}), {'expand': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('languages', response.data)
+        self.assertIn('user', response.data)
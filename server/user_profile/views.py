@@ -1,18 +1,27 @@
 from django.forms import ValidationError
 from django.shortcuts import get_object_or_404
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from rest_framework import viewsets
 from django_filters import rest_framework as filters
 
 from conversation.models import Conversation
 from .models import Doctor, Patient, Review
-from .serializers import DoctorSerializer, PatientSerializer, ReviewSerializer
+from .serializers import DoctorSerializer, DoctorProfileSerializer, PatientSerializer, ReviewSerializer
 from .permissions import IsOwnerOrReadOnly, IsDoctorOrReadOnly, IsReadOnlyOrIsNew
 from .filters import DoctorFilter
+from .availability import availability_calendar
+from .pagination import DoctorCursorPagination, order_doctors
+from .facets import get_facets
+from .profile_cache import get_cached_profile, profile_cache_stats
+from .slots import compute_appointment_slots
 from rest_framework import permissions, status, mixins 
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from drf_nested_forms.parsers import NestedMultiPartParser, NestedJSONParser
 
 
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError as DRFValidationError
 from rest_framework.generics import ListAPIView, ListCreateAPIView
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
@@ -56,6 +65,8 @@ class DoctorViewSet(viewsets.ModelViewSet, filters.FilterSet):
     filterset_class = DoctorFilter
     # parser_classes = (MultiPartParser, FormParser, JSONParser)
     parser_classes = (NestedMultiPartParser, FormParser)
+    # Longest range the availability calendar can be requested for, in days
+    max_availability_days = 62
 
     def get_queryset(self):
         """
@@ -63,11 +74,27 @@ class DoctorViewSet(viewsets.ModelViewSet, filters.FilterSet):
         any user but only allow updating their own profile.
         """
                 
-        queryset = Doctor.objects.all()
+        queryset = Doctor.objects.select_related('user')
         user = self.request.user
         if user.is_authenticated and self.lookup_field == user.username and hasattr(user, 'doctor_profile'):
             queryset = queryset.filter(user=user)
+        if self.action == 'list':
+            queryset = order_doctors(queryset, self.request.query_params.get('ordering'))
+            # Only join and prefetch the relations of the requested fields
+            queryset = self.get_serializer().optimize_queryset(queryset)
         return queryset
+
+    @property
+    def paginator(self):
+        """
+        Use keyset pagination when the client pages with a cursor, page numbers otherwise.
+        """
+        if not hasattr(self, '_paginator'):
+            if 'cursor' in self.request.query_params:
+                self._paginator = DoctorCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
     
     def get_serializer_context(self):
         """
@@ -75,7 +102,76 @@ class DoctorViewSet(viewsets.ModelViewSet, filters.FilterSet):
         """
         return {'request': self.request, 'format': self.format_kwarg, 'view': self}
 
-    
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a doctor's profile. Everything but the appointment slots is served
+        from the profile cache, and the slots are computed for the request.
+        """
+        doctor = self.get_object()
+        context = self.get_serializer_context()
+
+        def build_profile(doctor):
+            serializer = DoctorProfileSerializer(doctor, context={**context, 'all_fields': True})
+            serializer.prefetch_instances([doctor])
+            return dict(serializer.data)
+
+        profile, hit = get_cached_profile(doctor, request, build_profile)
+        # Keep the fields asked for with ?fields= and ?expand=, in the serializer's order
+        data = {}
+        for name in self.get_serializer().fields:
+            if name == 'appointment_slots':
+                data[name] = compute_appointment_slots([doctor], request)[doctor.pk]
+            elif name in profile:
+                data[name] = profile[name]
+        return Response(data, headers={'X-Profile-Cache': 'hit' if hit else 'miss'})
+
+    @action(detail=False, methods=['get'], url_path='profile-cache-stats', permission_classes=[permissions.IsAdminUser])
+    def profile_cache_stats(self, request):
+        """
+        Hit and miss counters of the doctor profile cache in this process.
+        """
+        return Response(profile_cache_stats.snapshot())
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Count the doctors for every speciality, language, qualification and availability
+        under the current directory filters.
+        """
+        return Response(get_facets(Doctor.objects.all(), request.query_params))
+
+    @action(detail=True, methods=['get'])
+    def availability(self, request, user__username=None):
+        """
+        List the appointment slots of a doctor, with their booked status, for every day
+        between `from` and `to` (inclusive, in the user's `timezone`).
+        """
+        try:
+            user_tz = ZoneInfo(request.query_params.get('timezone', 'UTC'))
+        except (ZoneInfoNotFoundError, ValueError):
+            raise DRFValidationError({'timezone': 'Unknown timezone.'})
+
+        try:
+            start_date = date.fromisoformat(request.query_params['from']) if 'from' in request.query_params else datetime.now(tz=user_tz).date()
+            end_date = date.fromisoformat(request.query_params['to']) if 'to' in request.query_params else start_date + timedelta(days=6)
+        except ValueError:
+            raise DRFValidationError({'detail': 'from and to must be dates in YYYY-MM-DD format.'})
+
+        if end_date < start_date:
+            raise DRFValidationError({'to': 'Must not be before from.'})
+        if (end_date - start_date).days >= self.max_availability_days:
+            raise DRFValidationError({'to': f'The range cannot exceed {self.max_availability_days} days.'})
+
+        doctor = self.get_object()
+        return Response({
+            'doctor': doctor.user.username,
+            'timezone': str(user_tz),
+            'from': start_date.isoformat(),
+            'to': end_date.isoformat(),
+            'days': availability_calendar(doctor, user_tz, start_date, end_date),
+        })
+
+
 
 
 class ReviewPagination(PageNumberPagination):
@@ -177,12 +273,16 @@ class PatientViewSet(viewsets.ModelViewSet):
         for doctors, but patients should only see their own profile.
         """
         user = self.request.user
+        queryset = Patient.objects.none()
         if user.is_authenticated:
             if hasattr(user, 'doctor_profile'):
-                return Patient.objects.all()
-            if hasattr(user, 'patient_profile'):
-                return Patient.objects.filter(user=user)
-        return Patient.objects.none()
+                queryset = Patient.objects.all()
+            elif hasattr(user, 'patient_profile'):
+                queryset = Patient.objects.filter(user=user)
+        if self.action in ('list', 'retrieve'):
+            # Only join and prefetch the relations of the requested fields
+            queryset = self.get_serializer().optimize_queryset(queryset)
+        return queryset
     
     def update (self, request, *args, **kwargs):
         """